@@ -1 +1 @@
-from verifier import verify
+from verifier import verify, verify_async, verify_many
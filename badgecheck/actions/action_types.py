@@ -18,6 +18,7 @@ TASK Actions:
 Add, update, and complete tasks.
 """
 ADD_TASK = 'ADD_TASK'
+ADD_TASKS = 'ADD_TASKS'
 UPDATE_TASK = 'UPDATE_TASK'
 DELETE_TASK = 'DELETE_TASK'
 RESOLVE_TASK = 'RESOLVE_TASK'
@@ -1,4 +1,4 @@
-from action_types import ADD_TASK, DELETE_TASK, RESOLVE_TASK, UPDATE_TASK
+from action_types import ADD_TASK, ADD_TASKS, DELETE_TASK, RESOLVE_TASK, UPDATE_TASK
 
 
 def add_task(task_name, **kwargs):
@@ -14,6 +14,21 @@ def add_task(task_name, **kwargs):
     return task
 
 
+def add_tasks(tasks):
+    """
+    Add several tasks in one action, e.g. tasks already resolved together.
+    :param tasks: list of dicts, each with the name of the task and its properties
+    """
+    from ..tasks import task_types
+    for task in tasks:
+        assert task['name'] in dir(task_types), '{} is not a known task'.format(task['name'])
+
+    return {
+        'type': ADD_TASKS,
+        'tasks': tasks
+    }
+
+
 def resolve_task(task_id, success=True, result=''):
     return {
         'type': RESOLVE_TASK,
@@ -0,0 +1,511 @@
+"""
+Caches for documents fetched over HTTP, and the bounded LRU mapping they build on.
+
+SqliteDocumentCache keeps responses in a SQLite database on local disk, so cached
+issuer profiles, badge classes and contexts survive worker restarts and are shared
+by every process that opens the same file. MemoryDocumentCache keeps them in a
+bounded in-process LRUCache. Along with each body both store the validators needed
+to revalidate it cheaply once it goes stale. FailureCache briefly remembers URLs
+that could not be fetched, so a dead issuer is not retried for every badge.
+"""
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+import re
+import sqlite3
+import threading
+import time
+
+from .forking import after_fork, register
+
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_STALE = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_FAILURE_TTL = 30
+NODE_FETCH = 'NODE_FETCH'
+DOCUMENT_LOAD = 'DOCUMENT_LOAD'
+SQLITE_TIMEOUT = 30
+
+_MAX_AGE = re.compile(r'(?:^|[,\s])max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping bounded by entry count and optionally by total size, which
+    evicts the least recently used entries first. Entries may carry an expiry time.
+    Expiry is checked when an entry is read and by a sweep of a few of the oldest
+    entries every so many writes, so no operation walks the whole cache.
+
+    Example usage:
+    cache = LRUCache(max_entries=100, max_bytes=1024 * 1024)
+    cache.set('key', 'value', expires_at=time.time() + 60, size=5)
+    > cache.get('key')
+    'value'
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None, sweep_interval=64,
+                 sweep_size=16):
+        """
+        :param max_entries: number of entries kept
+        :param max_bytes: total of the sizes given to set that is kept, or None for no limit
+        :param sweep_interval: writes between sweeps for expired entries
+        :param sweep_size: oldest entries examined by each sweep
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.sweep_size = sweep_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at), oldest first
+        self._bytes = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        register(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get(self, key, default=None, now=None):
+        with self._lock:
+            try:
+                value, size, expires_at = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires_at is not None and expires_at <= (now or time.time()):
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries[key] = (value, size, expires_at)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at=None, size=0):
+        """
+        :param expires_at: timestamp after which the entry is dropped, or None
+        :param size: bytes counted against max_bytes for this entry
+        """
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            self._writes += 1
+            if self._writes % self.sweep_interval == 0:
+                self._sweep(time.time())
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                evicted_key, (evicted, evicted_size, evicted_expiry) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._discard(key)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations}
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def _sweep(self, now):
+        expired = []
+        for i, (key, (value, size, expires_at)) in enumerate(self._entries.iteritems()):
+            if i >= self.sweep_size:
+                break
+            if expires_at is not None and expires_at <= now:
+                expired.append(key)
+        for key in expired:
+            self._discard(key)
+            self.expirations += 1
+
+
+class CacheEntry(object):
+    """
+    A cached response body and the headers needed to serve and revalidate it.
+    """
+    __slots__ = ('url', 'content', 'headers', 'expires_at')
+
+    def __init__(self, url, content, headers, expires_at):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.expires_at = expires_at
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires_at
+
+    def validators(self):
+        """
+        :return: dict of conditional request headers for revalidating this entry
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class DocumentCache(object):
+    """
+    Freshness rules and counters shared by the document caches. Subclasses store
+    CacheEntry objects by URL.
+    """
+    CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires')
+
+    def __init__(self, default_ttl=DEFAULT_TTL):
+        """
+        :param default_ttl: seconds a response without freshness headers stays fresh
+        """
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._stats_lock = threading.Lock()
+        register(self)
+
+    def _after_fork(self):
+        self._stats_lock = threading.Lock()
+
+    def get(self, url):
+        """
+        :param url: str
+        :return: CacheEntry, fresh or stale, or None if the URL is not cached
+        """
+        raise NotImplementedError
+
+    def delete(self, url):
+        raise NotImplementedError
+
+    def set(self, url, content, headers, now=None):
+        """
+        Store a response, unless its Cache-Control forbids it.
+        :param url: str
+        :param content: bytes of the response body
+        :param headers: response headers (case-insensitive mapping)
+        :return: CacheEntry or None if the response may not be stored
+        """
+        expires_at = self.expiry_time(headers, now)
+        if expires_at is None:
+            self.delete(url)
+            return None
+
+        entry = CacheEntry(url, content, dict(
+            (name, headers.get(name)) for name in self.CACHED_HEADERS
+            if headers.get(name) is not None), expires_at)
+        self._store(entry)
+        return entry
+
+    def refresh(self, entry, headers, now=None):
+        """
+        Extend a stale entry after the server confirmed it with 304 Not Modified,
+        taking updated freshness headers from the 304 response.
+        :return: CacheEntry
+        """
+        merged = dict(entry.headers)
+        for name in self.CACHED_HEADERS:
+            if headers.get(name) is not None:
+                merged[name] = headers[name]
+        return self.set(entry.url, entry.content, merged, now) or entry
+
+    def clear(self):
+        self._clear_entries()
+        with self._stats_lock:
+            self.hits = self.misses = self.revalidations = 0
+
+    def record(self, outcome):
+        """
+        Count the outcome of a lookup: 'hit', 'miss' or 'revalidation' (a 304).
+        """
+        with self._stats_lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'revalidation':
+                self.revalidations += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations}
+
+    def expiry_time(self, headers, now=None):
+        """
+        :param headers: response headers
+        :return: timestamp until which a response is fresh, or None if it may not be stored
+        """
+        now = now or time.time()
+        cache_control = headers.get('Cache-Control') or ''
+        directives = cache_control.lower()
+        if 'no-store' in directives:
+            return None
+        if 'no-cache' in directives:
+            return now
+
+        max_age = _MAX_AGE.search(cache_control)
+        if max_age:
+            return now + int(max_age.group(1))
+
+        expires = headers.get('Expires')
+        if expires:
+            parsed = parsedate_tz(expires)
+            return mktime_tz(parsed) if parsed else now
+
+        return now + self.default_ttl
+
+    def _store(self, entry):
+        raise NotImplementedError
+
+    def _clear_entries(self):
+        raise NotImplementedError
+
+
+class MemoryDocumentCache(DocumentCache):
+    """
+    An in-process document cache bounded by entry count and total body size.
+    Stale entries that can be revalidated are kept up to max_stale seconds longer.
+
+    Example usage:
+    loader = CachableDocumentLoader(cachable=True)  # uses a MemoryDocumentCache
+    transport.get(url, cache=MemoryDocumentCache(max_entries=100))
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 default_ttl=DEFAULT_TTL, max_stale=DEFAULT_MAX_STALE):
+        """
+        :param max_entries: number of documents kept
+        :param max_bytes: total size of the document bodies kept
+        :param default_ttl: seconds a response without freshness headers stays fresh
+        :param max_stale: seconds a stale entry with an ETag or Last-Modified is kept
+        for revalidation
+        """
+        super(MemoryDocumentCache, self).__init__(default_ttl=default_ttl)
+        self.max_stale = max_stale
+        self.entries = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def delete(self, url):
+        self.entries.pop(url)
+
+    def _store(self, entry):
+        retain_until = entry.expires_at
+        if entry.validators():
+            retain_until += self.max_stale
+        self.entries.set(entry.url, entry, expires_at=retain_until, size=len(entry.content))
+
+    def _clear_entries(self):
+        self.entries.clear()
+
+
+class SqliteDocumentCache(DocumentCache):
+    """
+    A persistent document cache that several processes can share.
+
+    Example usage:
+    cache = SqliteDocumentCache('/var/cache/badgecheck/documents.sqlite')
+    set_transport(HttpTransport(cache=cache))
+    """
+    def __init__(self, path, default_ttl=DEFAULT_TTL):
+        """
+        :param path: file name of the SQLite database, created if missing
+        :param default_ttl: seconds a response without freshness headers stays fresh
+        """
+        super(SqliteDocumentCache, self).__init__(default_ttl=default_ttl)
+        self.path = path
+        self._local = threading.local()
+        self._inherited = []
+
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'url TEXT PRIMARY KEY, content BLOB, content_type TEXT, etag TEXT, '
+                'last_modified TEXT, cache_control TEXT, expires TEXT, expires_at REAL)')
+
+    def get(self, url):
+        row = self._connection().execute(
+            'SELECT content, content_type, etag, last_modified, cache_control, expires, '
+            'expires_at FROM documents WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+
+        headers = dict((name, value) for name, value in zip(self.CACHED_HEADERS, row[1:6])
+                       if value is not None)
+        return CacheEntry(url, bytes(row[0]), headers, row[6])
+
+    def delete(self, url):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM documents WHERE url = ?', (url,))
+
+    def _store(self, entry):
+        values = [entry.headers.get(name) for name in self.CACHED_HEADERS]
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO documents (url, content, content_type, etag, '
+                'last_modified, cache_control, expires, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [entry.url, sqlite3.Binary(entry.content)] + values + [entry.expires_at])
+
+    def _clear_entries(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM documents')
+
+    def _after_fork(self):
+        super(SqliteDocumentCache, self)._after_fork()
+        # Connections opened by the parent are never used again here, but are left open,
+        # as closing them could release locks the parent holds on the database.
+        self._inherited.append(self._local)
+        self._local = threading.local()
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads or processes.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                self.path, timeout=SQLITE_TIMEOUT)
+            connection.text_factory = str
+        return connection
+
+
+class FetchFailure(object):
+    """
+    How fetching a URL failed: the HTTP status if a response arrived, and either the
+    exception raised or the message the failed task reported.
+    """
+    __slots__ = ('url', 'status', 'error', 'message')
+
+    def __init__(self, url, status=None, error=None, message=None):
+        self.url = url
+        self.status = status
+        self.error = error
+        self.message = message
+
+    @property
+    def error_class(self):
+        return self.error.__class__ if self.error is not None else None
+
+
+class FailureCache(object):
+    """
+    Remembers failed fetches per URL for a short time, so repeat fetches can fail
+    the same way without going back to the network. Node fetches and document loads
+    fail in different ways, so their failures are kept apart by kind.
+
+    Example usage:
+    failures = FailureCache(ttl=30)
+    failures.record(url, status=404, message='Response could not be interpreted')
+    failure = failures.get(url)  # the FetchFailure until it expires, then None
+    """
+    def __init__(self, ttl=DEFAULT_FAILURE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param ttl: seconds a failure is remembered
+        :param max_entries: number of failing URLs remembered
+        """
+        self.ttl = ttl
+        self.entries = LRUCache(max_entries=max_entries)
+
+    def get(self, url, kind=NODE_FETCH):
+        """
+        :param url: str
+        :param kind: NODE_FETCH or DOCUMENT_LOAD, whichever made the fetch
+        :return: FetchFailure or None if no recent failure is known for the URL
+        """
+        return self.entries.get((kind, url,))
+
+    def record(self, url, status=None, error=None, message=None, kind=NODE_FETCH):
+        """
+        :param url: str
+        :param status: int HTTP status of the failed response, if any
+        :param error: Exception raised by the fetch, if any
+        :param message: str message reported for the failure, if no exception was raised
+        :param kind: NODE_FETCH or DOCUMENT_LOAD, whichever made the fetch
+        :return: FetchFailure
+        """
+        failure = FetchFailure(url, status=status, error=error, message=message)
+        if self.ttl > 0:
+            self.entries.set((kind, url,), failure, expires_at=time.time() + self.ttl)
+        return failure
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        stats = self.entries.stats()
+        return {'entries': stats['entries'], 'hits': stats['hits']}
+
+
+_failure_cache = None
+_failure_cache_lock = threading.Lock()
+
+
+@after_fork
+def _reset_failure_cache_lock():
+    global _failure_cache_lock
+    _failure_cache_lock = threading.Lock()
+
+
+def get_failure_cache():
+    """
+    Returns the process-wide FailureCache, creating it with default settings on first use.
+    :return: FailureCache
+    """
+    global _failure_cache
+    with _failure_cache_lock:
+        if _failure_cache is None:
+            _failure_cache = FailureCache()
+        return _failure_cache
+
+
+def set_failure_cache(failure_cache):
+    """
+    Replaces the process-wide FailureCache, e.g. with one using a different TTL or with
+    FailureCache(ttl=0) to turn negative caching off. Pass None to have a default one
+    created again.
+    :param failure_cache: FailureCache or None
+    """
+    global _failure_cache
+    with _failure_cache_lock:
+        _failure_cache = failure_cache
@@ -0,0 +1,256 @@
+"""
+Compaction of JSON-LD documents into the Open Badges v2 context.
+
+Most documents badgecheck sees already declare the v2 context URL and use its terms
+as written, so a full expand and compact round trip through pyld returns them
+nearly unchanged. V2FastCompactor recognizes those documents and copies them
+directly, rewriting only what pyld would rewrite: type aliases such as "hosted"
+become "HostedBadge" and single-element arrays are unwrapped. Every rule it applies
+is derived from pyld's own output for that term, so anything it cannot vouch for is
+handed to pyld instead.
+"""
+import threading
+
+from .contexts import compact
+from .forking import register
+from .openbadges_context import OPENBADGES_CONTEXT_V2_DICT, OPENBADGES_CONTEXT_V2_URI
+from .utils import PinnedContextLoader
+
+
+MAX_DERIVED_TYPES = 1024
+
+# Sample values used to check how pyld compacts a term holding each kind of value.
+_KIND_SAMPLES = {
+    'string': u'urn:example:sample',
+    'number': 1,
+    'boolean': True,
+    'node': {u'name': u'sample'},
+}
+
+
+class _NotCompactable(Exception):
+    pass
+
+
+class V2FastCompactor(object):
+    """
+    Compacts documents that already use only the Open Badges v2 context without a
+    JSON-LD round trip, and says so when a document needs pyld instead.
+
+    Example usage:
+    compactor = V2FastCompactor()
+    result = compactor.compact(document)  # None if pyld is needed
+    """
+    def __init__(self):
+        context = OPENBADGES_CONTEXT_V2_DICT['@context']
+        self._loader = PinnedContextLoader()
+        self._terms = context
+        self._id_typed = frozenset(
+            term for term, definition in context.items()
+            if isinstance(definition, dict) and definition.get('@type') == '@id')
+        iris = [_expand_term(context, term) for term in context]
+        self._term_iris = tuple(iri for iri in iris if iri and ':' in iri)
+
+        self._property_rules = {}  # (term, value kind) -> bool, keeps its value and name
+        self._type_rules = {}  # type value -> compacted type value or None
+        self._lock = threading.Lock()
+        register(self)
+        self.fast = 0
+        self.fallback = 0
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def compact(self, document):
+        """
+        :param document: dict parsed from JSON
+        :return: dict equal to the pyld compaction of document against the v2 context,
+        or None if the document needs full JSON-LD processing
+        """
+        try:
+            if (not isinstance(document, dict) or
+                    document.get('@context') != OPENBADGES_CONTEXT_V2_URI):
+                raise _NotCompactable()
+            properties = [key for key in document if key != '@context']
+            if not properties or properties == ['id']:
+                # pyld drops top-level nodes that make no statements
+                raise _NotCompactable()
+
+            result = self._compact_node(document)
+        except _NotCompactable:
+            with self._lock:
+                self.fallback += 1
+            return None
+
+        result[u'@context'] = OPENBADGES_CONTEXT_V2_URI
+        with self._lock:
+            self.fast += 1
+        return result
+
+    def _compact_node(self, node):
+        if not node:
+            raise _NotCompactable()
+
+        result = {}
+        for key, value in node.items():
+            if key == '@context':
+                # Restating the v2 context changes nothing; pyld leaves it out of
+                # embedded nodes.
+                if value != OPENBADGES_CONTEXT_V2_URI:
+                    raise _NotCompactable()
+                continue
+            elif key == 'id':
+                result[key] = self._compact_iri(value)
+            elif key == 'type':
+                result[key] = self._compact_types(value)
+            else:
+                result[key] = self._compact_property(key, value)
+        return result
+
+    def _compact_property(self, term, value):
+        if not isinstance(value, list):
+            return self._compact_value(term, value)
+        if not value:
+            raise _NotCompactable()
+        if len(value) == 1:
+            return self._compact_value(term, value[0])
+        return [self._compact_value(term, item) for item in value]
+
+    def _compact_value(self, term, value):
+        if isinstance(value, bool):
+            kind = 'boolean'
+        elif isinstance(value, (int, long, float)):
+            kind = 'number'
+        elif isinstance(value, basestring):
+            kind = 'string'
+        elif isinstance(value, dict):
+            kind = 'node'
+        else:
+            raise _NotCompactable()
+
+        if not self._keeps_property(term, kind):
+            raise _NotCompactable()
+
+        if kind == 'node':
+            if term in self._id_typed and set(value) == {'id'}:
+                # A bare reference in an @id-typed property compacts to its IRI.
+                raise _NotCompactable()
+            return self._compact_node(value)
+        if kind == 'string' and term in self._id_typed:
+            return self._compact_iri(value)
+        return value
+
+    def _compact_iri(self, value):
+        """
+        IRIs are copied unchanged unless pyld would shorten them: relative IRIs,
+        compact IRIs and IRIs under a term's namespace are left to pyld.
+        """
+        if not isinstance(value, basestring):
+            raise _NotCompactable()
+        prefix, separator, suffix = value.partition(':')
+        if not separator or prefix in self._terms or value.startswith(self._term_iris):
+            raise _NotCompactable()
+        return value
+
+    def _compact_types(self, value):
+        if not isinstance(value, list):
+            return self._compact_type(value)
+        if not value:
+            raise _NotCompactable()
+        if len(value) == 1:
+            return self._compact_type(value[0])
+
+        types = [self._compact_type(item) for item in value]
+        if len(set(types)) != len(types):
+            raise _NotCompactable()
+        return types
+
+    def _compact_type(self, value):
+        if not isinstance(value, basestring):
+            raise _NotCompactable()
+        try:
+            compacted = self._type_rules[value]
+        except KeyError:
+            compacted = self._derive_type(value)
+        if compacted is None:
+            raise _NotCompactable()
+        return compacted
+
+    def _keeps_property(self, term, kind):
+        try:
+            return self._property_rules[(term, kind)]
+        except KeyError:
+            pass
+
+        keeps = False
+        if term in self._terms and not term.startswith('@'):
+            sample = _KIND_SAMPLES[kind]
+            try:
+                compacted = self._pyld_compact({term: sample})
+            except Exception:
+                # pyld cannot process this kind of value for the term at all
+                compacted = None
+            keeps = compacted == {u'@context': OPENBADGES_CONTEXT_V2_URI, term: sample}
+        with self._lock:
+            self._property_rules[(term, kind)] = keeps
+        return keeps
+
+    def _derive_type(self, value):
+        compacted = None
+        prefix = value.partition(':')[0]
+        if value in self._terms or (prefix != value and prefix in self._terms):
+            try:
+                result = self._pyld_compact({u'type': value, u'name': u'sample'})
+            except Exception:
+                result = {}
+            if isinstance(result.get('type'), basestring):
+                compacted = result['type']
+        with self._lock:
+            if len(self._type_rules) < MAX_DERIVED_TYPES:
+                self._type_rules[value] = compacted
+        return compacted
+
+    def _pyld_compact(self, properties):
+        document = dict(properties)
+        document[u'@context'] = OPENBADGES_CONTEXT_V2_URI
+        return compact(document, OPENBADGES_CONTEXT_V2_URI, options={'documentLoader': self._loader})
+
+
+def _expand_term(context, term, depth=0):
+    definition = context.get(term)
+    if isinstance(definition, dict):
+        definition = definition.get('@id')
+    if not isinstance(definition, basestring) or definition.startswith('@') or depth > 5:
+        return None
+    if definition in context:
+        return _expand_term(context, definition, depth + 1)
+    prefix, separator, suffix = definition.partition(':')
+    if separator and prefix in context and not suffix.startswith('//'):
+        base = _expand_term(context, prefix, depth + 1)
+        return base + suffix if base else None
+    return definition
+
+
+_fast_compactor = V2FastCompactor()
+
+
+def get_fast_compactor():
+    """
+    :return: the process-wide V2FastCompactor
+    """
+    return _fast_compactor
+
+
+def compact_to_v2(document, document_loader):
+    """
+    Compacts a parsed JSON-LD document against the Open Badges v2 context, skipping
+    JSON-LD processing when the document already uses only that context's terms.
+    :param document: dict parsed from JSON
+    :param document_loader: document loader for pyld, used when the fast path does not apply
+    :return: dict
+    """
+    result = _fast_compactor.compact(document)
+    if result is None:
+        result = compact(
+            document, OPENBADGES_CONTEXT_V2_URI, options={'documentLoader': document_loader})
+    return result
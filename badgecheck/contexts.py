@@ -0,0 +1,243 @@
+"""
+Memoized processing of the JSON-LD contexts that ship with badgecheck.
+
+Before expanding or compacting, pyld turns every @context into an "active context".
+For the Open Badges v2 context and the known extension contexts that result never
+changes, so it is built once per process and reused whenever the same context, or
+chain of contexts, is processed again. pyld's own cache is keyed on a JSON dump of
+both contexts, which costs nearly as much as it saves for a context this size.
+"""
+import threading
+
+from pyld import jsonld
+
+from .forking import register
+from .utils import pinned_contexts
+
+
+MAX_CACHED_CONTEXTS = 256
+
+
+class ActiveContextCache(object):
+    """
+    Remembers processed active contexts built from registered context documents.
+
+    A context is recognized by its URL, by the identity of its document or, failing
+    those, by equality with a registered document. Chains such as
+    [OPENBADGES_CONTEXT_V2_DICT, extension.context_json] are remembered as a whole,
+    separately for each document base IRI. Unregistered contexts are left to pyld.
+    """
+    def __init__(self, contexts=None, max_entries=MAX_CACHED_CONTEXTS):
+        """
+        :param contexts: dict of URL -> context document; defaults to pinned_contexts()
+        :param max_entries: number of processed active contexts to keep
+        """
+        if contexts is None:
+            contexts = pinned_contexts()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._documents = []  # registered @context values; position is the context key
+        self._by_url = {}
+        self._by_id = {}
+        self._active = {}  # (base, context keys...) -> active context
+        self._chains = {}  # id(active context) -> its key in _active
+        self._lock = threading.Lock()
+        register(self)
+        for url, document in contexts.items():
+            self.register(document, url)
+
+    def __len__(self):
+        return len(self._active)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def register(self, document, url=None):
+        """
+        Mark a context document as fixed for the life of the process.
+        :param document: dict, either a context or a document with an @context property
+        :param url: str URL the document is published at, if any
+        """
+        value = document.get('@context', document)
+        with self._lock:
+            key = self._by_id.get(id(value))
+            if key is None:
+                key = len(self._documents)
+                self._documents.append(value)
+                self._by_id[id(value)] = key
+            if url is not None:
+                self._by_url[url] = key
+
+    def get(self, active_ctx, local_ctx):
+        """
+        :param active_ctx: the active context local_ctx is processed against
+        :param local_ctx: a context, URL, or list of either
+        :return: tuple (key, active context); the key is None when local_ctx cannot
+        be cached, the active context is None when it has not been processed yet
+        """
+        parent = self._parent_key(active_ctx)
+        chain = self._chain_keys(local_ctx)
+        if parent is None or chain is None:
+            return None, None
+
+        key = parent + chain
+        with self._lock:
+            result = self._active.get(key)
+            if result is not None:
+                self.hits += 1
+        return key, result
+
+    def set(self, key, active_ctx):
+        """
+        Store a newly processed active context, counting the miss that required it.
+        """
+        with self._lock:
+            self.misses += 1
+            if key in self._active or len(self._active) >= self.max_entries:
+                return
+            self._active[key] = active_ctx
+            self._chains[id(active_ctx)] = key
+
+    def clear(self):
+        with self._lock:
+            self._active.clear()
+            self._chains.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _parent_key(self, active_ctx):
+        if not active_ctx.get('mappings') and not (
+                '@vocab' in active_ctx or '@language' in active_ctx):
+            return (active_ctx.get('@base'),)
+        key = self._chains.get(id(active_ctx))
+        if key is not None and self._active.get(key) is active_ctx:
+            return key
+        return None
+
+    def _chain_keys(self, local_ctx):
+        if isinstance(local_ctx, dict) and '@context' in local_ctx:
+            local_ctx = local_ctx['@context']
+        contexts = local_ctx if isinstance(local_ctx, list) else [local_ctx]
+        keys = tuple(self._context_key(ctx) for ctx in contexts)
+        if not keys or None in keys:
+            return None
+        return keys
+
+    def _context_key(self, ctx):
+        if isinstance(ctx, basestring):
+            return self._by_url.get(ctx)
+        if not isinstance(ctx, dict):
+            return None
+        if '@context' in ctx:
+            ctx = ctx['@context']
+            if not isinstance(ctx, dict):
+                return None
+
+        key = self._by_id.get(id(ctx))
+        if key is not None:
+            return key
+        for key, document in enumerate(self._documents):
+            if len(document) == len(ctx) and document == ctx:
+                return key
+        return None
+
+
+class CachingJsonLdProcessor(jsonld.JsonLdProcessor):
+    """
+    A pyld processor that takes processed active contexts from an ActiveContextCache.
+    Processed contexts are shared between callers, as with pyld's own cache.
+    """
+    def __init__(self, context_cache):
+        super(CachingJsonLdProcessor, self).__init__()
+        self.context_cache = context_cache
+
+    def process_context(self, active_ctx, local_ctx, options):
+        # Checked before pyld copies local_ctx and resolves its URLs.
+        key, cached = self.context_cache.get(active_ctx, local_ctx)
+        if cached is not None:
+            return cached
+        return super(CachingJsonLdProcessor, self).process_context(active_ctx, local_ctx, options)
+
+    def _process_context(self, active_ctx, local_ctx, options):
+        key, cached = self.context_cache.get(active_ctx, local_ctx)
+        if cached is not None:
+            return cached
+        result = super(CachingJsonLdProcessor, self)._process_context(active_ctx, local_ctx, options)
+        if key is not None:
+            self.context_cache.set(key, result)
+        return result
+
+
+class TypeResolver(object):
+    """
+    Expands values of the type property against one context with dictionary lookups.
+
+    The term -> IRI table is read once from the processed context. Terms, and compact
+    IRIs whose prefix is a term, such as extensions:ApplyLink or schema:ImageObject,
+    expand the way pyld would expand them; other prefixed values are expanded by pyld.
+
+    Example usage:
+    TypeResolver(OPENBADGES_CONTEXT_V2_DICT).expand('Assertion')
+    > 'https://w3id.org/openbadges#Assertion'
+    """
+    def __init__(self, context):
+        """
+        :param context: dict, either a context or a document with an @context property
+        """
+        self.context = context.get('@context', context)
+        self.fallbacks = 0
+
+        processor = CachingJsonLdProcessor(_context_cache)
+        options = {'base': ''}
+        active_ctx = processor.process_context(
+            processor._get_initial_context(options), self.context, options)
+        self.iris = dict((term, mapping['@id'] if mapping else None)
+                         for term, mapping in active_ctx['mappings'].items())
+
+    def expand(self, value):
+        """
+        :param value: str value of a type property
+        :return: the expanded value, None if the context maps it to null
+        """
+        if value in self.iris:
+            return self.iris[value]
+        if ':' not in value:
+            # Not a term, so relative to the empty document base.
+            return jsonld.prepend_base('', value)
+
+        prefix, suffix = value.split(':', 1)
+        if prefix == '_' or suffix.startswith('//'):
+            return value
+        iri = self.iris.get(prefix)
+        if iri:
+            return iri + suffix
+
+        self.fallbacks += 1
+        expanded = expand({'@context': self.context, 'type': value})
+        types = expanded[0].get('@type') if expanded else None
+        return types[0] if types else None
+
+
+_context_cache = ActiveContextCache()
+
+
+def get_context_cache():
+    """
+    :return: the process-wide ActiveContextCache used by compact and expand
+    """
+    return _context_cache
+
+
+def compact(input_, ctx, options=None):
+    """
+    Same as pyld.jsonld.compact, reusing processed active contexts for pinned contexts.
+    """
+    return CachingJsonLdProcessor(_context_cache).compact(input_, ctx, options)
+
+
+def expand(input_, options=None):
+    """
+    Same as pyld.jsonld.expand, reusing processed active contexts for pinned contexts.
+    """
+    return CachingJsonLdProcessor(_context_cache).expand(input_, options)
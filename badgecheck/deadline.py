@@ -0,0 +1,41 @@
+"""
+Time budgets for verifications.
+
+A verification given a deadline passes the time it has left down to every fetch and
+document load it makes, so no single slow server can hold it past its budget. Tasks
+still queued when the budget runs out are resolved as failed instead of being run.
+"""
+import time
+
+
+class Deadline(object):
+    """
+    A point in time by which a verification should be finished.
+
+    Example usage:
+    deadline = Deadline(10)
+    transport.get(url, timeout=deadline.remaining())
+    """
+    __slots__ = ('seconds', 'expires_at',)
+
+    def __init__(self, seconds):
+        """
+        :param seconds: number of seconds from now the deadline falls at
+        """
+        self.seconds = seconds
+        self.expires_at = time.time() + seconds
+
+    def remaining(self):
+        """
+        :return: float seconds left, never less than 0
+        """
+        return max(self.expires_at - time.time(), 0)
+
+    def expired(self):
+        return time.time() >= self.expires_at
+
+    def message(self):
+        """
+        :return: str result for a task left unfinished when the deadline passed
+        """
+        return 'Verification did not finish within its deadline of {} seconds.'.format(self.seconds)
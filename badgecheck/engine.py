@@ -0,0 +1,193 @@
+"""
+Running the queued tasks of a verification.
+
+run_tasks executes ready tasks one at a time, lowest task_id first. A
+ConcurrentTaskRunner starts each network-bound task on a worker thread as soon as it
+is queued, and keeps executing other ready tasks while fetches wait on the network,
+so fetches that do not depend on each other overlap. Every action is still
+dispatched to the store on the thread running the verification, so reducers never
+run concurrently. The verification arrives at the same set of graph nodes and
+messages either way, but with a ConcurrentTaskRunner they are recorded in the order
+the fetches complete, which may vary from run to run.
+"""
+import Queue
+
+from .actions.tasks import resolve_task
+from .exceptions import SkipTask, TaskPrerequisitesError
+from .pools import FETCH_POOL, get_thread_pool
+from .scheduler import TaskScheduler
+from .state import get_task_by_id
+from .tasks import task_named
+from .tasks.task_types import FETCH_HTTP_NODE
+
+
+DEFAULT_FETCH_WORKERS = 4
+
+# Tasks that spend their time waiting on the network and whose outcome depends only on
+# their task_meta and the verification options, not on the state when they run.
+NETWORK_TASKS = (FETCH_HTTP_NODE,)
+
+
+def run_task(task_func, task_meta, state, options=None):
+    """
+    Calls a task function and catches the errors tasks may raise.
+    :param task_func: func
+    :param task_meta: dict (single entry in tasks state)
+    :param state: state the task reads
+    :param options: dict of verification options passed to the task as keyword arguments
+    :return: tuple (resolution, actions), where resolution is a (success, message) tuple,
+    or None if the task asked to be skipped
+    """
+    try:
+        success, message, actions = task_func(state, task_meta, **(options or {}))
+    except SkipTask:
+        # TODO: Implement skip handling.
+        return None, []
+    except TaskPrerequisitesError:
+        return (False, "Task could not run due to unmet prerequisites."), []
+    except Exception as e:
+        return (False, "{} {}".format(e.__class__, e.message)), []
+    return (success, message), actions
+
+
+def apply_task_outcome(task_meta, outcome, store, recorder=None):
+    """
+    Resolves a task with the outcome returned by run_task and dispatches its actions.
+    :param task_meta: dict (single entry in tasks state)
+    :param outcome: tuple (resolution, actions)
+    :param store: pydux store
+    :param recorder: SubgraphRecorder noting the outcomes of reusable subgraphs
+    """
+    resolution, actions = outcome
+    if resolution is not None:
+        success, message = resolution
+        store.dispatch(resolve_task(task_meta.get('task_id'), success=success, result=message))
+
+    # Make updates and queue up next tasks.
+    subgraph_key = task_meta.get('subgraph_key')
+    for action in actions:
+        if recorder is not None and subgraph_key is not None:
+            recorder.dispatch(store, subgraph_key, action)
+        else:
+            store.dispatch(action)
+
+
+def expire_tasks(store, deadline):
+    """
+    Resolves every incomplete task as failed because the verification's deadline passed.
+    :param store: pydux store
+    :param deadline: badgecheck.deadline.Deadline
+    """
+    message = deadline.message()
+    for task in store.get_state()['tasks']:
+        if not task.get('complete'):
+            store.dispatch(resolve_task(task['task_id'], success=False, result=message))
+
+
+def run_tasks(store, options=None, recorder=None):
+    """
+    Runs queued tasks one at a time until none is ready, or until the deadline in
+    options passes.
+    :param store: pydux store
+    :param options: dict of verification options passed to tasks as keyword arguments
+    :param recorder: SubgraphRecorder noting the outcomes of reusable subgraphs
+    """
+    deadline = (options or {}).get('deadline')
+    scheduler = TaskScheduler()
+    scheduler.sync(store.get_state())
+
+    last_task_id = 0
+    task_id = scheduler.next_task_id()
+    while task_id is not None:
+        if task_id == last_task_id:
+            break
+        if deadline is not None and deadline.expired():
+            expire_tasks(store, deadline)
+            break
+
+        task_meta = get_task_by_id(store.get_state(), task_id)
+        task_func = task_named(task_meta['name'])
+
+        last_task_id = task_id
+        outcome = run_task(task_func, task_meta, store.get_state(), options)
+        apply_task_outcome(task_meta, outcome, store, recorder)
+        scheduler.sync(store.get_state())
+        task_id = scheduler.next_task_id()
+
+
+class ConcurrentTaskRunner(object):
+    """
+    Runs queued tasks like run_tasks, while network tasks run on a thread pool. The
+    resulting graph nodes and messages are the same set run_tasks would produce, in the
+    order the fetches complete rather than in task_id order.
+
+    Example usage:
+    ConcurrentTaskRunner(fetch_workers=8).run(store, options)
+    """
+    def __init__(self, fetch_workers=DEFAULT_FETCH_WORKERS):
+        """
+        :param fetch_workers: int number of network tasks run at once. Runners with the
+        same number share one process-wide pool of that many threads.
+        """
+        self.fetch_workers = fetch_workers
+
+    def run(self, store, options=None, recorder=None):
+        """
+        :param store: pydux store
+        :param options: dict of verification options passed to tasks as keyword arguments
+        :param recorder: SubgraphRecorder noting the outcomes of reusable subgraphs
+        """
+        # Should this run fail, fetches it started finish on the shared pool unheard.
+        self._run(get_thread_pool(FETCH_POOL, self.fetch_workers), store, options, recorder)
+
+    def _run(self, pool, store, options, recorder):
+        deadline = (options or {}).get('deadline')
+        started = {}  # task_id -> AsyncResult of run_task
+        in_flight = set()  # task_ids of started network tasks that have not finished
+        finished = Queue.Queue()  # task_ids of network tasks as they finish
+        seen = 0  # number of tasks already checked for network tasks to start
+        scheduler = TaskScheduler()
+
+        while True:
+            if deadline is not None and deadline.expired():
+                # Fetches still in flight are bounded by the deadline and finish unheard.
+                expire_tasks(store, deadline)
+                break
+
+            state = store.get_state()
+            task_list = state['tasks']
+            for i in range(seen, len(task_list)):
+                task_meta = task_list[i]
+                if (task_meta.get('name') in NETWORK_TASKS and not task_meta.get('complete') and
+                        not task_meta.get('prerequisites')):
+                    task_id = task_meta['task_id']
+                    in_flight.add(task_id)
+                    started[task_id] = pool.apply_async(
+                        run_task, (task_named(task_meta['name']), task_meta, state, options),
+                        callback=lambda outcome, task_id=task_id: finished.put(task_id))
+            seen = len(task_list)
+            scheduler.sync(state)
+
+            while not finished.empty():
+                in_flight.discard(finished.get())
+            task_id = scheduler.next_task_id(exclude=in_flight)
+            if task_id is None:
+                if not in_flight:
+                    break
+                try:
+                    in_flight.discard(finished.get(
+                        timeout=deadline.remaining() if deadline is not None else None))
+                except Queue.Empty:
+                    pass
+                continue
+
+            task_meta = get_task_by_id(state, task_id)
+            result = started.pop(task_id, None)
+            if result is None:
+                outcome = run_task(task_named(task_meta['name']), task_meta, state, options)
+            else:
+                outcome = result.get()
+            apply_task_outcome(task_meta, outcome, store, recorder)
+            if outcome[0] is None:
+                # A skipped task stays queued; stop as run_tasks does.
+                break
@@ -23,3 +23,19 @@ class ValidationError(Exception):
     This exception is used in tasks to indicate that a requirement has not been met.
     """
     pass
+
+
+class FetchTimeout(Exception):
+    """
+    This exception indicates that fetching a remote resource did not complete
+    within the time allowed for it.
+    """
+    pass
+
+
+class DeadlineExceeded(FetchTimeout):
+    """
+    This exception indicates that the deadline of a verification passed before a
+    remote resource could be fetched.
+    """
+    pass
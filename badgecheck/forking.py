@@ -0,0 +1,43 @@
+"""
+Making process-wide state usable in a forked child process.
+
+A forked child gets copies of every lock, pooled connection and SQLite connection its
+parent held. A lock another thread held at the moment of the fork is never released in
+the child, and connections must not be used by two processes. Objects and modules that
+keep such state register here, and reset_after_fork gives each of them fresh locks and
+connections, keeping their configuration and cached contents.
+"""
+import weakref
+
+
+_objects = weakref.WeakSet()
+_callbacks = []
+
+
+def register(obj):
+    """
+    :param obj: object with an _after_fork method, called by reset_after_fork
+    :return: obj
+    """
+    _objects.add(obj)
+    return obj
+
+
+def after_fork(func):
+    """
+    Decorator for module level functions to call in reset_after_fork, before the
+    registered objects are reset.
+    """
+    _callbacks.append(func)
+    return func
+
+
+def reset_after_fork():
+    """
+    Call first thing in a forked child process, before it starts any threads, e.g. as
+    the initializer of a multiprocessing.Pool.
+    """
+    for func in _callbacks:
+        func()
+    for obj in list(_objects):
+        obj._after_fork()
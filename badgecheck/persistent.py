@@ -0,0 +1,309 @@
+"""
+Immutable collections with structural sharing, for use in reducer state.
+
+Updates return a new collection that shares all untouched internal nodes with
+the original, so an append, set or assoc costs O(log32 n) rather than a copy of
+the whole collection. Nothing here is mutated after construction, which keeps
+reducers pure while old states remain valid.
+"""
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+HASH_MASK = (1 << 64) - 1
+
+
+class PersistentVector(object):
+    """
+    An immutable sequence implemented as a 32-way trie with a separate tail chunk.
+
+    Example usage:
+    v1 = PersistentVector(['a', 'b'])
+    v2 = v1.append('c')
+    > len(v1), len(v2)
+    (2, 3)
+    """
+    __slots__ = ('_count', '_shift', '_root', '_tail')
+
+    def __init__(self, iterable=None):
+        self._count = 0
+        self._shift = BITS
+        self._root = ()
+        self._tail = ()
+        if iterable is not None:
+            vector = self.extend(iterable)
+            self._count, self._shift, self._root, self._tail = (
+                vector._count, vector._shift, vector._root, vector._tail)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for chunk in self._iter_chunks(self._root, self._shift):
+            for value in chunk:
+                yield value
+        for value in self._tail:
+            yield value
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('PersistentVector index out of range')
+        return self._chunk_for(i)[i & MASK]
+
+    def __repr__(self):
+        return 'PersistentVector({!r})'.format(list(self))
+
+    def append(self, value):
+        """
+        Return a new vector with value added to the end.
+        """
+        if self._count - self._tail_offset() < WIDTH:
+            return self._new(self._count + 1, self._shift, self._root, self._tail + (value,))
+
+        shift = self._shift
+        if (self._count >> BITS) > (1 << shift):
+            root = (self._root, _new_path(shift, self._tail))
+            shift += BITS
+        else:
+            root = self._push_tail(shift, self._root, self._tail)
+        return self._new(self._count + 1, shift, root, (value,))
+
+    def extend(self, iterable):
+        vector = self
+        for value in iterable:
+            vector = vector.append(value)
+        return vector
+
+    def set(self, i, value):
+        """
+        Return a new vector with the entry at position i replaced by value.
+        """
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('PersistentVector assignment index out of range')
+
+        if i >= self._tail_offset():
+            j = i & MASK
+            return self._new(self._count, self._shift, self._root,
+                             self._tail[:j] + (value,) + self._tail[j + 1:])
+        return self._new(self._count, self._shift,
+                         _assoc_path(self._shift, self._root, i, value), self._tail)
+
+    @classmethod
+    def _new(cls, count, shift, root, tail):
+        vector = cls.__new__(cls)
+        vector._count = count
+        vector._shift = shift
+        vector._root = root
+        vector._tail = tail
+        return vector
+
+    def _tail_offset(self):
+        if self._count < WIDTH:
+            return 0
+        return ((self._count - 1) >> BITS) << BITS
+
+    def _chunk_for(self, i):
+        if i >= self._tail_offset():
+            return self._tail
+        node = self._root
+        level = self._shift
+        while level > 0:
+            node = node[(i >> level) & MASK]
+            level -= BITS
+        return node
+
+    def _push_tail(self, level, parent, tail_node):
+        subidx = ((self._count - 1) >> level) & MASK
+        if level == BITS:
+            node_to_insert = tail_node
+        elif subidx < len(parent):
+            node_to_insert = self._push_tail(level - BITS, parent[subidx], tail_node)
+        else:
+            node_to_insert = _new_path(level - BITS, tail_node)
+        return parent[:subidx] + (node_to_insert,) + parent[subidx + 1:]
+
+    @classmethod
+    def _iter_chunks(cls, node, level):
+        if level == 0:
+            yield node
+            return
+        for child in node:
+            for chunk in cls._iter_chunks(child, level - BITS):
+                yield chunk
+
+
+def _new_path(level, node):
+    while level > 0:
+        node = (node,)
+        level -= BITS
+    return node
+
+
+def _assoc_path(level, node, i, value):
+    subidx = (i >> level) & MASK
+    if level == 0:
+        return node[:subidx] + (value,) + node[subidx + 1:]
+    return node[:subidx] + (_assoc_path(level - BITS, node[subidx], i, value),) + node[subidx + 1:]
+
+
+class PersistentMap(object):
+    """
+    An immutable mapping implemented as a hash array mapped trie (HAMT).
+
+    Example usage:
+    m1 = PersistentMap().set('a', 1)
+    m2 = m1.set('b', 2)
+    > m1.get('b'), m2.get('b')
+    (None, 2)
+    """
+    __slots__ = ('_count', '_root')
+
+    def __init__(self):
+        self._count = 0
+        self._root = _BitmapNode(0, ())
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for entry in self._root.entries_iter():
+            yield entry.key
+
+    def __repr__(self):
+        return 'PersistentMap({!r})'.format(dict(self.items()))
+
+    def items(self):
+        return [(entry.key, entry.value) for entry in self._root.entries_iter()]
+
+    def get(self, key, default=None):
+        return self._root.find(0, hash(key) & HASH_MASK, key, default)
+
+    def set(self, key, value):
+        """
+        Return a new map in which key is associated with value.
+        """
+        root, added = self._root.assoc(0, _Entry(hash(key) & HASH_MASK, key, value))
+        if root is self._root:
+            return self
+        new_map = PersistentMap.__new__(PersistentMap)
+        new_map._root = root
+        new_map._count = self._count + (1 if added else 0)
+        return new_map
+
+
+_MISSING = object()
+
+
+class _Entry(object):
+    __slots__ = ('hash', 'key', 'value')
+
+    def __init__(self, key_hash, key, value):
+        self.hash = key_hash
+        self.key = key
+        self.value = value
+
+
+def _popcount(value):
+    return bin(value).count('1')
+
+
+class _BitmapNode(object):
+    __slots__ = ('bitmap', 'children')
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children
+
+    def entries_iter(self):
+        for child in self.children:
+            if isinstance(child, _Entry):
+                yield child
+            else:
+                for entry in child.entries_iter():
+                    yield entry
+
+    def find(self, shift, key_hash, key, default):
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return default
+        child = self.children[_popcount(self.bitmap & (bit - 1))]
+        if isinstance(child, _Entry):
+            if child.hash == key_hash and child.key == key:
+                return child.value
+            return default
+        return child.find(shift + BITS, key_hash, key, default)
+
+    def assoc(self, shift, entry):
+        bit = 1 << ((entry.hash >> shift) & MASK)
+        idx = _popcount(self.bitmap & (bit - 1))
+        if not self.bitmap & bit:
+            children = self.children[:idx] + (entry,) + self.children[idx:]
+            return _BitmapNode(self.bitmap | bit, children), True
+
+        child = self.children[idx]
+        if isinstance(child, _Entry):
+            if child.hash == entry.hash and child.key == entry.key:
+                if child.value is entry.value:
+                    return self, False
+                new_child, added = entry, False
+            else:
+                new_child, added = _merge_entries(shift + BITS, child, entry), True
+        else:
+            new_child, added = child.assoc(shift + BITS, entry)
+            if new_child is child:
+                return self, False
+
+        children = self.children[:idx] + (new_child,) + self.children[idx + 1:]
+        return _BitmapNode(self.bitmap, children), added
+
+
+class _CollisionNode(object):
+    __slots__ = ('hash', 'children')
+
+    def __init__(self, key_hash, children):
+        self.hash = key_hash
+        self.children = children
+
+    def entries_iter(self):
+        return iter(self.children)
+
+    def find(self, shift, key_hash, key, default):
+        for child in self.children:
+            if child.key == key:
+                return child.value
+        return default
+
+    def assoc(self, shift, entry):
+        if entry.hash != self.hash:
+            wrapper = _BitmapNode(1 << ((self.hash >> shift) & MASK), (self,))
+            return wrapper.assoc(shift, entry)
+
+        for i, child in enumerate(self.children):
+            if child.key == entry.key:
+                if child.value is entry.value:
+                    return self, False
+                children = self.children[:i] + (entry,) + self.children[i + 1:]
+                return _CollisionNode(self.hash, children), False
+        return _CollisionNode(self.hash, self.children + (entry,)), True
+
+
+def _merge_entries(shift, first, second):
+    if first.hash == second.hash:
+        return _CollisionNode(first.hash, (first, second))
+
+    first_idx = (first.hash >> shift) & MASK
+    second_idx = (second.hash >> shift) & MASK
+    if first_idx == second_idx:
+        return _BitmapNode(1 << first_idx, (_merge_entries(shift + BITS, first, second),))
+    if first_idx > second_idx:
+        first, second = second, first
+    return _BitmapNode((1 << first_idx) | (1 << second_idx), (first, second))
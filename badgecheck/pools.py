@@ -0,0 +1,48 @@
+"""
+Thread pools shared by every verification in a process.
+
+Starting a ThreadPool starts its worker threads and three housekeeping threads, which
+costs more than many of the fetches it runs. Pools are therefore created on first use
+and kept for the life of the process, one per kind of work and size. Each kind of work
+gets its own pools because work in one may wait on work in another: a fetch task may
+wait for a prefetch, and would deadlock if every thread that could run the prefetch
+were busy with such fetch tasks.
+"""
+from multiprocessing.pool import ThreadPool
+import threading
+
+from .forking import after_fork
+
+
+FETCH_POOL = 'FETCH'
+PREFETCH_POOL = 'PREFETCH'
+
+_pools = {}  # (kind, workers) -> ThreadPool
+_pools_lock = threading.Lock()
+
+
+@after_fork
+def _reset_pools():
+    global _pools, _pools_lock
+    # The parent's pool threads do not exist in the child. Without cancelling their
+    # exit handlers, the child would try to shut them down when it exits.
+    for pool in _pools.values():
+        pool._terminate.cancel()
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+def get_thread_pool(kind, workers):
+    """
+    Returns the process-wide pool of workers threads for one kind of work, creating it
+    on first use. Callers share it and must not close or terminate it.
+    :param kind: str such as FETCH_POOL or PREFETCH_POOL
+    :param workers: int number of threads
+    :return: multiprocessing.pool.ThreadPool
+    """
+    key = (kind, workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ThreadPool(workers)
+        return pool
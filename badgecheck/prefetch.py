@@ -0,0 +1,122 @@
+"""
+Speculative fetching of the documents a verification is going to need.
+
+The badge class of an assertion is fetched only once validation reaches the
+assertion's badge property, and its issuer only once the badge class has been
+validated in turn. As soon as a node is compacted, a Prefetcher looks at the
+properties its class validates with fetch: True, such as badge, issuer and
+verification.creator, and starts fetching their URLs in the background. The
+FETCH_HTTP_NODE tasks queued later take the prefetched response instead of making
+the request themselves.
+"""
+import threading
+
+from .cache import get_failure_cache
+from .pools import get_thread_pool, PREFETCH_POOL
+from .tasks.graph import FETCH_HEADERS
+from .tasks.utils import is_url
+from .tasks.validation import ClassValidators, OBClasses, ValueTypes
+from .transport import get_transport
+from .utils import list_of
+
+
+DEFAULT_PREFETCH_WORKERS = 4
+
+
+class Prefetcher(object):
+    """
+    Fetches linked documents ahead of the tasks that will validate them, for the
+    length of one verification.
+
+    Example usage:
+    prefetcher = Prefetcher()
+    prefetcher.scan(node, 'Assertion')
+    response = prefetcher.take(node['badge'])
+    prefetcher.close()
+    """
+    def __init__(self, transport=None, failure_cache=None, workers=DEFAULT_PREFETCH_WORKERS,
+                 deadline=None):
+        """
+        :param transport: HttpTransport to fetch through instead of the process-wide one
+        :param failure_cache: FailureCache of URLs not worth fetching again yet
+        :param workers: int number of documents fetched at once. Prefetchers with the
+        same number share one process-wide pool of that many threads.
+        :param deadline: Deadline of the verification, bounding each fetch
+        """
+        self.transport = transport or get_transport()
+        self.failure_cache = failure_cache or get_failure_cache()
+        self.deadline = deadline
+        self.workers = workers
+        self._fetches = {}  # url -> AsyncResult of transport.get, until taken
+        self._started = set()  # every url prefetched
+        self._lock = threading.Lock()
+
+    def scan(self, node, node_class=None):
+        """
+        Start fetching the documents a compacted node links to by properties its class
+        fetches, including those of the nodes embedded in it.
+        :param node: dict compacted JSON-LD node
+        :param node_class: str OBClasses class the node is validated as, or None to go by
+        its type
+        """
+        if not isinstance(node, dict):
+            return
+        try:
+            validators = ClassValidators(node_class or _class_from_type(node)).validators
+        except NotImplementedError:
+            return
+
+        for validator in validators:
+            if validator.get('prop_type') != ValueTypes.ID:
+                continue
+            for value in list_of(node.get(validator['prop_name'])):
+                if isinstance(value, dict):
+                    self.scan(value, validator.get('expected_class'))
+                elif validator.get('fetch') and is_url(value):
+                    self.prefetch(value)
+
+    def prefetch(self, url):
+        """
+        Start fetching url in the background, unless it was prefetched already,
+        recently failed or the deadline has passed.
+        """
+        if self.failure_cache.get(url) is not None:
+            return
+        if self.deadline is not None and self.deadline.expired():
+            return
+        timeout = self.deadline.remaining() if self.deadline is not None else None
+        with self._lock:
+            if url in self._started:
+                return
+            self._started.add(url)
+            pool = get_thread_pool(PREFETCH_POOL, self.workers)
+            self._fetches[url] = pool.apply_async(
+                self.transport.get, (url,), {'headers': FETCH_HEADERS, 'timeout': timeout})
+
+    def take(self, url):
+        """
+        Hand over the prefetched response for url, waiting for it if it is still in flight.
+        Raises the exception the fetch raised, if any.
+        :return: requests.Response, or None if url was not prefetched
+        """
+        with self._lock:
+            fetch = self._fetches.pop(url, None)
+        if fetch is None:
+            return None
+        return fetch.get()
+
+    def close(self):
+        """
+        Stop taking new work. Fetches still in flight finish in the background.
+        """
+        with self._lock:
+            self._fetches.clear()
+
+
+def _class_from_type(node):
+    for node_type in list_of(node.get('type')):
+        if node_type in OBClasses.ALL_CLASSES:
+            return node_type
+        if node_type == 'Issuer':
+            return OBClasses.Profile
+    return None
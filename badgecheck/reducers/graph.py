@@ -1,18 +1,25 @@
 import copy
+import itertools
 
 from ..actions.action_types import ADD_NODE, PATCH_NODE, UPDATE_NODE
-from ..state import get_node_by_id
+from ..state import get_node_by_id, NodeGraph
 
 
-current_node_number = -1
+# Blank node ids are unique within the process, even across concurrent verifications,
+# so nodes reused from one verification in another cannot collide. next() on a count
+# is atomic.
+_blank_node_numbers = itertools.count()
 def _get_next_blank_node_id():
-    global current_node_number
-    current_node_number += 1
-    return "_:b{}".format(current_node_number)
+    return "_:b{}".format(next(_blank_node_numbers))
     # TODO: Handle case where current blank node id is already in the node list
 
 
 def _flatten_node(node, node_id=None):
+    """
+    Returns copies of node and each node nested within it, with nested nodes replaced
+    by their ids. The input node is not modified, so it need not be deep-copied first.
+    """
+    node = node.copy()
     if node.get('id') is None:
         node['id'] = node_id or _get_next_blank_node_id()
     node_list = []
@@ -23,12 +30,13 @@ def _flatten_node(node, node_id=None):
             node_list.extend(_flatten_node(node[prop], prop_id))
             node[prop] = prop_id
         elif isinstance(node[prop], list):
-            current_list = node[prop]
+            current_list = [copy.deepcopy(val) if isinstance(val, list) else val for val in node[prop]]
             dict_indices = [i for i in range(len(current_list)) if isinstance(current_list[i], dict)]
             for index in dict_indices:
                 prop_id = current_list[index].get('id', _get_next_blank_node_id())
                 node_list.extend(_flatten_node(current_list[index], prop_id))
                 current_list[index] = prop_id
+            node[prop] = current_list
 
     node_list.append(node)
     return node_list
@@ -39,21 +47,21 @@ def graph_reducer(state=None, action=None):
         state = []
 
     if action.get('type') == ADD_NODE:
-        state = list(state)  # copy state instead of mutating original
-        new_node = copy.deepcopy(action.get('data'))
-        new_nodes = _flatten_node(new_node, action.get('node_id'))
-        state.extend(new_nodes)
+        if not isinstance(state, NodeGraph):
+            state = NodeGraph(state)
+        new_nodes = _flatten_node(action.get('data'), action.get('node_id'))
+        state = state.with_nodes_added(new_nodes)
     elif action.get('type') == UPDATE_NODE:
         # TODO
         raise NotImplementedError("TODO: Implement updating nodes.")
     elif action.get('type') == PATCH_NODE:
+        if not isinstance(state, NodeGraph):
+            state = NodeGraph(state)
         try:
             existing_node = get_node_by_id({'graph': state}, action.get('node_id'))
-            state = list(state)
             updated_node = copy.copy(existing_node)
             updated_node.update(action.get('data'))
-            state = [node for node in state if node is not existing_node]
-            state.append(updated_node)
+            state = state.with_node_replaced(action.get('node_id'), updated_node)
         except IndexError:
             pass
 
@@ -1,44 +1,56 @@
-from ..actions.action_types import ADD_TASK, RESOLVE_TASK, UPDATE_TASK
-from ..tasks.task_types import VALIDATE_EXPECTED_NODE_CLASS, VALIDATE_PROPERTY, VALIDATE_RDF_TYPE_PROPERTY
-from ..state import filter_active_tasks
+from ..actions.action_types import ADD_TASK, ADD_TASKS, RESOLVE_TASK, UPDATE_TASK
+from ..tasks.task_types import (FETCH_HTTP_NODE, VALIDATE_EXPECTED_NODE_CLASS,
+                                VALIDATE_NODE_PROPERTIES, VALIDATE_PROPERTY,
+                                VALIDATE_RDF_TYPE_PROPERTY,)
+from ..state import get_task_by_id, TaskTable
 
 
-def _task_to_add_exists(state, action):
-    try:
-        if action.get('name') == VALIDATE_EXPECTED_NODE_CLASS:
-            task = [t for t in state if
-                    action['name'] == t.get('name') and
-                    action.get('node_id') == t.get('node_id')][0]
+def _dedup_key(task):
+    """
+    Tasks that share a dedup key are equivalent; only the first one queued is kept.
+    Property validations are keyed on node and property regardless of which property
+    task type was queued.
+    """
+    name = task.get('name')
+    if name in (VALIDATE_EXPECTED_NODE_CLASS, VALIDATE_NODE_PROPERTIES,):
+        return (name, task.get('node_id'),)
+    elif name in (VALIDATE_PROPERTY, VALIDATE_RDF_TYPE_PROPERTY,):
+        return (VALIDATE_PROPERTY, task.get('node_id'), task.get('prop_name'),)
+    elif name == FETCH_HTTP_NODE:
+        return (name, task.get('url'),)
+    return None
 
-        elif action.get('name') in [VALIDATE_PROPERTY, VALIDATE_RDF_TYPE_PROPERTY]:
-            task = [t for t in state if
-                    action.get('node_id') == t.get('node_id') and
-                    action.get('prop_name') == t.get('prop_name')][0]
 
-        else:
-            return False
-    except IndexError:
-        return False
+def _as_task_table(state):
+    if isinstance(state, TaskTable):
+        return state
+    table = TaskTable()
+    for task in state:
+        table = table.with_task_added(task, _dedup_key(task))
+    return table
 
-    return True
+
+def _task_to_add_exists(state, action):
+    dedup_key = _dedup_key(action)
+    return dedup_key is not None and state.has_dedup_key(dedup_key)
 
 
 def task_reducer(state=None, action=None):
-    if state is None or len(state) == 0:
+    if state is None:
         state = []
-        task_counter = 1
-    else:
-        task_counter = state[-1]['task_id'] + 1
 
-    if action.get('type') == ADD_TASK and not _task_to_add_exists(state, action):
-        new_task = {'task_id': task_counter, 'complete': False}
-        for key in [k for k in action.keys() if k != 'type']:
-            new_task[key] = action[key]
-        return list(state) + [new_task]
+    if action.get('type') == ADD_TASK:
+        return _with_task_added(_as_task_table(state), action)
+
+    elif action.get('type') == ADD_TASKS:
+        state = _as_task_table(state)
+        for task in action['tasks']:
+            state = _with_task_added(state, task)
+        return state
 
     elif action.get('type') == RESOLVE_TASK:
         try:
-            task = [t for t in state if t['task_id'] == action['task_id']][0]
+            task = get_task_by_id({'tasks': state}, action['task_id'])
         except KeyError:
             return state
         else:
@@ -52,7 +64,7 @@ def task_reducer(state=None, action=None):
 
     elif action.get('type') == UPDATE_TASK:
         try:
-            task = [t for t in state if t['task_id'] == action['task_id']][0]
+            task = get_task_by_id({'tasks': state}, action['task_id'])
         except KeyError:
             return state
         else:
@@ -65,7 +77,19 @@ def task_reducer(state=None, action=None):
     return state
 
 
+def _with_task_added(state, task):
+    if _task_to_add_exists(state, task):
+        return state
+    new_task = {'task_id': state.next_task_id(), 'complete': False}
+    for key in [k for k in task.keys() if k != 'type']:
+        new_task[key] = task[key]
+    return state.with_task_added(new_task, _dedup_key(new_task))
+
+
 def _new_state_with_updated_item(state, item_id, update):
+    if isinstance(state, TaskTable):
+        return state.with_task_updated(item_id, update)
+
     new_state = []
     for i in range(0, len(state)):
         if item_id != state[i].get('task_id'):
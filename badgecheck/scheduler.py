@@ -0,0 +1,132 @@
+from collections import defaultdict
+import heapq
+
+from .state import get_task_by_id
+from .utils import list_of
+
+
+class TaskScheduler(object):
+    """
+    Tracks which queued tasks are ready to run without rescanning the task list.
+
+    A task is ready when it is incomplete and, for each of its prerequisites, at
+    least one task with that name exists and all tasks with that name are complete.
+    This matches the rule applied by state.filter_active_tasks. Ready tasks are
+    handed out lowest task_id first, the same order the list filter produces.
+
+    Example usage:
+    scheduler = TaskScheduler()
+    scheduler.sync(store.get_state())
+    task_id = scheduler.next_task_id()
+    """
+    def __init__(self):
+        self._ready = []  # heap of task_ids that were ready when pushed
+        self._waiters = defaultdict(list)  # prerequisite name -> blocked task_ids
+        self._incomplete = defaultdict(int)  # task name -> count of incomplete tasks
+        self._total = defaultdict(int)  # task name -> count of known tasks
+        self._tasks = {}  # task_id -> (name, prerequisites, complete)
+        self._dispatched = set()  # task_ids handed out but not yet seen complete
+        self._last_task_id = 0
+
+    def sync(self, state):
+        """
+        Ingest tasks added since the last sync and note completion of dispatched tasks.
+        Task ids are assigned in increasing order, so new tasks are found at the end
+        of the task list.
+        :param state: state object with "tasks" property
+        """
+        tasks = state.get('tasks', [])
+        new_tasks = []
+        for task in reversed(tasks):
+            if task['task_id'] <= self._last_task_id:
+                break
+            new_tasks.append(task)
+
+        for task in reversed(new_tasks):
+            self._add(task)
+
+        for task_id in list(self._dispatched):
+            task = get_task_by_id(state, task_id)
+            if task.get('complete'):
+                self._dispatched.discard(task_id)
+                self._complete(task_id)
+
+    def next_task_id(self, exclude=()):
+        """
+        Return the id of the lowest-numbered ready task without removing it,
+        or None if no task can run.
+        :param exclude: container of ready task_ids to pass over, such as tasks
+        already running elsewhere
+        """
+        passed_over = []
+        task_id = None
+        while self._ready:
+            candidate = self._ready[0]
+            name, prerequisites, complete = self._tasks[candidate]
+            if complete:
+                heapq.heappop(self._ready)
+                continue
+
+            blocking = self._first_unmet(prerequisites)
+            if blocking is not None:
+                # A task sharing a prerequisite's name was added after release.
+                heapq.heappop(self._ready)
+                self._waiters[blocking].append(candidate)
+                continue
+
+            if candidate in exclude:
+                passed_over.append(heapq.heappop(self._ready))
+                continue
+
+            self._dispatched.add(candidate)
+            task_id = candidate
+            break
+
+        for candidate in passed_over:
+            self._dispatched.add(candidate)
+            heapq.heappush(self._ready, candidate)
+        return task_id
+
+    def _add(self, task):
+        task_id = task['task_id']
+        name = task.get('name')
+        complete = bool(task.get('complete'))
+        prerequisites = tuple(list_of(task.get('prerequisites', [])))
+
+        self._last_task_id = max(self._last_task_id, task_id)
+        self._tasks[task_id] = (name, prerequisites, complete)
+        self._total[name] += 1
+        if complete:
+            self._release(name)
+        else:
+            self._incomplete[name] += 1
+            self._place(task_id)
+
+    def _complete(self, task_id):
+        name, prerequisites, complete = self._tasks[task_id]
+        if complete:
+            return
+        self._tasks[task_id] = (name, prerequisites, True)
+        self._incomplete[name] -= 1
+        self._release(name)
+
+    def _release(self, name):
+        if self._incomplete[name] or not self._waiters.get(name):
+            return
+        for task_id in self._waiters.pop(name):
+            self._place(task_id)
+
+    def _place(self, task_id):
+        name, prerequisites, complete = self._tasks[task_id]
+        blocking = self._first_unmet(prerequisites)
+        if blocking is None:
+            heapq.heappush(self._ready, task_id)
+        else:
+            self._waiters[blocking].append(task_id)
+
+    def _first_unmet(self, prerequisites):
+        for prereq in prerequisites:
+            if not self._total[prereq] or self._incomplete[prereq]:
+                return prereq
+        return None
+
@@ -0,0 +1,100 @@
+"""
+Coalescing of concurrent identical calls.
+
+When several threads ask for the same thing at once, only the first one does the
+work and the others wait for its outcome, so a popular issuer is fetched once per
+burst instead of once per badge being verified. A caller only waits as long as it
+would have been willing to wait for the call itself.
+"""
+import threading
+import time
+
+from .forking import register
+
+
+class WaitTimeout(Exception):
+    """
+    This exception indicates that a call being waited on did not finish within the
+    waiting caller's timeout.
+    """
+    pass
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time; callers arriving while it runs share
+    its return value, or the exception it raised.
+
+    Example usage:
+    flights = SingleFlight()
+    response = flights.do(url, lambda: session.get(url))
+    """
+    def __init__(self):
+        self._calls = {}  # key -> _Call in progress
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        register(self)
+
+    def _after_fork(self):
+        # Calls in flight in the parent never finish here.
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None, retry=None):
+        """
+        :param key: hashable identifying the call
+        :param func: callable taking no arguments
+        :param timeout: seconds this caller waits for a call already running, or None
+        :param retry: callable taking the exception a shared call raised; if it returns
+        True this caller makes the call again instead of raising that exception
+        :return: what func returned, for this caller or for the one already running it
+        :raises WaitTimeout: if the call this caller waits for is still running after timeout
+        """
+        expires_at = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                return self._run(key, call, func)
+
+            remaining = None if expires_at is None else max(expires_at - time.time(), 0)
+            if not call.done.wait(remaining):
+                raise WaitTimeout('Call {} still running after {} seconds'.format(key, timeout))
+            if call.error is None:
+                return call.result
+            if retry is None or not retry(call.error):
+                raise call.error
+
+    def _run(self, key, call, func):
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """
+        :return: int number of calls currently running
+        """
+        with self._lock:
+            return len(self._calls)
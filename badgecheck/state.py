@@ -1,5 +1,6 @@
 import six
 
+from .persistent import PersistentMap, PersistentVector
 from .utils import list_of
 
 INITIAL_STATE = {
@@ -13,8 +14,87 @@ MESSAGE_LEVEL_WARNING = 'WARNING'
 MESSAGE_LEVEL_INFO = 'INFO'
 MESSAGE_LEVELS = (MESSAGE_LEVEL_ERROR, MESSAGE_LEVEL_WARNING, MESSAGE_LEVEL_INFO,)
 
+TASK_STATUS_COMPLETE = 1
+TASK_STATUS_SUCCESS = 2
+
 
 # Tasks
+class TaskTable(object):
+    """
+    Read-only table of tasks, addressed directly by task_id and presented as a
+    sequence of task dicts in task_id order. Task ids are dense integers starting
+    at 1, so a task's position is its task_id - 1. Alongside each task dict the
+    table keeps its complete and success flags as status bits, and it keeps a set of
+    dedup keys so that the reducer can check for an equivalent task in O(1).
+    The task reducer returns a new TaskTable instead of modifying an existing one;
+    the underlying persistent vectors make adding or updating a task O(log32 n).
+    """
+    __slots__ = ('_rows', '_status', '_dedup_keys',)
+
+    def __init__(self):
+        self._rows = PersistentVector()
+        self._status = PersistentVector()
+        self._dedup_keys = PersistentMap()  # Used as a set; values are always True
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def __repr__(self):
+        return 'TaskTable({!r})'.format(list(self._rows))
+
+    def next_task_id(self):
+        return len(self._rows) + 1
+
+    def get(self, task_id, default=None):
+        if not isinstance(task_id, six.integer_types) or not 0 < task_id <= len(self._rows):
+            return default
+        return self._rows[task_id - 1]
+
+    def status(self, task_id):
+        return self._status[task_id - 1]
+
+    def has_dedup_key(self, dedup_key):
+        return dedup_key in self._dedup_keys
+
+    def failed_tasks(self):
+        return [self._rows[i] for i, status in enumerate(self._status)
+                if not status & TASK_STATUS_SUCCESS]
+
+    def with_task_added(self, task, dedup_key=None):
+        if task.get('task_id') != self.next_task_id():
+            raise ValueError('Task {} added out of order; expected task_id {}'.format(
+                task.get('task_id'), self.next_task_id()))
+        dedup_keys = self._dedup_keys
+        if dedup_key is not None:
+            dedup_keys = dedup_keys.set(dedup_key, True)
+        return self._new(
+            self._rows.append(task), self._status.append(_task_status(task)), dedup_keys)
+
+    def with_task_updated(self, task_id, task):
+        position = task_id - 1
+        return self._new(self._rows.set(position, task),
+                         self._status.set(position, _task_status(task)), self._dedup_keys)
+
+    @classmethod
+    def _new(cls, rows, status, dedup_keys):
+        table = cls.__new__(cls)
+        table._rows = rows
+        table._status = status
+        table._dedup_keys = dedup_keys
+        return table
+
+
+def _task_status(task):
+    return ((TASK_STATUS_COMPLETE if task.get('complete') else 0) |
+            (TASK_STATUS_SUCCESS if task.get('success') else 0))
+
+
 def filter_active_tasks(state):
     tasks = state.get('tasks')
 
@@ -34,8 +114,30 @@ def filter_active_tasks(state):
     return [t for t in tasks if _task_is_ready(t)]
 
 
+def get_task_by_id(state, task_id):
+    """
+    Return the task with the requested task_id.
+    :param state: state object with "tasks" property as a TaskTable or list
+    :param task_id: int
+    Raises IndexError if no task found.
+    """
+    tasks = state.get('tasks')
+    if isinstance(tasks, TaskTable):
+        task = tasks.get(task_id)
+        if task is None:
+            raise IndexError('No task found with task_id {}'.format(task_id))
+        return task
+    # The task reducer numbers tasks sequentially from 1, so ids double as positions.
+    if 0 < task_id <= len(tasks) and tasks[task_id - 1].get('task_id') == task_id:
+        return tasks[task_id - 1]
+    return [t for t in tasks if t.get('task_id') == task_id][0]
+
+
 def filter_failed_tasks(state):
-    return [t for t in state.get('tasks') if not t.get('success')]
+    tasks = state.get('tasks')
+    if isinstance(tasks, TaskTable):
+        return tasks.failed_tasks()
+    return [t for t in tasks if not t.get('success')]
 
 
 # Messages
@@ -57,22 +159,91 @@ def format_message(task_meta):
 
 
 # Graph
+class NodeGraph(object):
+    """
+    Read-only sequence of flattened graph nodes, indexed by node id.
+    The graph reducer returns a new NodeGraph instead of modifying an existing one.
+    Nodes and the id index live in persistent collections, so each new graph shares
+    its structure with the previous one and adding or replacing a node is O(log n).
+    When several nodes share an id, the index holds the first of them.
+    """
+    __slots__ = ('_nodes', '_index',)
+
+    def __init__(self, nodes=None):
+        self._nodes = PersistentVector()
+        self._index = PersistentMap()  # node id -> position in self._nodes
+        if nodes:
+            graph = self.with_nodes_added(nodes)
+            self._nodes, self._index = graph._nodes, graph._index
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __getitem__(self, i):
+        return self._nodes[i]
+
+    def __repr__(self):
+        return 'NodeGraph({!r})'.format(list(self._nodes))
+
+    def get(self, node_id, default=None):
+        position = self._index.get(node_id)
+        if position is None:
+            return default
+        return self._nodes[position]
+
+    def with_nodes_added(self, new_nodes):
+        nodes, index = self._nodes, self._index
+        for node in new_nodes:
+            if node.get('id') not in index:
+                index = index.set(node.get('id'), len(nodes))
+            nodes = nodes.append(node)
+        return self._new(nodes, index)
+
+    def with_node_replaced(self, node_id, updated_node):
+        """
+        Replace the indexed node for node_id in place. Raises IndexError if none exists.
+        """
+        position = self._index.get(node_id)
+        if position is None:
+            raise IndexError('No node found with id {}'.format(node_id))
+        return self._new(self._nodes.set(position, updated_node), self._index)
+
+    @classmethod
+    def _new(cls, nodes, index):
+        graph = cls.__new__(cls)
+        graph._nodes = nodes
+        graph._index = index
+        return graph
+
+
 def get_node_by_id(state, node_id):
     """
-    Filter state to return first node that matches the requested id.
-    :param state: state object with "graph" property as a list
+    Return first node that matches the requested id.
+    :param state: state object with "graph" property as a NodeGraph or list
     :param node_id: IRI-format string
     Raises IndexError if no node found.
     """
-    return [node for node in state['graph'] if node.get('id') == node_id][0]
+    graph = state['graph']
+    if isinstance(graph, NodeGraph):
+        try:
+            node = graph.get(node_id)
+        except TypeError:
+            node = None
+        if node is None:
+            raise IndexError('No node found with id {}'.format(node_id))
+        return node
+    return [node for node in graph if node.get('id') == node_id][0]
 
 
 def get_node_by_path(state, node_path):
     """
-    Filter state to return first node that matches the requested id and property path.
+    Return first node that matches the requested id and property path.
     A path takes the format ['_:b0', 'prop_name', 1, 'another_prop_name'].
     Each entry is either a string (dict key) or non-negative integer (list index).
-    :param state: state object with "graph" property as a list
+    :param state: state object with "graph" property as a NodeGraph or list
     :param node_path: node path list
     Raises IndexError if no node found or no list index found.
     Raises KeyError if no property found in node.
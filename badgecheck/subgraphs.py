@@ -0,0 +1,210 @@
+"""
+Reuse of validated badge class and issuer subgraphs across verifications.
+
+Many assertions share a few badge classes and issuers, and validating one of those
+documents gives the same result every time its content is the same. When
+FETCH_HTTP_NODE retrieves such a document, the verification records the nodes and
+task outcomes that grow from it. Later verifications that fetch identical content
+add those nodes and completed tasks directly instead of compacting and validating
+the document again. Documents the subgraph links to by fetching, such as a badge
+class's issuer, are still queued for fetching, so each is checked against its own
+current content.
+"""
+import hashlib
+import threading
+import time
+
+from .actions.action_types import ADD_NODE, ADD_TASK, ADD_TASKS, PATCH_NODE
+from .actions.graph import add_node
+from .actions.tasks import add_tasks
+from .cache import LRUCache
+from .forking import after_fork
+
+
+DEFAULT_MAX_SUBGRAPHS = 256
+DEFAULT_SUBGRAPH_TTL = 300
+
+# Classes whose validation depends only on the fetched document and documents it links to.
+CACHEABLE_CLASSES = ('BadgeClass', 'Profile',)
+
+
+class Subgraph(object):
+    """
+    The flattened nodes and completed tasks that grew from one fetched document,
+    and the fetches it queued for documents it links to.
+    """
+    __slots__ = ('key', 'nodes', 'tasks', 'fetches')
+
+    def __init__(self, key, nodes, tasks, fetches):
+        self.key = key
+        self.nodes = nodes
+        self.tasks = tasks
+        self.fetches = fetches
+
+    def actions(self):
+        """
+        :return: list of actions that add this subgraph's nodes and completed tasks to a
+        verification, and queue its fetches
+        """
+        actions = [add_node(node['id'], data=node) for node in self.nodes]
+        actions.append(add_tasks([dict((k, v) for k, v in task.items()
+                                       if k not in ('task_id', 'subgraph_key'))
+                                  for task in self.tasks]))
+        return actions + [dict(fetch) for fetch in self.fetches]
+
+
+class SubgraphCache(object):
+    """
+    Validated subgraphs keyed by the URL, expected class and content of the document
+    they grew from.
+
+    Example usage:
+    cache = SubgraphCache(max_entries=100)
+    verify(url, subgraph_cache=cache)
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_SUBGRAPHS, ttl=DEFAULT_SUBGRAPH_TTL):
+        """
+        :param max_entries: number of subgraphs kept
+        :param ttl: seconds a subgraph is reused; 0 turns reuse off
+        """
+        self.ttl = ttl
+        self.entries = LRUCache(max_entries=max_entries)
+
+    @staticmethod
+    def key(url, expected_class, content):
+        """
+        :param url: str URL the document was fetched from
+        :param expected_class: str class the document is validated as
+        :param content: unicode document text
+        :return: tuple key, or None if documents of expected_class are not cached
+        """
+        if expected_class not in CACHEABLE_CLASSES:
+            return None
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return (url, expected_class, digest,)
+
+    def get(self, key):
+        """
+        :return: Subgraph or None
+        """
+        return self.entries.get(key)
+
+    def set(self, subgraph):
+        if self.ttl > 0:
+            self.entries.set(subgraph.key, subgraph, expires_at=time.time() + self.ttl)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class _Recording(object):
+    __slots__ = ('node_ids', 'fetches', 'reusable')
+
+    def __init__(self):
+        self.node_ids = []
+        self.fetches = []
+        self.reusable = True
+
+
+class SubgraphRecorder(object):
+    """
+    Follows one verification and notes which nodes and tasks grow from each cacheable
+    document, as marked by the subgraph_key of the JSONLD_COMPACT_DATA task queued
+    for it. Tasks queued by a marked task are marked with the same key.
+    """
+    def __init__(self):
+        self._recordings = {}  # subgraph key -> _Recording
+
+    def dispatch(self, store, subgraph_key, action):
+        """
+        Dispatch an action returned by a task marked with subgraph_key and note what it
+        added. A subgraph that touched anything outside itself is not reusable.
+        """
+        from .tasks.task_types import FETCH_HTTP_NODE
+
+        recording = self._recordings.setdefault(subgraph_key, _Recording())
+        action_type = action.get('type')
+
+        if action_type == ADD_TASK and action.get('name') == FETCH_HTTP_NODE:
+            recording.fetches.append(action)
+            store.dispatch(action)
+        elif action_type == ADD_TASK:
+            task_count = len(store.get_state()['tasks'])
+            store.dispatch(dict(action, subgraph_key=subgraph_key))
+            if len(store.get_state()['tasks']) == task_count:
+                # An equivalent task queued elsewhere in this verification stands in for it.
+                recording.reusable = False
+        elif action_type == ADD_TASKS:
+            task_count = len(store.get_state()['tasks'])
+            store.dispatch(add_tasks([dict(task, subgraph_key=subgraph_key) for task in action['tasks']]))
+            if len(store.get_state()['tasks']) - task_count != len(action['tasks']):
+                recording.reusable = False
+        elif action_type == ADD_NODE:
+            graph = store.get_state()['graph']
+            node_count = len(graph)
+            store.dispatch(action)
+            new_graph = store.get_state()['graph']
+            for i in range(node_count, len(new_graph)):
+                node_id = new_graph[i].get('id')
+                if new_graph.get(node_id) is not new_graph[i]:
+                    recording.reusable = False
+                recording.node_ids.append(node_id)
+        elif action_type == PATCH_NODE and action.get('node_id') in recording.node_ids:
+            store.dispatch(action)
+        else:
+            recording.reusable = False
+            store.dispatch(action)
+
+    def save(self, state, cache):
+        """
+        Store each reusable subgraph whose tasks all completed.
+        :param state: final state of the verification
+        :param cache: SubgraphCache
+        """
+        tasks_by_key = {}
+        for task in state['tasks']:
+            if task.get('subgraph_key') is not None:
+                tasks_by_key.setdefault(task['subgraph_key'], []).append(task)
+
+        for subgraph_key, recording in self._recordings.items():
+            tasks = tasks_by_key.get(subgraph_key, [])
+            if not recording.reusable or not all(task.get('complete') for task in tasks):
+                continue
+            nodes = [state['graph'].get(node_id) for node_id in recording.node_ids]
+            cache.set(Subgraph(subgraph_key, nodes, tasks, recording.fetches))
+
+
+_subgraph_cache = None
+_subgraph_cache_lock = threading.Lock()
+
+
+@after_fork
+def _reset_subgraph_cache_lock():
+    global _subgraph_cache_lock
+    _subgraph_cache_lock = threading.Lock()
+
+
+def get_subgraph_cache():
+    """
+    Returns the process-wide SubgraphCache, creating it with default settings on first use.
+    :return: SubgraphCache
+    """
+    global _subgraph_cache
+    with _subgraph_cache_lock:
+        if _subgraph_cache is None:
+            _subgraph_cache = SubgraphCache()
+        return _subgraph_cache
+
+
+def set_subgraph_cache(subgraph_cache):
+    """
+    Replaces the process-wide SubgraphCache, e.g. with SubgraphCache(ttl=0) to turn
+    reuse off. Pass None to have a default one created again.
+    :param subgraph_cache: SubgraphCache or None
+    """
+    global _subgraph_cache
+    with _subgraph_cache_lock:
+        _subgraph_cache = subgraph_cache
@@ -5,7 +5,8 @@ from .graph import fetch_http_node, jsonld_compact_data
 from .validation import (assertion_timestamp_checks, assertion_verification_dependencies,
                         criteria_property_dependencies, detect_and_validate_node_class,
                         identity_object_property_dependencies, issuer_property_dependencies,
-                        validate_expected_node_class, validate_rdf_type_property, validate_property,)
+                        validate_expected_node_class, validate_node_properties,
+                        validate_rdf_type_property, validate_property,)
 from .verification import (hosted_id_in_verification_scope,)
 from .task_types import *
 
@@ -24,6 +25,7 @@ FUNCTIONS = {
     PROCESS_JWS_INPUT:                         process_jws_input,
     VALIDATE_EXPECTED_NODE_CLASS:              validate_expected_node_class,
     VALIDATE_EXTENSION_NODE:                   validate_extension_node,
+    VALIDATE_NODE_PROPERTIES:                  validate_node_properties,
     VALIDATE_RDF_TYPE_PROPERTY:                validate_rdf_type_property,
     VALIDATE_PROPERTY:                         validate_property,
     VERIFY_JWS:                                verify_jws_signature,
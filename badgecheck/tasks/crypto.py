@@ -11,7 +11,7 @@ from .utils import task_result
 from .task_types import ISSUER_PROPERTY_DEPENDENCIES, JSONLD_COMPACT_DATA, VERIFY_JWS, VERIFY_KEY_OWNERSHIP
 
 
-def process_jws_input(state, task_meta):
+def process_jws_input(state, task_meta, **options):
     try:
         data = task_meta['data']
     except KeyError:
@@ -30,7 +30,7 @@ def process_jws_input(state, task_meta):
     return task_result(True, "Processed JWS-signed data and queued signature verification task", actions)
 
 
-def verify_jws_signature(state, task_meta):
+def verify_jws_signature(state, task_meta, **options):
     try:
         data = task_meta['data']
         node_id = task_meta['node_id']
@@ -59,7 +59,7 @@ def verify_jws_signature(state, task_meta):
         True, "Signature for node {} passed verification".format(node_id), actions)
 
 
-def verify_key_ownership(state, task_meta):
+def verify_key_ownership(state, task_meta, **options):
     try:
         node_id = task_meta['node_id']
         issuer_node = get_node_by_path(state, [node_id, 'badge', 'issuer'])
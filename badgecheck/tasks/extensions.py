@@ -1,8 +1,8 @@
 import json
 import jsonschema
-from pyld import jsonld
 
 from ..actions.tasks import add_task
+from ..contexts import compact
 from ..exceptions import TaskPrerequisitesError
 from ..extensions import ALL_KNOWN_EXTENSIONS
 from ..openbadges_context import OPENBADGES_CONTEXT_V2_DICT
@@ -30,7 +30,7 @@ def _validate_single_extension(node, extension_type, node_json=None):
     schema = extension.validation_schema[schema_url]
 
     node_data['@context'] = OPENBADGES_CONTEXT_V2_DICT
-    compact_data = jsonld.compact(node_data, [OPENBADGES_CONTEXT_V2_DICT, context])
+    compact_data = compact(node_data, [OPENBADGES_CONTEXT_V2_DICT, context])
 
     try:
         jsonschema.validate(compact_data, schema)
@@ -49,7 +49,7 @@ def _validate_single_extension(node, extension_type, node_json=None):
     ))
 
 
-def validate_extension_node(state, task_meta):
+def validate_extension_node(state, task_meta, **options):
     try:
         if task_meta.get('node_id'):
             node_id = task_meta['node_id']
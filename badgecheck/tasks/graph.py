@@ -1,34 +1,70 @@
 import json
-from pyld import jsonld
-import requests
 
 from ..actions.graph import add_node
 from ..actions.tasks import add_task
-from ..exceptions import TaskPrerequisitesError, ValidationError
+from ..cache import get_failure_cache
+from ..compaction import compact_to_v2
+from ..exceptions import DeadlineExceeded, FetchTimeout, TaskPrerequisitesError, ValidationError
 from ..openbadges_context import OPENBADGES_CONTEXT_V2_URI
-from ..utils import CachableDocumentLoader, list_of
+from ..subgraphs import get_subgraph_cache
+from ..transport import get_transport
+from ..utils import get_document_loader, list_of
 
 from .task_types import (DETECT_AND_VALIDATE_NODE_CLASS, JSONLD_COMPACT_DATA,
                         VALIDATE_EXPECTED_NODE_CLASS, VALIDATE_EXTENSION_NODE,)
 from .utils import filter_tasks, task_result, is_iri
 
 
-def fetch_http_node(state, task_meta):
+FETCH_HEADERS = {'Accept': 'application/ld+json, application/json, image/png, image/svg+xml'}
+
+
+def fetch_http_node(state, task_meta, **options):
     url = task_meta['url']
 
-    result = requests.get(
-        url, headers={'Accept': 'application/ld+json, application/json, image/png, image/svg+xml'}
-    )
+    # A URL that just failed fails the same way again without another request.
+    failures = options.get('failure_cache') or get_failure_cache()
+    failure = failures.get(url)
+    if failure is not None:
+        if failure.error is not None:
+            raise failure.error
+        return task_result(success=False, message=failure.message)
+
+    transport = options.get('transport') or get_transport()
+    deadline = options.get('deadline')
+    try:
+        prefetcher = options.get('prefetcher')
+        result = prefetcher.take(url) if prefetcher is not None else None
+        if result is None and deadline is not None:
+            if deadline.expired():
+                raise DeadlineExceeded(deadline.message())
+            result = transport.get(url, headers=FETCH_HEADERS, timeout=deadline.remaining())
+        elif result is None:
+            result = transport.get(url, headers=FETCH_HEADERS)
+    except Exception as e:
+        # Running out of this verification's time budget says nothing about the server.
+        if deadline is None or not isinstance(e, FetchTimeout):
+            failures.record(url, error=e)
+        raise
 
     try:
         json.loads(result.text)
     except ValueError:
         if result.headers.get('Content-Type', 'UNKNOWN') in ['image/png', 'image/svg+xml']:
             return task_result(message='Successfully fetched image from {}'.format(url))
-        return task_result(success=False, message="Response could not be interpreted from url {}".format(url))
-
-    actions = [add_task(JSONLD_COMPACT_DATA, data=result.text, node_id=url,
-                        expected_class=task_meta.get('expected_class'))]
+        message = "Response could not be interpreted from url {}".format(url)
+        failures.record(url, status=result.status_code, message=message)
+        return task_result(success=False, message=message)
+
+    # A badge class or issuer already validated with this exact content is reused.
+    subgraph_cache = options.get('subgraph_cache') or get_subgraph_cache()
+    subgraph_key = subgraph_cache.key(url, task_meta.get('expected_class'), result.text)
+    subgraph = subgraph_cache.get(subgraph_key) if subgraph_key else None
+    if subgraph is not None:
+        actions = subgraph.actions()
+    else:
+        actions = [add_task(JSONLD_COMPACT_DATA, data=result.text, node_id=url,
+                            expected_class=task_meta.get('expected_class'),
+                            subgraph_key=subgraph_key)]
     return task_result(message="Successfully fetched JSON data from {}".format(url), actions=actions)
 
 
@@ -58,19 +94,25 @@ def _get_extension_actions(current_node, entry_path):
     return new_actions
 
 
-def jsonld_compact_data(state, task_meta):
+def jsonld_compact_data(state, task_meta, **options):
     try:
         input_data = json.loads(task_meta.get('data'))
     except TypeError:
         return task_result(False, "Could not load data")
 
-    options = {'documentLoader': CachableDocumentLoader(cachable=task_meta.get('use_cache', True))}
-    result = jsonld.compact(input_data, OPENBADGES_CONTEXT_V2_URI, options=options)
+    document_loader = (options.get('document_loader') or
+                       get_document_loader(cachable=task_meta.get('use_cache', True)))
+    result = compact_to_v2(input_data, document_loader)
     # TODO: We should not necessarily trust this ID over the source URL
     node_id = result.get('id', task_meta.get('node_id'))
     if not node_id:
         raise ValidationError("No node_id could be found in node or task declaration.")
 
+    # Start fetching the documents this node links to while it is validated.
+    prefetcher = options.get('prefetcher')
+    if prefetcher is not None:
+        prefetcher.scan(result, task_meta.get('expected_class'))
+
     actions = [
         add_node(node_id, data=result)
     ] + _get_extension_actions(result, [node_id])
@@ -1,12 +1,12 @@
 import json
-from pyld import jsonld
-import re
 import validators
 
 from ..actions.input import set_input_type, store_input
 from ..actions.tasks import add_task
+from ..compaction import compact_to_v2
 from ..openbadges_context import OPENBADGES_CONTEXT_V2_URI
-from ..utils import CachableDocumentLoader
+from ..utils import get_document_loader
+from primitives import JWS_PATTERN
 from task_types import FETCH_HTTP_NODE, PROCESS_JWS_INPUT
 from utils import task_result
 
@@ -27,14 +27,12 @@ def input_is_json(user_input):
 
 
 def input_is_jws(user_input):
-    jws_regex = re.compile(r'^[A-z0-9\-=]+.[A-z0-9\-=]+.[A-z0-9\-_=]+$')
-    return bool(jws_regex.match(user_input))
+    return bool(JWS_PATTERN.match(user_input))
 
 
-def find_id_in_jsonld(json_string):
+def find_id_in_jsonld(json_string, document_loader=None):
     input_data = json.loads(json_string)
-    options = {'documentLoader': CachableDocumentLoader(cachable=True)}
-    result = jsonld.compact(input_data, OPENBADGES_CONTEXT_V2_URI, options=options)
+    result = compact_to_v2(input_data, document_loader or get_document_loader(cachable=True))
     node_id = result.get('id','')
     return node_id
 
@@ -42,7 +40,7 @@ def find_id_in_jsonld(json_string):
 """
 Input-processing tasks
 """
-def detect_input_type(state, task_meta=None):
+def detect_input_type(state, task_meta=None, **options):
     """
     Detects what data format user has provided and saves to the store.
     """
@@ -55,7 +53,7 @@ def detect_input_type(state, task_meta=None):
         new_actions.append(set_input_type(detected_type))
         new_actions.append(add_task(FETCH_HTTP_NODE, url=input_value))
     elif input_is_json(input_value):
-        id_url = find_id_in_jsonld(input_value)
+        id_url = find_id_in_jsonld(input_value, options.get('document_loader'))
         if input_is_url(id_url):
             detected_type = 'url'
             new_actions.append(store_input(id_url))
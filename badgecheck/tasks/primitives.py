@@ -0,0 +1,309 @@
+"""
+Checks of primitive Open Badges values, the innermost loop of validation.
+
+Every property of every node passes through these checks, so the regular expressions
+they use are compiled once here, type values are expanded from a table built once from
+the Open Badges context, and one stateless PrimitiveValueValidator per value type is
+shared by all callers through get_validator. Node ids and linked URLs are checked over
+and over, across tasks and verifications, so each string is parsed as a URI once and
+the result kept in a bounded LRU cache.
+"""
+import aniso8601
+from datetime import datetime
+from pyld import jsonld
+from pytz import FixedOffset, utc
+import re
+import rfc3986
+import six
+
+from ..cache import LRUCache
+from ..contexts import TypeResolver
+from ..openbadges_context import OPENBADGES_CONTEXT_V2_DICT
+
+
+MAX_PARSED_URIS = 4096
+MAX_PARSED_URI_BYTES = 1024 * 1024
+
+BLANK_NODE_ID_PATTERN = re.compile(r'_:b\d+$')
+DATETIME_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(?:(Z)|([+-])(\d{2})(?::?(\d{2}))?)$')
+DATA_URI_PATTERN = re.compile(
+    r'(?P<scheme>^data):(?P<mimetypes>[^,]{0,}?)?(?P<encoding>base64)?,(?P<data>.*$)', re.IGNORECASE)
+# NOTE -- does not catch minus-sign (non-ascii char) tzinfo delimiter
+DATETIME_OFFSET_PATTERN = re.compile(r'.*[+-](?:\d{4}|\d{2}|\d{2}:\d{2})$')
+EMAIL_PATTERN = re.compile(r'(^[^@]+@[^@]+$)')
+IDENTITY_HASH_PATTERN = re.compile(r'(?:md5\$[\da-fA-F]{32}|sha256\$[\da-fA-F]{64})$')
+JWS_PATTERN = re.compile(r'^[A-z0-9\-=]+.[A-z0-9\-=]+.[A-z0-9\-_=]+$')
+URN_UUID_PATTERN = re.compile(
+    r'^urn:uuid:[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$', re.IGNORECASE)
+
+OPENBADGES_TYPES = TypeResolver(OPENBADGES_CONTEXT_V2_DICT)
+
+
+class ParsedUri(object):
+    """
+    What the validators need to know about one string, from a single rfc3986 parse.
+    """
+    __slots__ = ('authority', 'scheme', 'is_url', 'is_iri', 'is_data_uri',)
+
+    def __init__(self, value):
+        self.authority = self.scheme = None
+        valid = False
+        try:
+            reference = rfc3986.uri_reference(value)
+            self.authority = reference.authority
+            self.scheme = reference.scheme.lower() if reference.scheme else None
+            valid = reference.is_valid(require_scheme=True)
+        except ValueError:
+            pass
+
+        self.is_url = bool(value) and valid and self.scheme in ('http', 'https',)
+        self.is_iri = bool(
+            self.is_url or
+            BLANK_NODE_ID_PATTERN.match(value) or
+            URN_UUID_PATTERN.match(value)
+        )
+        self.is_data_uri = bool(value) and valid and bool(DATA_URI_PATTERN.match(value))
+
+
+_parsed_uris = LRUCache(max_entries=MAX_PARSED_URIS, max_bytes=MAX_PARSED_URI_BYTES)
+
+
+def get_uri_cache():
+    """
+    :return: the process-wide LRUCache of ParsedUri results, keyed by string
+    """
+    return _parsed_uris
+
+
+def parse_uri(value):
+    """
+    :param value: six.string_types
+    :return: ParsedUri for value, parsed once while it stays in the cache
+    """
+    parsed = _parsed_uris.get(value)
+    if parsed is None:
+        parsed = ParsedUri(value)
+        _parsed_uris.set(value, parsed, size=len(value))
+    return parsed
+
+
+def is_iri(value):
+    if not isinstance(value, six.string_types):
+        # Not a URL; left to the patterns, which reject other values as they always have.
+        return bool(BLANK_NODE_ID_PATTERN.match(value) or URN_UUID_PATTERN.match(value))
+    return parse_uri(value).is_iri
+
+
+def is_url(value):
+    return isinstance(value, six.string_types) and parse_uri(value).is_url
+
+
+def parse_datetime(value):
+    """
+    Full date-times with Z or an offset, the form Open Badges requires, are read
+    directly. Everything else is left to aniso8601.
+    :param value: str ISO 8601 date-time
+    :return: datetime, with tzinfo if value has a time zone
+    :raises ValueError: if value is not an ISO 8601 date-time
+    """
+    match = DATETIME_PATTERN.match(value) if isinstance(value, six.string_types) else None
+    if match is not None:
+        (year, month, day, hour, minute, second, fraction,
+         zulu, sign, offset_hours, offset_minutes) = match.groups()
+        offset = int(offset_hours or 0) * 60 + int(offset_minutes or 0)
+        # aniso8601 rejects -00:00 and offset minutes past 59, so those are left to it.
+        if zulu or (int(offset_minutes or 0) < 60 and (offset or sign == '+')):
+            try:
+                return datetime(
+                    int(year), int(month), int(day), int(hour), int(minute), int(second),
+                    int((fraction or '')[:6].ljust(6, '0')),
+                    utc if zulu else FixedOffset(-offset if sign == '-' else offset))
+            except ValueError:
+                # Out of range fields, or hour 24, which aniso8601 reads its own way.
+                pass
+    return aniso8601.parse_datetime(value)
+
+
+def is_datetime_with_offset(value, parse=parse_datetime):
+    """
+    :param value: str
+    :param parse: function used to parse value
+    :return: bool whether value is a date-time with a time zone, as Open Badges requires
+    """
+    try:
+        # aniso at least needs to think it can get a datetime from value
+        parse(value)
+    except Exception as e:
+        return False
+    # we also require tzinfo specification on our datetime strings
+    return (isinstance(value, six.string_types) and
+            (value[-1:] == 'Z' or
+             bool(DATETIME_OFFSET_PATTERN.match(value))))
+
+
+class ParsedDatetimes(object):
+    """
+    Date-times parsed during one verification. Assertion timestamps are read both by
+    property validation and by the timestamp checks, and are parsed once.
+
+    Example usage:
+    datetimes = ParsedDatetimes()
+    datetimes.parse('2016-12-31T23:59:59Z')
+    > datetime.datetime(2016, 12, 31, 23, 59, 59, tzinfo=<UTC>)
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._parsed = {}  # value -> (datetime, ValueError raised instead)
+
+    def parse(self, value):
+        """
+        Same as parse_datetime, remembering the result for string values.
+        """
+        if not isinstance(value, six.string_types):
+            return parse_datetime(value)
+
+        try:
+            parsed, error = self._parsed[value]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            try:
+                parsed, error = parse_datetime(value), None
+            except ValueError as e:
+                parsed, error = None, e
+            self._parsed[value] = (parsed, error,)
+
+        if error is not None:
+            raise error
+        return parsed
+
+    def is_valid(self, value):
+        return is_datetime_with_offset(value, self.parse)
+
+
+class ValueTypes(object):
+    BOOLEAN = 'BOOLEAN'
+    DATA_URI = 'DATA_URI'
+    DATA_URI_OR_URL = 'DATA_URI_OR_URL'
+    DATETIME = 'DATETIME'
+    EMAIL = 'EMAIL'
+    ID = 'ID'
+    IDENTITY_HASH = 'IDENTITY_HASH'
+    IRI = 'IRI'
+    MARKDOWN_TEXT = 'MARKDOWN_TEXT'
+    RDF_TYPE = 'RDF_TYPE'
+    TEXT = 'TEXT'
+    URL = 'URL'
+    # TODO: TELEPHONE = 'TELEPHONE'
+
+    PRIMITIVES = (BOOLEAN, DATETIME, ID, IDENTITY_HASH, IRI, MARKDOWN_TEXT, TEXT, URL)
+
+
+class PrimitiveValueValidator(object):
+    """
+    A callable validator for primitive Open Badges value types. Validators hold no
+    state, so get_validator hands out one shared instance per value type.
+
+    Example usage:
+    PrimitiveValueValidator(ValueTypes.TEXT)("test value")
+    > True
+    """
+    value_check_functions = {
+        ValueTypes.BOOLEAN: '_validate_boolean',
+        ValueTypes.DATA_URI: '_validate_data_uri',
+        ValueTypes.DATA_URI_OR_URL: '_validate_data_uri_or_url',
+        ValueTypes.DATETIME: '_validate_datetime',
+        ValueTypes.IDENTITY_HASH: '_validate_identity_hash',
+        ValueTypes.IRI: '_validate_iri',
+        ValueTypes.MARKDOWN_TEXT: '_validate_markdown_text',
+        ValueTypes.RDF_TYPE: '_validate_rdf_type',
+        ValueTypes.TEXT: '_validate_text',
+        ValueTypes.URL: '_validate_url'
+    }
+
+    def __init__(self, value_type):
+        self.value_type = value_type
+        self.is_valid = getattr(self, self.value_check_functions[value_type])
+
+    def __call__(self, value):
+        return self.is_valid(value)
+
+    @staticmethod
+    def _validate_boolean(value):
+        return isinstance(value, bool)
+
+    @staticmethod
+    def _validate_data_uri(value):
+        return isinstance(value, six.string_types) and parse_uri(value).is_data_uri
+
+    @staticmethod
+    def _validate_data_uri_or_url(value):
+        if not isinstance(value, six.string_types):
+            return False
+        parsed = parse_uri(value)
+        return parsed.is_url or parsed.is_data_uri
+
+    @staticmethod
+    def _validate_datetime(value):
+        return is_datetime_with_offset(value)
+
+    @staticmethod
+    def _validate_email(value):
+        return bool(EMAIL_PATTERN.match(value))
+
+    @staticmethod
+    def is_hashed_identity_hash(value):
+        return bool(IDENTITY_HASH_PATTERN.match(value))
+
+    @classmethod
+    def _validate_identity_hash(cls, value):
+        # Validates that identity is a string. More specific rules may only be enforced at the class instance level.
+        return isinstance(value, six.string_types)
+
+    @classmethod
+    def _validate_iri(cls, value):
+        """
+        Checks if a string matches an acceptable IRI format and scheme. For now, only accepts a few schemes,
+        'http', 'https', blank node identifiers, and 'urn:uuid'
+        :param value: six.string_types
+        :return: bool
+        """
+        # TODO: Accept other IRI schemes in the future for certain classes.
+        return is_iri(value)
+
+    @classmethod
+    def _validate_markdown_text(cls, value):
+        # TODO Assert no render errors if relevant?
+        return cls._validate_text
+
+    @classmethod
+    def _validate_rdf_type(cls, value):
+        if not isinstance(value, six.string_types):
+            return False
+        try:
+            expanded_value = OPENBADGES_TYPES.expand(value)
+        except jsonld.JsonLdError:
+            return False
+        return bool(expanded_value) and cls._validate_iri(expanded_value)
+
+    @staticmethod
+    def _validate_text(value):
+        return isinstance(value, six.string_types)
+
+    @staticmethod
+    def _validate_url(value):
+        return is_url(value)
+
+
+_validators = dict((value_type, PrimitiveValueValidator(value_type))
+                   for value_type in PrimitiveValueValidator.value_check_functions)
+
+
+def get_validator(value_type):
+    """
+    :param value_type: str one of the ValueTypes checked by PrimitiveValueValidator
+    :return: the shared PrimitiveValueValidator for value_type
+    """
+    return _validators[value_type]
@@ -20,6 +20,7 @@ objects are sound.
 """
 DETECT_AND_VALIDATE_NODE_CLASS = 'DETECT_AND_VALIDATE_NODE_CLASS'
 VALIDATE_EXPECTED_NODE_CLASS = 'VALIDATE_EXPECTED_NODE_CLASS'
+VALIDATE_NODE_PROPERTIES = 'VALIDATE_NODE_PROPERTIES'
 VALIDATE_RDF_TYPE_PROPERTY = 'VALIDATE_RDF_TYPE_PROPERTY'
 VALIDATE_PROPERTY = 'VALIDATE_PROPERTY'
 
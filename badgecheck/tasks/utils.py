@@ -1,6 +1,4 @@
-import re
-import rfc3986
-import six
+from .primitives import is_iri, is_url
 
 
 def task_result(success=True, message='', actions=None):
@@ -35,27 +33,6 @@ def abbreviate_value(value):
         return str(value)[:48] + '...'
 
 
-def is_iri(value):
-    urn_regex = r'^urn:uuid:[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$'
-    return bool(
-        is_url(value) or
-        re.match(r'_:b\d+$', value) or
-        re.match(urn_regex, value, re.IGNORECASE)
-    )
-
-
-def is_url(value):
-    ret = False
-    try:
-        if ((value and isinstance(value, six.string_types))
-            and rfc3986.is_valid_uri(value, require_scheme=True)
-            and rfc3986.uri_reference(value).scheme.lower() in ['http', 'https']):
-            ret = True
-    except ValueError as e:
-        pass
-    return ret
-
-
 def filter_tasks(state, **kwargs):
     tasks = state.get('tasks', [])
 
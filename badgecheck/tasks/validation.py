@@ -1,23 +1,19 @@
-import aniso8601
 from datetime import datetime
-from pyld import jsonld
 from pytz import utc
-import re
-import rfc3986
-import six
 
 from ..actions.graph import patch_node
-from ..actions.tasks import add_task
+from ..actions.tasks import add_task, add_tasks
 from ..exceptions import TaskPrerequisitesError, ValidationError
 from ..state import get_node_by_id
-from ..openbadges_context import OPENBADGES_CONTEXT_V2_DICT
 
 from .task_types import (ASSERTION_TIMESTAMP_CHECKS, ASSERTION_VERIFICATION_DEPENDENCIES,
                          CLASS_VALIDATION_TASKS, CRITERIA_PROPERTY_DEPENDENCIES, FETCH_HTTP_NODE,
                          HOSTED_ID_IN_VERIFICATION_SCOPE, IDENTITY_OBJECT_PROPERTY_DEPENDENCIES,
                          ISSUER_PROPERTY_DEPENDENCIES, VALIDATE_EXPECTED_NODE_CLASS,
-                         VALIDATE_RDF_TYPE_PROPERTY, VALIDATE_PROPERTY,)
-from .utils import abbreviate_value, is_empty_list, is_null_list, is_iri, is_url, task_result
+                         VALIDATE_NODE_PROPERTIES, VALIDATE_RDF_TYPE_PROPERTY, VALIDATE_PROPERTY,)
+from .primitives import (BLANK_NODE_ID_PATTERN, EMAIL_PATTERN, get_validator, parse_datetime,
+                         PrimitiveValueValidator, ValueTypes,)
+from .utils import abbreviate_value, is_empty_list, is_null_list, task_result
 
 
 class OBClasses(object):
@@ -42,145 +38,7 @@ class OBClasses(object):
                    VerificationObject)
 
 
-class ValueTypes(object):
-    BOOLEAN = 'BOOLEAN'
-    DATA_URI = 'DATA_URI'
-    DATA_URI_OR_URL = 'DATA_URI_OR_URL'
-    DATETIME = 'DATETIME'
-    EMAIL = 'EMAIL'
-    ID = 'ID'
-    IDENTITY_HASH = 'IDENTITY_HASH'
-    IRI = 'IRI'
-    MARKDOWN_TEXT = 'MARKDOWN_TEXT'
-    RDF_TYPE = 'RDF_TYPE'
-    TEXT = 'TEXT'
-    URL = 'URL'
-    # TODO: TELEPHONE = 'TELEPHONE'
-
-    PRIMITIVES = (BOOLEAN, DATETIME, ID, IDENTITY_HASH, IRI, MARKDOWN_TEXT, TEXT, URL)
-
-
-class PrimitiveValueValidator(object):
-    """
-    A callable validator for primitive Open Badges value types. 
-    
-    Example usage: 
-    PrimitiveValueValidator(ValueTypes.TEXT)("test value")
-    > True
-    """
-    def __init__(self, value_type):
-        value_check_functions = {
-            ValueTypes.BOOLEAN: self._validate_boolean,
-            ValueTypes.DATA_URI: self._validate_data_uri,
-            ValueTypes.DATA_URI_OR_URL: self._validate_data_uri_or_url,
-            ValueTypes.DATETIME: self._validate_datetime,
-            ValueTypes.IDENTITY_HASH: self._validate_identity_hash,
-            ValueTypes.IRI: self._validate_iri,
-            ValueTypes.MARKDOWN_TEXT: self._validate_markdown_text,
-            ValueTypes.RDF_TYPE: self._validate_rdf_type,
-            ValueTypes.TEXT: self._validate_text,
-            ValueTypes.URL: self._validate_url
-        }
-        self.value_type = value_type
-        self.is_valid = value_check_functions[value_type]
-
-    def __call__(self, value):
-        return self.is_valid(value)
-
-    @staticmethod
-    def _validate_boolean(value):
-        return isinstance(value, bool)
-
-    @staticmethod
-    def _validate_data_uri(value):
-        data_uri_regex=r'(?P<scheme>^data):(?P<mimetypes>[^,]{0,}?)?(?P<encoding>base64)?,(?P<data>.*$)'
-        ret = False
-        try:
-            if ((value and isinstance(value, six.string_types))
-                and rfc3986.is_valid_uri(value, require_scheme=True)
-                and re.match(data_uri_regex, value, re.IGNORECASE)
-                and re.match(data_uri_regex, value, re.IGNORECASE).group('scheme').lower() == 'data'):
-                ret = True
-        except ValueError as e:
-            pass
-        return ret
-
-    @classmethod
-    def _validate_data_uri_or_url(cls, value):
-        return bool(cls._validate_url(value) or cls._validate_data_uri(value))
-
-    @staticmethod
-    def _validate_datetime(value):
-        try:
-            # aniso at least needs to think it can get a datetime from value
-            aniso8601.parse_datetime(value)
-        except Exception as e:
-            return False
-        # we also require tzinfo specification on our datetime strings
-        # NOTE -- does not catch minus-sign (non-ascii char) tzinfo delimiter
-        return (isinstance(value, six.string_types) and
-                (value[-1:]=='Z' or
-                 bool(re.match(r'.*[+-](?:\d{4}|\d{2}|\d{2}:\d{2})$', value))))
-
-
-    @staticmethod
-    def _validate_email(value):
-        return bool(re.match(r'(^[^@]+@[^@]+$)', value))
-
-    @staticmethod
-    def is_hashed_identity_hash(value):
-        return bool(re.match(r'md5\$[\da-fA-F]{32}$', value) or re.match(r'sha256\$[\da-fA-F]{64}$', value))
-
-    @classmethod
-    def _validate_identity_hash(cls, value):
-        # Validates that identity is a string. More specific rules may only be enforced at the class instance level.
-        return isinstance(value, six.string_types)
-
-    @classmethod
-    def _validate_iri(cls, value):
-        """
-        Checks if a string matches an acceptable IRI format and scheme. For now, only accepts a few schemes,
-        'http', 'https', blank node identifiers, and 'urn:uuid'
-        :param value: six.string_types 
-        :return: bool
-        """
-        # TODO: Accept other IRI schemes in the future for certain classes.
-        return is_iri(value)
-
-    @classmethod
-    def _validate_markdown_text(cls, value):
-        # TODO Assert no render errors if relevant?
-        return cls._validate_text
-
-    @classmethod
-    def _validate_rdf_type(cls, value):
-        try:
-            if not(isinstance(value, six.string_types)):
-                raise ValidationError(
-                    'RDF_TYPE entry {} must be a string value'.format(abbreviate_value(value)))
-
-            expanded = jsonld.expand({"@context": OPENBADGES_CONTEXT_V2_DICT, 'type': value})
-            expanded_value = expanded[0]['@type'][0]
-            if not cls._validate_iri(expanded_value):
-                raise ValidationError(
-                    'RDF_TYPE entry {} must be a valid IRI in the document context'.format(
-                        abbreviate_value(value))
-                )
-        except (ValidationError, jsonld.JsonLdError,):
-            return False
-
-        return True
-
-    @staticmethod
-    def _validate_text(value):
-        return isinstance(value, six.string_types)
-
-    @staticmethod
-    def _validate_url(value):
-        return is_url(value)
-
-
-def validate_property(state, task_meta):
+def validate_property(state, task_meta, **options):
     """
     Validates presence and data type of a single property that is
     expected to be one of the Open Badges Primitive data types or an ID.
@@ -232,14 +90,16 @@ def validate_property(state, task_meta):
 
     try:
         if prop_type != ValueTypes.ID:
+            value_is_valid = get_validator(prop_type)
+            if prop_type == ValueTypes.DATETIME and options.get('parsed_datetimes') is not None:
+                value_is_valid = options['parsed_datetimes'].is_valid
             for val in values_to_test:
-                value_check_function = PrimitiveValueValidator(prop_type)
-                if not value_check_function(val):
+                if not value_is_valid(val):
                     raise ValidationError("{} property {} value {} not valid in {} {}".format(
                         prop_type, prop_name, abbreviate_value(val), node_class, node_id))
         else:
             for val in values_to_test:
-                if not PrimitiveValueValidator(ValueTypes.IRI)(val):
+                if not get_validator(ValueTypes.IRI)(val):
                     raise ValidationError(
                         "ID-type property {} had value `{}` not in IRI format in {}.".format(
                             prop_name, abbreviate_value(val), node_id)
@@ -249,7 +109,7 @@ def validate_property(state, task_meta):
                     try:
                         target = get_node_by_id(state, val)
                     except IndexError:
-                        if task_meta.get('allow_remote_url') and PrimitiveValueValidator(ValueTypes.URL)(val):
+                        if task_meta.get('allow_remote_url') and get_validator(ValueTypes.URL)(val):
                             continue
                         raise ValidationError(
                             'Node {} has {} property value `{}` that appears not to be in URI format'.format(
@@ -272,8 +132,8 @@ def validate_property(state, task_meta):
     )
 
 
-def validate_rdf_type_property(state, task_meta):
-    prop_result = validate_property(state, task_meta)
+def validate_rdf_type_property(state, task_meta, **options):
+    prop_result = validate_property(state, task_meta, **options)
     if not prop_result[0]:
         return prop_result
 
@@ -304,6 +164,12 @@ def validate_rdf_type_property(state, task_meta):
     return prop_result
 
 
+PROPERTY_VALIDATION_FUNCTIONS = {
+    VALIDATE_PROPERTY: validate_property,
+    VALIDATE_RDF_TYPE_PROPERTY: validate_rdf_type_property,
+}
+
+
 class ClassValidators(OBClasses):
     def __init__(self, class_name):
         self.class_name = class_name
@@ -440,30 +306,99 @@ class ClassValidators(OBClasses):
             raise NotImplementedError("Chosen OBClass not implemented yet.")
 
 
+class ValidationPlan(object):
+    """
+    The validations ClassValidators lists for one class, compiled once. The property
+    validations all run in a single VALIDATE_NODE_PROPERTIES task, which adds their
+    outcomes as completed VALIDATE_PROPERTY and VALIDATE_RDF_TYPE_PROPERTY tasks, so
+    each property still reports its own message. It then queues the class-level
+    validations as tasks of their own, because some of them wait on prerequisites.
+
+    Example usage:
+    plan = ValidationPlan.for_class(OBClasses.Assertion)
+    store.dispatch(add_task(VALIDATE_NODE_PROPERTIES, node_id=node_id, node_class=plan.node_class))
+    """
+    __slots__ = ('node_class', 'property_steps', 'class_steps',)
+    _plans = {}
+
+    def __init__(self, node_class):
+        property_steps = []
+        class_steps = []
+        for validator in ClassValidators(node_class).validators:
+            fields = tuple(sorted(validator.items()))
+            if validator.get('prop_type') == ValueTypes.RDF_TYPE:
+                property_steps.append((VALIDATE_RDF_TYPE_PROPERTY, fields,))
+            elif validator.get('prop_type') in ValueTypes.PRIMITIVES:
+                property_steps.append((VALIDATE_PROPERTY, fields,))
+            elif validator.get('task_type') in CLASS_VALIDATION_TASKS:
+                class_steps.append((validator['task_type'], fields,))
+        self.node_class = node_class
+        self.property_steps = tuple(property_steps)
+        self.class_steps = tuple(class_steps)
+
+    @classmethod
+    def for_class(cls, node_class):
+        plan = cls._plans.get(node_class)
+        if plan is None:
+            plan = cls._plans[node_class] = cls(node_class)
+        return plan
+
+    def class_task_actions(self, node_id):
+        """
+        :return: list of actions queueing the class-level validations of node_id
+        """
+        return [add_task(task_name, node_id=node_id, node_class=self.node_class, **dict(fields))
+                for task_name, fields in self.class_steps]
+
+    def property_tasks(self, node_id):
+        """
+        :return: list of task_meta dicts for the property validations of node_id
+        """
+        return [dict(fields, name=task_name, node_id=node_id, node_class=self.node_class)
+                for task_name, fields in self.property_steps]
+
+
 def _get_validation_actions(node_id, node_class):
-    validators = ClassValidators(node_class).validators
-    actions = []
-    for validator in validators:
-        if validator.get('prop_type') == ValueTypes.RDF_TYPE:
-            actions.append(add_task(
-                VALIDATE_RDF_TYPE_PROPERTY, node_id=node_id,
-                node_class=node_class, **validator
-            ))
-        if validator.get('prop_type') in ValueTypes.PRIMITIVES:
-            actions.append(add_task(
-                VALIDATE_PROPERTY, node_id=node_id,
-                node_class=node_class, **validator
-            ))
-        elif validator.get('task_type') in CLASS_VALIDATION_TASKS:
-            actions.append(add_task(
-                validator['task_type'], node_id=node_id,
-                node_class=node_class, **validator
-            ))
+    plan = ValidationPlan.for_class(node_class)
+    return [add_task(VALIDATE_NODE_PROPERTIES, node_id=node_id, node_class=plan.node_class)]
 
-    return actions
 
+def validate_node_properties(state, task_meta, **options):
+    """
+    Validates every primitive and ID property of a node in one pass, following the
+    ValidationPlan of its class. Each property's outcome is added as a completed task,
+    followed by the class-level validations, in the order ClassValidators lists them.
+    """
+    from ..engine import run_task
 
-def detect_and_validate_node_class(state, task_meta):
+    node_id = task_meta.get('node_id')
+    node_class = task_meta.get('node_class')
+    plan = ValidationPlan.for_class(node_class)
+
+    results = []
+    queued = []
+    actions = []
+    for property_task in plan.property_tasks(node_id):
+        resolution, property_actions = run_task(
+            PROPERTY_VALIDATION_FUNCTIONS[property_task['name']], property_task, state, options)
+        if resolution is None:
+            # Left for the task loop to run on its own.
+            queued.append(add_task(property_task.pop('name'), **property_task))
+            continue
+        success, message = resolution
+        results.append(dict(property_task, complete=True, success=success, result=message))
+        actions.extend(property_actions)
+
+    if results:
+        queued.insert(0, add_tasks(results))
+    actions = queued + plan.class_task_actions(node_id) + actions
+    return task_result(
+        True, "Validated {} properties of {} {}".format(len(results), node_class, node_id),
+        actions
+    )
+
+
+def detect_and_validate_node_class(state, task_meta, **options):
     node_id = task_meta.get('node_id')
     node = get_node_by_id(state, node_id)
     declared_node_type = node.get('type')
@@ -482,7 +417,7 @@ def detect_and_validate_node_class(state, task_meta):
     )
 
 
-def validate_expected_node_class(state, task_meta):
+def validate_expected_node_class(state, task_meta, **options):
     node_id = task_meta.get('node_id')
     node = get_node_by_id(state, node_id)  # Raises if not exists
     node_class = task_meta.get('expected_class')
@@ -497,13 +432,13 @@ def validate_expected_node_class(state, task_meta):
 """
 Class Validation Tasks
 """
-def identity_object_property_dependencies(state, task_meta):
+def identity_object_property_dependencies(state, task_meta, **options):
     node_id = task_meta.get('node_id')
     node = get_node_by_id(state, node_id)
     node_class = task_meta.get('node_class')
     identity = node.get('identity')
     is_hashed = PrimitiveValueValidator.is_hashed_identity_hash(identity)
-    is_email = bool(re.match(r'[^@]+@[^@]+$', identity))
+    is_email = bool(EMAIL_PATTERN.match(identity))
 
     if node.get('hashed') and not is_hashed:
         return task_result(
@@ -520,10 +455,10 @@ def identity_object_property_dependencies(state, task_meta):
     return task_result(True, "IdentityObject passes validation rules.")
 
 
-def criteria_property_dependencies(state, task_meta):
+def criteria_property_dependencies(state, task_meta, **options):
     node_id = task_meta.get('node_id')
     node = get_node_by_id(state, node_id)
-    is_blank_id_node = bool(re.match(r'_:b\d+$', node_id))
+    is_blank_id_node = bool(BLANK_NODE_ID_PATTERN.match(node_id))
 
     if is_blank_id_node and not node.get('narrative'):
         return task_result(False,
@@ -542,7 +477,7 @@ def criteria_property_dependencies(state, task_meta):
     return task_result(True, "Criteria node {} has a URL.")
 
 
-def assertion_verification_dependencies(state, task_meta):
+def assertion_verification_dependencies(state, task_meta, **options):
     """
     Performs and/or queues some security checks for hosted assertions.
     """
@@ -566,11 +501,15 @@ def assertion_verification_dependencies(state, task_meta):
     )
 
 
-def assertion_timestamp_checks(state, task_meta):
+def assertion_timestamp_checks(state, task_meta, **options):
+    parse = parse_datetime
+    if options.get('parsed_datetimes') is not None:
+        parse = options['parsed_datetimes'].parse
+
     try:
         node_id = task_meta['node_id']
         assertion = get_node_by_id(state, node_id)
-        issued_on = aniso8601.parse_datetime(assertion['issuedOn'])
+        issued_on = parse(assertion['issuedOn'])
     except (IndexError, KeyError, ValueError,):
         raise TaskPrerequisitesError(task_meta)
 
@@ -580,7 +519,7 @@ def assertion_timestamp_checks(state, task_meta):
             False, "Assertion {} has issue date {} in the future.".format(node_id, issued_on))
 
     if assertion.get('expires'):
-        expires = aniso8601.parse_datetime(assertion['expires'])
+        expires = parse(assertion['expires'])
         if expires < issued_on:
             return task_result(
                 False, "Assertion {} expiration is prior to issue date.".format(node_id))
@@ -594,6 +533,6 @@ def assertion_timestamp_checks(state, task_meta):
         True, "Assertion {} was issued and has not expired.".format(node_id))
 
 
-def issuer_property_dependencies(state, task_meta):
+def issuer_property_dependencies(state, task_meta, **options):
     # Placeholder task used as prerequisite for hosted id check
     return task_result(True, "No issuer property dependencies to check.")
@@ -1,13 +1,12 @@
-import rfc3986
-
 from ..state import get_node_by_id
 from ..utils import list_of
 
+from .primitives import parse_uri
 from .utils import abbreviate_value, task_result
 
 
 def _default_allowed_origins_for_issuer_id(issuer_id):
-    return rfc3986.uri_reference(issuer_id).authority
+    return parse_uri(issuer_id).authority
 
 
 def _default_verification_policy(issuer_node):
@@ -19,7 +18,7 @@ def _default_verification_policy(issuer_node):
     }
 
 
-def hosted_id_in_verification_scope(state, task_meta):
+def hosted_id_in_verification_scope(state, task_meta, **options):
     assertion_id = task_meta.get('node_id')
     assertion_node = get_node_by_id(state, assertion_id)
 
@@ -43,7 +42,7 @@ def hosted_id_in_verification_scope(state, task_meta):
         verification_policy.get(
             'allowedOrigins', _default_allowed_origins_for_issuer_id(issuer_node.get('id')))
     )
-    if allowed_origins and rfc3986.uri_reference(assertion_id).authority not in allowed_origins:
+    if allowed_origins and parse_uri(assertion_id).authority not in allowed_origins:
         return task_result(
             False, 'Assertion {} not hosted in allowed origins {}'.format(
                 abbreviate_value(assertion_id), abbreviate_value(allowed_origins))
@@ -0,0 +1,376 @@
+"""
+HTTP transport shared by every network fetch badgecheck makes.
+
+One requests session and one connection pool are kept per transport, so repeated
+fetches from the same issuer reuse kept-alive connections instead of paying a new
+TCP/TLS handshake each time. Connect, read and total timeouts bound how long any
+single fetch can hold a worker. Concurrent requests for the same URL with the same
+headers share one fetch, as long as it fits each caller's own timeout.
+"""
+import heapq
+import itertools
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import EmptyPoolError
+from requests.packages.urllib3.util.retry import Retry
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .exceptions import FetchTimeout
+from .forking import after_fork, register
+from .singleflight import SingleFlight, WaitTimeout
+
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 15
+DEFAULT_TOTAL_TIMEOUT = 30
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 0.25
+RETRY_STATUS_CODES = (502, 503, 504,)
+CHUNK_SIZE = 16 * 1024
+
+
+class HttpTransport(object):
+    """
+    A pooled HTTP client with timeouts, a per-host connection cap and bounded retries.
+
+    Example usage:
+    transport = HttpTransport(total_timeout=10)
+    response = transport.get('https://example.org/assertion',
+                             headers={'Accept': 'application/ld+json'})
+    """
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 total_timeout=DEFAULT_TOTAL_TIMEOUT,
+                 max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 cache=None):
+        """
+        :param connect_timeout: seconds to wait for a connection to be established
+        :param read_timeout: seconds to wait between bytes from the server
+        :param total_timeout: seconds a whole fetch, including reading the body, may take
+        :param max_connections_per_host: connections kept open to one host; further
+        concurrent requests to that host wait for a free connection
+        :param max_retries: retries after connection errors, read errors or 502/503/504
+        :param backoff_factor: base delay for exponential backoff between retries
+        :param cache: document cache such as badgecheck.cache.SqliteDocumentCache; fresh
+        entries are served from it and stale ones revalidated with conditional GETs
+        """
+        self.cache = cache
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+
+        retries = _BudgetedRetry(
+            total=max_retries, connect=max_retries, read=max_retries, status=max_retries,
+            backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False)
+        self.adapter = _BudgetedAdapter(
+            pool_maxsize=max_connections_per_host, pool_block=True, max_retries=retries)
+        self.session = requests.Session()
+        self.mount(self.session)
+        self.flights = SingleFlight()
+        register(self)
+
+    def mount(self, session):
+        """
+        Route a session's http and https requests through this transport's pool,
+        e.g. a session with its own authentication that should share connections.
+        :param session: requests.Session
+        :return: the session
+        """
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        return session
+
+    def _after_fork(self):
+        # Pooled connections are sockets shared with the parent process.
+        self.adapter.init_poolmanager(
+            self.adapter._pool_connections, self.adapter._pool_maxsize, block=self.adapter._pool_block)
+        self.session = requests.Session()
+        self.mount(self.session)
+
+    def get(self, url, headers=None, session=None, timeout=None, cache=None):
+        """
+        Fetch a URL and read the whole response body within the total timeout.
+        :param url: str
+        :param headers: dict of request headers
+        :param session: requests.Session mounted on this transport, if not the default
+        :param timeout: seconds allowed for this fetch, if lower than total_timeout
+        :param cache: document cache consulted before the transport's own cache
+        :return: requests.Response with content already loaded; from_cache tells
+        whether it was served from a cache
+        """
+        if cache is not None and cache is not self.cache:
+            return self._get_cached(
+                cache, url, headers, lambda h: self.get(url, h, session, timeout))
+        if self.cache is not None:
+            return self._get_cached(
+                self.cache, url, headers, lambda h: self._fetch(url, h, session, timeout))
+        return self._fetch(url, headers, session, timeout)
+
+    def _get_cached(self, cache, url, headers, fetch):
+        entry = cache.get(url)
+        if entry is not None and entry.is_fresh():
+            cache.record('hit')
+            return _cached_response(entry)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.validators())
+        response = fetch(request_headers)
+
+        if entry is not None and response.status_code == 304:
+            cache.record('revalidation')
+            return _cached_response(cache.refresh(entry, response.headers))
+
+        cache.record('miss')
+        if response.status_code == 200:
+            cache.set(url, response.content, response.headers)
+        return response
+
+    def _fetch(self, url, headers, session, timeout):
+        # Callers share a response only if they would have sent the same request.
+        key = (url, tuple(sorted((headers or {}).items())), id(session) if session else None)
+        budget = self._budget(timeout)
+        deadline = time.time() + budget
+
+        def request():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise _fetch_timeout(url, budget)
+            return self._request(url, headers, session, remaining)
+
+        def retry(error):
+            # A fetch cut short by a caller with less time left is made again, not shared.
+            return getattr(error, 'budget', budget) < deadline - time.time()
+
+        try:
+            return self.flights.do(key, request, timeout=budget, retry=retry)
+        except WaitTimeout:
+            raise _fetch_timeout(url, budget)
+
+    def _budget(self, timeout):
+        return self.total_timeout if timeout is None else min(timeout, self.total_timeout)
+
+    def _request(self, url, headers, session, timeout):
+        budget = self._budget(timeout)
+        deadline = time.time() + budget
+
+        _fetch_deadlines.current = deadline
+        try:
+            response = (session or self.session).get(
+                url, headers=headers, stream=True,
+                timeout=(min(self.connect_timeout, budget), min(self.read_timeout, budget)))
+        except EmptyPoolError:
+            # Every connection to the host stayed busy for as long as this fetch could wait.
+            raise _fetch_timeout(url, budget)
+        except requests.exceptions.RequestException:
+            if time.time() >= deadline:
+                raise _fetch_timeout(url, budget)
+            raise
+        finally:
+            _fetch_deadlines.current = None
+
+        watched = None
+        try:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise _fetch_timeout(url, budget)
+
+            # The read timeout only bounds the wait for each packet, so a server that
+            # trickles its body could otherwise hold the connection indefinitely.
+            sock = _response_socket(response)
+            if sock is not None:
+                watched = _watchdog.watch(sock, deadline)
+
+            try:
+                content = b''.join(response.iter_content(CHUNK_SIZE))
+            except requests.exceptions.RequestException:
+                if time.time() >= deadline:
+                    raise _fetch_timeout(url, budget)
+                raise
+            if time.time() > deadline:
+                raise _fetch_timeout(url, budget)
+            response._content = content
+        finally:
+            if watched is not None:
+                _watchdog.cancel(watched)
+            response.close()
+        response.from_cache = False
+        return response
+
+
+# Deadline of the fetch each thread is making, so that retries stop when it passes.
+_fetch_deadlines = threading.local()
+
+
+class _BudgetedRetry(Retry):
+    """
+    Retries like Retry, but gives up once the fetch being retried has used up its time.
+    """
+    def is_exhausted(self):
+        deadline = getattr(_fetch_deadlines, 'current', None)
+        if deadline is not None and time.time() >= deadline:
+            return True
+        return super(_BudgetedRetry, self).is_exhausted()
+
+
+class _BudgetedPoolMixin(object):
+    """
+    Waits for a free connection to a host no longer than the fetch asking for it may take.
+    """
+    def _get_conn(self, timeout=None):
+        deadline = getattr(_fetch_deadlines, 'current', None)
+        if timeout is None and deadline is not None:
+            timeout = max(deadline - time.time(), 0)
+        return super(_BudgetedPoolMixin, self)._get_conn(timeout)
+
+
+class _BudgetedHTTPConnectionPool(_BudgetedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _BudgetedHTTPSConnectionPool(_BudgetedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _BudgetedAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connection pools wait for a free connection only until the
+    current fetch runs out of time; requests itself would let them wait forever.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super(_BudgetedAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _BudgetedHTTPConnectionPool, 'https': _BudgetedHTTPSConnectionPool}
+
+
+def _fetch_timeout(url, budget):
+    error = FetchTimeout('Fetching {} took longer than {} seconds'.format(url, budget))
+    error.budget = budget
+    return error
+
+
+def _cached_response(entry):
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.url = entry.url
+    response.headers = CaseInsensitiveDict(entry.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = entry.content
+    response._content_consumed = True
+    response.from_cache = True
+    return response
+
+
+def _response_socket(response):
+    connection = getattr(response.raw, '_connection', None)
+    return getattr(connection, 'sock', None)
+
+
+def _shutdown_socket(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+        pass
+
+
+class _Watchdog(object):
+    """
+    Shuts down the sockets of fetches still reading their body when their deadline
+    passes. One thread, started on first use, serves every fetch in the process; it
+    keeps the watched sockets in a heap ordered by deadline and sleeps until the
+    earliest one.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._thread = None
+
+    def watch(self, sock, deadline):
+        """
+        :param sock: socket to shut down at the deadline
+        :param deadline: time.time() value
+        :return: entry to pass to cancel once the fetch is done with the socket
+        """
+        entry = [deadline, next(self._counter), sock]
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='badgecheck-fetch-watchdog')
+                self._thread.daemon = True
+                self._thread.start()
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        # Cancelled entries stay in the heap until they reach the top.
+        with self._condition:
+            entry[2] = None
+
+    def _run(self):
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2] is None:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                wait = self._heap[0][0] - time.time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                # Shut down while holding the lock, so that once cancel returns the
+                # socket can safely go back to the connection pool.
+                entry = heapq.heappop(self._heap)
+                _shutdown_socket(entry[2])
+                entry[2] = None
+
+    def _after_fork(self):
+        # The parent's watchdog thread does not exist in the child.
+        self.__init__()
+
+
+_watchdog = register(_Watchdog())
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+@after_fork
+def _reset_transport_lock():
+    global _transport_lock
+    _transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    Returns the process-wide transport, creating it with default settings on first use.
+    :return: HttpTransport
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
+
+
+def set_transport(transport):
+    """
+    Replaces the process-wide transport. Pass None to have a default one created again.
+    Document loaders that were given a transport explicitly keep using it.
+    :param transport: HttpTransport or None
+    """
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -1,20 +1,65 @@
+from collections import Counter
+import json
 import string
+import threading
 from urlparse import urlparse
 
-import requests
-import requests_cache
 from pyld.jsonld import JsonLdError
 
+from .cache import DOCUMENT_LOAD, get_failure_cache, MemoryDocumentCache
+from .exceptions import DeadlineExceeded, FetchTimeout
+from .extensions import ALL_KNOWN_EXTENSIONS
+from .forking import after_fork, register
+from .openbadges_context import OPENBADGES_CONTEXT_V2_DICT, OPENBADGES_CONTEXT_V2_URI
+from .transport import get_transport
+
 
 class CachableDocumentLoader(object):
-    def __init__(self, cachable=False):
+    def __init__(self, cachable=False, transport=None, failure_cache=None):
+        """
+        :param cachable: bool, whether to keep fetched documents and recent failures
+        in short-lived caches
+        :param transport: HttpTransport to fetch through; the process-wide transport
+        from badgecheck.transport.get_transport is used if None
+        :param failure_cache: FailureCache for failed fetches; the process-wide one from
+        badgecheck.cache.get_failure_cache is used if None
+        """
         self.cachable = cachable
+        self.transport = transport
+        self.failure_cache = failure_cache
         if self.cachable:
-            self.session = requests_cache.CachedSession(backend='memory', expire_after=300)
+            self.cache = MemoryDocumentCache(default_ttl=300)
         else:
-            self.session = requests.Session()
+            self.cache = None
+
+    def __call__(self, url, timeout=None):
+        """
+        :param url: str
+        :param timeout: seconds the load may take, if less than the transport allows
+        """
+        if not self.cachable:
+            return self._load(url, timeout)
+
+        failures = self.failure_cache or get_failure_cache()
+        failure = failures.get(url, kind=DOCUMENT_LOAD)
+        if failure is not None:
+            if failure.error is not None:
+                raise failure.error
+            raise JsonLdError(
+                failure.message or 'Could not retrieve JSON-LD document from URL.',
+                'jsonld.LoadDocumentError', {'url': url, 'status': failure.status},
+                code='loading document failed')
 
-    def __call__(self, url):
+        try:
+            return self._load(url, timeout)
+        except JsonLdError as e:
+            # Running out of a caller's own time budget says nothing about the server.
+            if timeout is None or not isinstance(e.cause, FetchTimeout):
+                failures.record(url, status=(e.details or {}).get('status'), error=e,
+                                kind=DOCUMENT_LOAD)
+            raise
+
+    def _load(self, url, timeout=None):
         try:
             # validate URLs
             pieces = urlparse(url)
@@ -27,14 +72,31 @@ class CachableDocumentLoader(object):
                     'jsonld.InvalidUrl', {'url': url},
                     code='loading document failed')
 
-            response = self.session.get(
-                url, headers={'Accept': 'application/ld+json, application/json'})
+            transport = self.transport or get_transport()
+            response = transport.get(
+                url, headers={'Accept': 'application/ld+json, application/json'},
+                timeout=timeout, cache=self.cache)
+            if self.cachable:
+                # Only the caching loader remembers failures, so only it refuses error
+                # responses and bodies that are not JSON up front.
+                if response.status_code >= 400:
+                    raise JsonLdError(
+                        'Could not retrieve JSON-LD document from URL.',
+                        'jsonld.LoadDocumentError', {'url': url, 'status': response.status_code},
+                        code='loading document failed')
+
+                try:
+                    json.loads(response.text)
+                except ValueError:
+                    raise JsonLdError(
+                        'Could not parse JSON-LD document from URL.',
+                        'jsonld.LoadDocumentError', {'url': url, 'status': response.status_code},
+                        code='loading document failed')
 
             doc = {'contextUrl': None, 'documentUrl': url, 'document': response.text}
 
             if self.cachable:
                 doc['from_cache'] = response.from_cache
-                self.session.remove_expired_responses()
 
             return doc
 
@@ -48,8 +110,151 @@ class CachableDocumentLoader(object):
                 cause=cause)
 
 
-jsonld_use_cache = {'documentLoader': CachableDocumentLoader(cachable=True)}
-jsonld_no_cache = {'documentLoader': CachableDocumentLoader(cachable=False)}
+def pinned_contexts():
+    """
+    Returns the JSON-LD context documents that ship with badgecheck, keyed by the URL
+    they are published at: the Open Badges v2 context and each known extension context.
+    :return: dict
+    """
+    contexts = {OPENBADGES_CONTEXT_V2_URI: OPENBADGES_CONTEXT_V2_DICT}
+    for extension in ALL_KNOWN_EXTENSIONS.values():
+        contexts[extension.context_url] = extension.context_json
+    return contexts
+
+
+class PinnedContextLoader(object):
+    """
+    A document loader that serves pinned context documents from memory and passes
+    every other URL on to a fallback loader. Each pinned URL that is served is counted,
+    so callers can see which contexts never touched the network.
+
+    Example usage:
+    loader = PinnedContextLoader(fallback=CachableDocumentLoader(cachable=True))
+    jsonld.compact(data, OPENBADGES_CONTEXT_V2_URI, options={'documentLoader': loader})
+    > loader.served_locally()
+    ['https://w3id.org/openbadges/v2']
+    """
+    def __init__(self, fallback=None, contexts=None):
+        """
+        :param fallback: document loader for URLs that are not pinned
+        :param contexts: dict of URL -> context document; defaults to pinned_contexts()
+        """
+        if contexts is None:
+            contexts = pinned_contexts()
+        self.fallback = fallback
+        # Documents are handed out already parsed and shared, so they must not be
+        # modified; pyld only reads them. Sharing them also lets badgecheck.contexts
+        # recognize them by identity.
+        self._documents = dict(contexts)
+        self._served = Counter()
+        self._served_lock = threading.Lock()
+        register(self)
+
+    def _after_fork(self):
+        self._served_lock = threading.Lock()
+
+    def __call__(self, url, timeout=None):
+        """
+        :param url: str
+        :param timeout: seconds the fallback loader may take, passed on if given
+        """
+        document = self._documents.get(url)
+        if document is None:
+            if self.fallback is None:
+                raise JsonLdError(
+                    'Could not retrieve JSON-LD document from URL.',
+                    'jsonld.LoadDocumentError', {'url': url},
+                    code='loading document failed')
+            if timeout is None:
+                return self.fallback(url)
+            return self.fallback(url, timeout=timeout)
+
+        with self._served_lock:
+            self._served[url] += 1
+        return {'contextUrl': None, 'documentUrl': url, 'document': document, 'pinned': True}
+
+    def is_pinned(self, url):
+        return url in self._documents
+
+    def served_locally(self):
+        """
+        :return: list of pinned URLs that have been served, in sorted order
+        """
+        with self._served_lock:
+            return sorted(self._served)
+
+    def served_count(self, url):
+        with self._served_lock:
+            return self._served[url]
+
+
+class DeadlineDocumentLoader(object):
+    """
+    A document loader that gives each load only the time left before a deadline. The
+    loader it wraps must accept a timeout keyword argument, as PinnedContextLoader
+    and CachableDocumentLoader do.
+
+    Example usage:
+    loader = DeadlineDocumentLoader(get_document_loader(), Deadline(10))
+    """
+    def __init__(self, loader, deadline):
+        """
+        :param loader: document loader accepting a timeout keyword argument
+        :param deadline: badgecheck.deadline.Deadline
+        """
+        self.loader = loader
+        self.deadline = deadline
+
+    def __call__(self, url):
+        if self.deadline.expired():
+            raise JsonLdError(
+                'Could not retrieve JSON-LD document from URL.',
+                'jsonld.LoadDocumentError', {'url': url},
+                code='loading document failed', cause=DeadlineExceeded(self.deadline.message()))
+        return self.loader(url, timeout=self.deadline.remaining())
+
+
+_document_loaders = {}
+_document_loaders_lock = threading.Lock()
+
+
+@after_fork
+def _reset_document_loaders_lock():
+    global _document_loaders_lock
+    _document_loaders_lock = threading.Lock()
+
+
+def get_document_loader(cachable=True):
+    """
+    Returns the process-wide document loader, creating it on first use. Sharing one
+    loader means every JSON-LD operation in the process shares one document cache.
+    The default loader serves pinned contexts from memory, see PinnedContextLoader.
+    :param cachable: bool, whether to return the caching or the non-caching loader
+    :return: callable document loader
+    """
+    with _document_loaders_lock:
+        loader = _document_loaders.get(cachable)
+        if loader is None:
+            loader = _document_loaders[cachable] = PinnedContextLoader(
+                fallback=CachableDocumentLoader(cachable=cachable))
+        return loader
+
+
+def set_document_loader(loader, cachable=True):
+    """
+    Replaces the process-wide document loader, for example with one that has a
+    different cache configuration. Pass None to have a default loader created again.
+    :param loader: callable document loader or None
+    :param cachable: bool, whether to replace the caching or the non-caching loader
+    """
+    with _document_loaders_lock:
+        _document_loaders[cachable] = loader
+    options = jsonld_use_cache if cachable else jsonld_no_cache
+    options['documentLoader'] = get_document_loader(cachable)
+
+
+jsonld_use_cache = {'documentLoader': get_document_loader(cachable=True)}
+jsonld_no_cache = {'documentLoader': get_document_loader(cachable=False)}
 
 
 def list_of(value):
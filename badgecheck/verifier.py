@@ -1,51 +1,80 @@
+from functools import partial
+from multiprocessing.pool import Pool, ThreadPool
+import threading
+
 from openbadges_bakery import unbake
 from pydux import create_store
 
 from .actions.input import store_input
-from .actions.tasks import add_task, resolve_task
-from .exceptions import SkipTask, TaskPrerequisitesError
+from .actions.tasks import add_task
+from .deadline import Deadline
+from .engine import (apply_task_outcome, ConcurrentTaskRunner, DEFAULT_FETCH_WORKERS,
+                     run_task, run_tasks,)
+from .forking import reset_after_fork
+from .prefetch import Prefetcher
 from .reducers import main_reducer
-from .state import (filter_active_tasks, filter_failed_tasks, format_message,
-                    INITIAL_STATE, MESSAGE_LEVEL_ERROR, MESSAGE_LEVEL_WARNING,)
+from .subgraphs import get_subgraph_cache, SubgraphRecorder
+from .tasks.primitives import ParsedDatetimes
+from .state import (filter_failed_tasks, format_message, INITIAL_STATE,
+                    MESSAGE_LEVEL_ERROR, MESSAGE_LEVEL_WARNING,)
+from .utils import DeadlineDocumentLoader, get_document_loader
 import tasks
 
 
-def call_task(task_func, task_meta, store):
+DEFAULT_BATCH_WORKERS = 4
+BATCH_MODES = ('thread', 'process',)
+
+
+def call_task(task_func, task_meta, store, options=None, recorder=None):
     """
     Calls and resolves a task function in response to a queued task. May result
     in additional actions added to the queue.
     :param task_func: func
     :param task_meta: dict (single entry in tasks state)
     :param store: pydux store
+    :param options: dict of verification options passed to the task as keyword arguments
+    :param recorder: SubgraphRecorder noting the outcomes of reusable subgraphs
     :return:
     """
-    actions = []
-    try:
-        success, message, actions = task_func(store.get_state(), task_meta)
-    except SkipTask:
-        # TODO: Implement skip handling.
-        pass
-    except TaskPrerequisitesError:
-        message = "Task could not run due to unmet prerequisites."
-        store.dispatch(resolve_task(task_meta.get('task_id'), success=False, result=message))
-    except Exception as e:
-        message = "{} {}".format(e.__class__, e.message)
-        store.dispatch(resolve_task(task_meta.get('task_id'), success=False, result=message))
-    else:
-        store.dispatch(resolve_task(task_meta.get('task_id'), success=success, result=message))
+    outcome = run_task(task_func, task_meta, store.get_state(), options)
+    apply_task_outcome(task_meta, outcome, store, recorder)
 
-    # Make updates and queue up next tasks.
-    for action in actions:
-        store.dispatch(action)
 
-
-def verify(badge_input):
+def verify(badge_input, document_loader=None, transport=None, failure_cache=None,
+           subgraph_cache=None, fetch_workers=None, prefetch=False, deadline=None):
     """
     Verify and validate Open Badges
     :param badge_input: str (url or json) or python file-like object (baked badge image)
+    :param document_loader: JSON-LD document loader to use instead of the process-wide
+    loader from badgecheck.utils.get_document_loader
+    :param transport: HttpTransport to fetch badge objects through instead of the
+    process-wide transport from badgecheck.transport.get_transport
+    :param failure_cache: FailureCache remembering recently failed fetches instead of the
+    process-wide one from badgecheck.cache.get_failure_cache
+    :param subgraph_cache: SubgraphCache of validated badge classes and issuers to reuse
+    instead of the process-wide one from badgecheck.subgraphs.get_subgraph_cache
+    :param fetch_workers: int number of badge objects to fetch at once while validation
+    continues, or None to run every task in turn. Fetching concurrently yields the same
+    graph nodes and messages, though their order in the report may vary.
+    :param prefetch: bool whether to start fetching linked badge objects such as the
+    badge class and issuer as soon as the document linking to them is compacted
+    :param deadline: seconds the verification may take. Fetches and document loads are
+    given only the time left, and tasks not finished in time fail with a timeout
+    message. A document_loader used with a deadline must accept a timeout keyword
+    argument, as the loaders in badgecheck.utils do.
     :return: dict
     """
+    if deadline is not None:
+        deadline = Deadline(deadline)
+        document_loader = DeadlineDocumentLoader(
+            document_loader or get_document_loader(cachable=True), deadline)
+
     store = create_store(main_reducer, INITIAL_STATE)
+    subgraph_cache = subgraph_cache or get_subgraph_cache()
+    recorder = SubgraphRecorder()
+    options = {'document_loader': document_loader, 'transport': transport,
+               'failure_cache': failure_cache, 'subgraph_cache': subgraph_cache,
+               'deadline': deadline, 'parsed_datetimes': ParsedDatetimes()}
 
     if hasattr(badge_input, 'read') and hasattr(badge_input, 'seek'):
         badge_input.seek(0)
@@ -58,23 +87,26 @@ def verify(badge_input):
     store.dispatch(store_input(badge_data))
     store.dispatch(add_task(tasks.DETECT_INPUT_TYPE))
 
-    last_task_id = 0
-    while len(filter_active_tasks(store.get_state())):
-        active_tasks = filter_active_tasks(store.get_state())
-        task_meta = active_tasks[0]
-        task_func = tasks.task_named(task_meta['name'])
-
-        if task_meta['task_id'] == last_task_id:
-            break
-
-        last_task_id = task_meta['task_id']
-        call_task(task_func, task_meta, store)
+    if prefetch:
+        options['prefetcher'] = Prefetcher(
+            transport=transport, failure_cache=failure_cache, deadline=deadline)
+    try:
+        if fetch_workers:
+            ConcurrentTaskRunner(fetch_workers=fetch_workers).run(store, options, recorder)
+        else:
+            run_tasks(store, options, recorder)
+    finally:
+        if prefetch:
+            options['prefetcher'].close()
 
     state = store.get_state()
+    if deadline is None or not deadline.expired():
+        # Subgraphs cut short by the deadline are not worth reusing.
+        recorder.save(state, subgraph_cache)
     failed_tasks = filter_failed_tasks(state)
     ret = {
         'messages': [],
-        'graph': state['graph'],
+        'graph': list(state['graph']),
         'input': state['input']
     }
     for task in failed_tasks:
@@ -85,3 +117,135 @@ def verify(badge_input):
     ret['valid'] = not bool(ret['errorCount'])
 
     return ret
+
+
+def verify_async(badge_input, fetch_workers=DEFAULT_FETCH_WORKERS, **verify_options):
+    """
+    Start verifying and validating Open Badges in the background, fetching the badge
+    objects it links to concurrently with validation. The result is what
+    verify(badge_input, fetch_workers=fetch_workers) would return: the same graph nodes
+    and messages as verify(badge_input), in the order the fetches complete.
+
+    Example usage:
+    pending = verify_async(url)
+    ...
+    result = pending.result(timeout=60)
+
+    :param badge_input: str (url or json) or python file-like object (baked badge image)
+    :param fetch_workers: int number of badge objects fetched at once
+    :param verify_options: keyword arguments passed on to verify
+    :return: PendingVerification
+    """
+    return PendingVerification(partial(
+        verify, badge_input, fetch_workers=fetch_workers, **verify_options))
+
+
+class PendingVerification(object):
+    """
+    A verification running on a background thread.
+    """
+    def __init__(self, verification):
+        """
+        :param verification: callable taking no arguments that returns the result
+        """
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(verification,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the verification to finish.
+        :param timeout: seconds to wait, or None to wait as long as it takes
+        :return: dict as returned by verify; raises what verify would have raised
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError('Verification did not finish within {} seconds'.format(timeout))
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def add_done_callback(self, callback):
+        """
+        :param callback: callable taking this PendingVerification, called once it is
+        done, on the verification's thread or at once if it is already done
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _run(self, verification):
+        try:
+            self._result = verification()
+        except Exception as e:
+            self._error = e
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+def verify_many(inputs, workers=DEFAULT_BATCH_WORKERS, mode='thread', as_completed=False,
+                **verify_options):
+    """
+    Verify and validate many Open Badges with a pool of workers.
+
+    Each worker runs verify on one input at a time. In 'thread' mode all workers share
+    the process-wide document loaders, processed contexts, transport and
+    validated-subgraph cache, so documents that many inputs link to are fetched and
+    validated once. In 'process' mode each worker process starts with copies of those
+    caches as they were when the pool was started and keeps its own from then on, with
+    fresh locks and connections, see badgecheck.forking; inputs, options and results
+    must be picklable.
+
+    Example usage:
+    for index, result in verify_many(urls, workers=8, as_completed=True):
+        print urls[index], result['valid']
+
+    :param inputs: iterable of badge inputs as accepted by verify
+    :param workers: int number of verifications run at once
+    :param mode: 'thread' or 'process'
+    :param as_completed: bool, whether to yield (index, result) pairs as verifications
+    finish instead of returning the results in input order
+    :param verify_options: keyword arguments passed on to verify
+    :return: list of results in input order, or an iterator of (index, result) pairs
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError("mode must be one of {}".format(', '.join(BATCH_MODES)))
+
+    pool = ThreadPool(workers) if mode == 'thread' else Pool(workers, initializer=reset_after_fork)
+    verify_item = partial(_verify_indexed, **verify_options)
+    if not as_completed:
+        results = _iter_completed(pool, pool.imap(verify_item, enumerate(inputs)))
+        return [result for index, result in results]
+    return _iter_completed(pool, pool.imap_unordered(verify_item, enumerate(inputs)))
+
+
+def _verify_indexed(indexed_input, **verify_options):
+    index, badge_input = indexed_input
+    return index, verify(badge_input, **verify_options)
+
+
+def _iter_completed(pool, results):
+    finished = False
+    try:
+        for indexed_result in results:
+            yield indexed_result
+        finished = True
+    finally:
+        # Outstanding verifications are abandoned if a result raised or the caller stopped.
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
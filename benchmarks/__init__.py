@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks for badgecheck internals. Run a module from the project root, e.g.:
+`python -m benchmarks.bench_scheduler`
+"""
@@ -0,0 +1,57 @@
+"""
+Compares throughput of compacting Open Badges v2 documents with plain pyld, with
+pyld reusing memoized active contexts, and with the V2FastCompactor fast path.
+"""
+import copy
+import json
+import timeit
+
+from pyld import jsonld
+
+from badgecheck.compaction import compact_to_v2
+from badgecheck.contexts import compact
+from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_URI
+from badgecheck.utils import PinnedContextLoader
+
+from tests.testfiles.test_components import test_components
+
+NUMBER = 300
+
+
+def make_documents():
+    assertion = json.loads(test_components['2_0_basic_assertion'])
+    badgeclass = json.loads(test_components['2_0_basic_badgeclass'])
+    issuer = json.loads(test_components['2_0_basic_issuer'])
+
+    embedded = copy.deepcopy(assertion)
+    embedded['badge'] = copy.deepcopy(badgeclass)
+    embedded['badge']['issuer'] = copy.deepcopy(issuer)
+    embedded['evidence'] = [
+        {'id': 'http://example.org/evidence/{}'.format(i), 'narrative': 'Evidence {}'.format(i)}
+        for i in range(5)]
+    return [('assertion', assertion), ('badgeclass', badgeclass), ('issuer', issuer),
+            ('embedded', embedded)]
+
+
+def main():
+    loader = PinnedContextLoader()
+    options = {'documentLoader': loader}
+    compactors = (
+        ('pyld', lambda doc: jsonld.compact(doc, OPENBADGES_CONTEXT_V2_URI, options=dict(options))),
+        ('cached ctx', lambda doc: compact(doc, OPENBADGES_CONTEXT_V2_URI, options=dict(options))),
+        ('fast path', lambda doc: compact_to_v2(doc, loader)),
+    )
+
+    print('{:>12} {:>12} {:>12} {:>12}'.format('document', *[name for name, _ in compactors]))
+    for name, document in make_documents():
+        expected = compactors[0][1](document)
+        rates = []
+        for _, compactor in compactors:
+            assert compactor(document) == expected
+            seconds = min(timeit.repeat(lambda: compactor(document), number=NUMBER, repeat=3))
+            rates.append(NUMBER / seconds)
+        print('{:>12} {:>10.0f}/s {:>10.0f}/s {:>10.0f}/s'.format(name, *rates))
+
+
+if __name__ == '__main__':
+    main()
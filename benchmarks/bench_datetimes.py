@@ -0,0 +1,52 @@
+"""
+Compares the cost of checking and reading assertion timestamps with aniso8601, as
+validation used to, against parse_datetime, and against ParsedDatetimes, which parses
+each timestamp once per verification however often it is read.
+"""
+import timeit
+
+import aniso8601
+
+from badgecheck.tasks.primitives import (DATETIME_OFFSET_PATTERN, is_datetime_with_offset,
+                                         parse_datetime, ParsedDatetimes,)
+
+NUMBER = 3000
+TIMESTAMPS = ('2016-12-31T23:59:59Z', '2016-12-31T23:59:59+00:00', '2017-06-30T12:00:00.123456-05:00',
+              '2016-W52-6T23:59:59Z')
+
+
+def check_with_aniso8601(value):
+    # Property validation, then the issuedOn and expires timestamp checks.
+    aniso8601.parse_datetime(value)
+    value[-1:] == 'Z' or DATETIME_OFFSET_PATTERN.match(value)
+    aniso8601.parse_datetime(value)
+
+
+def check_with_parse_datetime(value):
+    is_datetime_with_offset(value)
+    parse_datetime(value)
+
+
+def check_with_parsed_datetimes(value):
+    datetimes = ParsedDatetimes()
+    datetimes.is_valid(value)
+    datetimes.parse(value)
+
+
+def per_timestamp_usec(func, value, number):
+    seconds = min(timeit.repeat(lambda: func(value), number=number, repeat=3))
+    return seconds / number * 1e6
+
+
+def main():
+    print('{:>34} {:>12} {:>12} {:>12}'.format('timestamp', 'aniso8601 us', 'parse us', 'cached us'))
+    for value in TIMESTAMPS:
+        print('{:>34} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+            value,
+            per_timestamp_usec(check_with_aniso8601, value, NUMBER),
+            per_timestamp_usec(check_with_parse_datetime, value, NUMBER),
+            per_timestamp_usec(check_with_parsed_datetimes, value, NUMBER)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the persistent NodeGraph used by graph_reducer with the previous
+list-copying implementation: time to apply a run of ADD_NODE and PATCH_NODE
+actions, and memory retained when every intermediate state is kept.
+"""
+import copy
+import sys
+import timeit
+
+from badgecheck.actions.graph import add_node, patch_node
+from badgecheck.reducers.graph import _flatten_node, graph_reducer
+from badgecheck.state import get_node_by_id
+
+SIZES = (100, 400, 1600, 6400)
+
+
+def list_graph_reducer(state, action):
+    """
+    The list-based reducer that graph_reducer replaced, kept here for comparison.
+    """
+    if action.get('type') == 'ADD_NODE':
+        state = list(state)
+        new_node = copy.deepcopy(action.get('data'))
+        state.extend(_flatten_node(new_node, action.get('node_id')))
+    elif action.get('type') == 'PATCH_NODE':
+        existing_node = get_node_by_id({'graph': state}, action.get('node_id'))
+        updated_node = copy.copy(existing_node)
+        updated_node.update(action.get('data'))
+        state = [node for node in state if node is not existing_node]
+        state.append(updated_node)
+    return state
+
+
+def make_actions(size):
+    actions = []
+    for i in range(size):
+        node_id = 'http://example.com/nodes/{}'.format(i)
+        actions.append(add_node(node_id, {'name': 'Node {}'.format(i), 'tags': ['a', 'b']}))
+        if i % 10 == 0:
+            actions.append(patch_node(node_id, {'type': 'Evidence'}))
+    return actions
+
+
+def run(reducer, actions, keep_history=False):
+    state = []
+    history = []
+    for action in actions:
+        state = reducer(state, action)
+        if keep_history:
+            history.append(state)
+    return history
+
+
+def retained_bytes(states):
+    """
+    Bytes held by the containers of all states, counting each shared object once
+    and excluding the node dicts themselves, which both implementations share.
+    """
+    seen = set()
+    total = 0
+    stack = list(states)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, dict):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (list, tuple)):
+            total += sys.getsizeof(obj)
+            stack.extend(obj)
+        elif hasattr(obj, '__slots__'):
+            total += sys.getsizeof(obj)
+            stack.extend(getattr(obj, slot) for slot in obj.__slots__ if hasattr(obj, slot))
+    return total
+
+
+def main():
+    print('{:>8} {:>12} {:>12} {:>14} {:>14}'.format(
+        'nodes', 'list ms', 'persist ms', 'list KiB', 'persist KiB'))
+    for size in SIZES:
+        actions = make_actions(size)
+        list_time = min(timeit.repeat(lambda: run(list_graph_reducer, actions), number=1, repeat=3))
+        persist_time = min(timeit.repeat(lambda: run(graph_reducer, actions), number=1, repeat=3))
+        list_memory = retained_bytes(run(list_graph_reducer, actions, keep_history=True))
+        persist_memory = retained_bytes(run(graph_reducer, actions, keep_history=True))
+        print('{:>8} {:>12.1f} {:>12.1f} {:>14.0f} {:>14.0f}'.format(
+            size, list_time * 1e3, persist_time * 1e3, list_memory / 1024.0, persist_memory / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
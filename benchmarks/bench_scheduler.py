@@ -0,0 +1,57 @@
+"""
+Compares the cost of picking the next task with TaskScheduler against rescanning
+the task list with filter_active_tasks, as the number of queued tasks grows.
+"""
+import timeit
+
+from badgecheck.scheduler import TaskScheduler
+from badgecheck.state import filter_active_tasks
+
+SIZES = (100, 200, 400, 800, 1600, 3200)
+NAMES = ('VALIDATE_PROPERTY', 'VALIDATE_RDF_TYPE_PROPERTY', 'ISSUER_PROPERTY_DEPENDENCIES',
+         'ASSERTION_VERIFICATION_DEPENDENCIES', 'FETCH_HTTP_NODE')
+
+
+def make_tasks(size):
+    tasks = []
+    for i in range(1, size + 1):
+        task = {'task_id': i, 'name': NAMES[i % len(NAMES)], 'complete': False}
+        if task['name'] == 'ASSERTION_VERIFICATION_DEPENDENCIES':
+            task['prerequisites'] = 'ISSUER_PROPERTY_DEPENDENCIES'
+        tasks.append(task)
+    return tasks
+
+
+def run_with_scheduler(size):
+    state = {'tasks': make_tasks(size)}
+    scheduler = TaskScheduler()
+    scheduler.sync(state)
+    task_id = scheduler.next_task_id()
+    while task_id is not None:
+        state['tasks'][task_id - 1] = dict(state['tasks'][task_id - 1], complete=True)
+        scheduler.sync(state)
+        task_id = scheduler.next_task_id()
+
+
+def run_with_filter(size):
+    state = {'tasks': make_tasks(size)}
+    while len(filter_active_tasks(state)):
+        task = filter_active_tasks(state)[0]
+        state['tasks'][task['task_id'] - 1] = dict(task, complete=True)
+
+
+def per_task_usec(func, size, number):
+    seconds = min(timeit.repeat(lambda: func(size), number=number, repeat=3))
+    return seconds / number / size * 1e6
+
+
+def main():
+    print('{:>8} {:>16} {:>16}'.format('tasks', 'scheduler us/task', 'filter us/task'))
+    for size in SIZES:
+        filter_cost = per_task_usec(run_with_filter, size, 1) if size <= 800 else float('nan')
+        print('{:>8} {:>16.2f} {:>16.2f}'.format(
+            size, per_task_usec(run_with_scheduler, size, 5), filter_cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares how many primitive values per second are checked by building a new
+PrimitiveValueValidator for every value against reusing the shared validator from
+get_validator, for each value type.
+"""
+import timeit
+
+from badgecheck.tasks.primitives import get_validator, PrimitiveValueValidator, ValueTypes
+
+NUMBER = 300
+SAMPLES = {
+    ValueTypes.BOOLEAN: (True, 'true'),
+    ValueTypes.DATA_URI: ('data:image/png;base64,iVBORw0KGgo=', 'http://example.org/image'),
+    ValueTypes.DATA_URI_OR_URL: ('data:image/png;base64,iVBORw0KGgo=', 'http://example.org/image'),
+    ValueTypes.DATETIME: ('2016-12-31T23:59:59+00:00', '2016-12-31T23:59:59'),
+    ValueTypes.IDENTITY_HASH: ('sha256$' + 'a' * 64, 1),
+    ValueTypes.IRI: ('urn:uuid:2d391246-6e0d-4dab-906c-b29770bd7aa6', 'mailto:someone@example.org'),
+    ValueTypes.MARKDOWN_TEXT: ('*Robotics* badge', 1),
+    ValueTypes.RDF_TYPE: ('Assertion', 'extensions:UnknownExtension'),
+    ValueTypes.TEXT: ('Robotics badge', 1),
+    ValueTypes.URL: ('https://example.org/robotics-badge.json', '_:b0'),
+}
+
+
+def check_with_new_validators(value_type, values):
+    for value in values:
+        PrimitiveValueValidator(value_type)(value)
+
+
+def check_with_shared_validator(value_type, values):
+    for value in values:
+        get_validator(value_type)(value)
+
+
+def values_per_second(func, value_type, number):
+    values = SAMPLES[value_type]
+    seconds = min(timeit.repeat(lambda: func(value_type, values), number=number, repeat=3))
+    return number * len(values) / seconds
+
+
+def main():
+    print('{:>16} {:>16} {:>16}'.format('value type', 'new values/s', 'shared values/s'))
+    for value_type in sorted(SAMPLES):
+        print('{:>16} {:>16.0f} {:>16.0f}'.format(
+            value_type,
+            values_per_second(check_with_new_validators, value_type, NUMBER),
+            values_per_second(check_with_shared_validator, value_type, NUMBER)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pyld.jsonld import JsonLdError
+
+from badgecheck.actions.tasks import add_task
+from badgecheck.cache import (DOCUMENT_LOAD, FailureCache, LRUCache, MemoryDocumentCache,
+                              SqliteDocumentCache,)
+from badgecheck.exceptions import FetchTimeout
+from badgecheck.tasks.graph import fetch_http_node
+from badgecheck.tasks.task_types import FETCH_HTTP_NODE
+from badgecheck.transport import HttpTransport
+from badgecheck.utils import CachableDocumentLoader
+
+from utils import StubHttpServer
+
+
+class SqliteDocumentCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'documents.sqlite')
+        self.server = StubHttpServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_forked_processes_open_their_own_connections(self):
+        self.server.add('/issuer', body='{"name": "Issuer"}',
+                        headers={'Cache-Control': 'public, max-age=60'})
+        cache = SqliteDocumentCache(self.path)
+        HttpTransport(cache=cache).get(self.server.url('/issuer'))
+        inherited = cache._connection()
+
+        cache._after_fork()
+        self.assertIsNot(cache._connection(), inherited)
+        self.assertEqual(cache.get(self.server.url('/issuer')).content, '{"name": "Issuer"}')
+
+    def test_fresh_responses_are_served_from_cache(self):
+        self.server.add('/issuer', body='{"name": "Issuer"}',
+                        headers={'Cache-Control': 'public, max-age=60'})
+        cache = SqliteDocumentCache(self.path)
+        transport = HttpTransport(cache=cache)
+
+        first = transport.get(self.server.url('/issuer'))
+        second = transport.get(self.server.url('/issuer'))
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.headers['Content-Type'], 'application/json')
+        self.assertTrue(second.from_cache)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'revalidations': 0})
+
+    def test_stale_responses_are_revalidated_with_etag(self):
+        self.server.add('/badgeclass', body='{"name": "Badge"}',
+                        headers={'Cache-Control': 'no-cache', 'ETag': '"v1"'})
+        cache = SqliteDocumentCache(self.path)
+        transport = HttpTransport(cache=cache)
+
+        transport.get(self.server.url('/badgeclass'))
+        response = transport.get(self.server.url('/badgeclass'))
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.request_headers[1].get('if-none-match'), '"v1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, '{"name": "Badge"}')
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'revalidations': 1})
+
+    def test_changed_documents_replace_stale_entries(self):
+        url_path = '/changing'
+        self.server.add(url_path, body='{"version": 1}', headers={'Cache-Control': 'max-age=0',
+                                                                  'ETag': '"v1"'})
+        self.server.add(url_path, body='{"version": 2}', headers={'Cache-Control': 'max-age=60',
+                                                                  'ETag': '"v2"'})
+        cache = SqliteDocumentCache(self.path)
+        transport = HttpTransport(cache=cache)
+
+        transport.get(self.server.url(url_path))
+        self.assertEqual(transport.get(self.server.url(url_path)).text, '{"version": 2}')
+        self.assertEqual(transport.get(self.server.url(url_path)).text, '{"version": 2}')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(cache.get(self.server.url(url_path)).etag, '"v2"')
+
+    def test_last_modified_is_used_as_validator(self):
+        modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.server.add('/profile', body='{}', headers={'Cache-Control': 'max-age=0',
+                                                         'Last-Modified': modified})
+        transport = HttpTransport(cache=SqliteDocumentCache(self.path))
+
+        transport.get(self.server.url('/profile'))
+        transport.get(self.server.url('/profile'))
+        self.assertEqual(self.server.request_headers[1].get('if-modified-since'), modified)
+
+    def test_no_store_responses_are_not_cached(self):
+        self.server.add('/private', body='{}', headers={'Cache-Control': 'no-store'})
+        cache = SqliteDocumentCache(self.path)
+        transport = HttpTransport(cache=cache)
+
+        transport.get(self.server.url('/private'))
+        transport.get(self.server.url('/private'))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIsNone(cache.get(self.server.url('/private')))
+
+    def test_cache_is_shared_through_the_database_file(self):
+        self.server.add('/shared', body='{"shared": true}', headers={'Cache-Control': 'max-age=60'})
+        HttpTransport(cache=SqliteDocumentCache(self.path)).get(self.server.url('/shared'))
+
+        other_cache = SqliteDocumentCache(self.path)
+        response = HttpTransport(cache=other_cache).get(self.server.url('/shared'))
+        self.assertEqual(response.text, '{"shared": true}')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(other_cache.hits, 1)
+
+    def test_document_loader_uses_transport_cache(self):
+        self.server.add('/context', body='{"@context": {}}', content_type='application/ld+json',
+                        headers={'Cache-Control': 'max-age=60'})
+        transport = HttpTransport(cache=SqliteDocumentCache(self.path))
+        loader = CachableDocumentLoader(cachable=False, transport=transport)
+
+        loader(self.server.url('/context'))
+        document = loader(self.server.url('/context'))
+        self.assertEqual(document['document'], '{"@context": {}}')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrent_threads(self):
+        self.server.add('/busy', body='{}', headers={'Cache-Control': 'max-age=60'})
+        cache = SqliteDocumentCache(self.path)
+        transport = HttpTransport(cache=cache)
+        errors = []
+
+        def fetch():
+            try:
+                for _ in range(5):
+                    transport.get(self.server.url('/busy'))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.hits + cache.misses, 20)
+
+    def test_expiry_time(self):
+        cache = SqliteDocumentCache(self.path, default_ttl=100)
+        now = time.time()
+        self.assertEqual(cache.expiry_time({'Cache-Control': 'max-age=30'}, now), now + 30)
+        self.assertEqual(cache.expiry_time({}, now), now + 100)
+        self.assertEqual(cache.expiry_time({'Expires': 'Thu, 01 Jan 2015 00:00:00 GMT'}, now),
+                         1420070400)
+        self.assertIsNone(cache.expiry_time({'Cache-Control': 'no-store'}, now))
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LRUCache(max_entries=3)
+        for key in 'abc':
+            cache.set(key, key.upper())
+        cache.get('a')
+        cache.set('d', 'D')
+
+        self.assertNotIn('b', cache)
+        self.assertEqual([cache.get(key) for key in 'acd'], ['A', 'C', 'D'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_size_bound(self):
+        cache = LRUCache(max_entries=100, max_bytes=10)
+        cache.set('a', 'aaaa', size=4)
+        cache.set('b', 'bbbb', size=4)
+        cache.set('c', 'cccc', size=4)
+        cache.set('huge', 'x' * 11, size=11)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.bytes, 8)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('huge'))
+
+    def test_expired_entries_are_dropped_when_read(self):
+        cache = LRUCache()
+        now = time.time()
+        cache.set('old', 1, expires_at=now - 1, size=3)
+        cache.set('new', 2, expires_at=now + 60)
+
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('new'), 2)
+        self.assertEqual(cache.stats(), {'entries': 1, 'bytes': 0, 'hits': 1, 'misses': 1,
+                                         'evictions': 0, 'expirations': 1})
+
+    def test_writes_sweep_the_oldest_expired_entries(self):
+        cache = LRUCache(sweep_interval=4, sweep_size=2)
+        cache.set('expired-1', 1, expires_at=time.time() - 1)
+        cache.set('expired-2', 2, expires_at=time.time() - 1)
+        cache.set('live', 3)
+        self.assertEqual(len(cache), 3)
+
+        cache.set('trigger', 4)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.expirations, 2)
+
+
+class MemoryDocumentCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_loader_serves_repeated_fetches_from_memory(self):
+        self.server.add('/issuer', body='{"name": "Issuer"}', content_type='application/ld+json')
+        loader = CachableDocumentLoader(cachable=True, transport=HttpTransport())
+
+        first = loader(self.server.url('/issuer'))
+        second = loader(self.server.url('/issuer'))
+        self.assertFalse(first['from_cache'])
+        self.assertTrue(second['from_cache'])
+        self.assertEqual(second['document'], '{"name": "Issuer"}')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_cache_stays_within_bounds(self):
+        for i in range(10):
+            self.server.add('/doc/{}'.format(i), body='{"i": %d}' % i)
+        cache = MemoryDocumentCache(max_entries=4)
+        transport = HttpTransport()
+        for i in range(10):
+            transport.get(self.server.url('/doc/{}'.format(i)), cache=cache)
+
+        self.assertEqual(len(cache.entries), 4)
+        self.assertIsNone(cache.get(self.server.url('/doc/0')))
+        self.assertEqual(cache.get(self.server.url('/doc/9')).content, '{"i": 9}')
+
+    def test_stale_entries_are_kept_for_revalidation(self):
+        self.server.add('/badgeclass', body='{"name": "Badge"}',
+                        headers={'Cache-Control': 'max-age=0', 'ETag': '"v1"'})
+        self.server.add('/plain', body='{}', headers={'Cache-Control': 'max-age=0'})
+        cache = MemoryDocumentCache()
+        transport = HttpTransport()
+
+        transport.get(self.server.url('/badgeclass'), cache=cache)
+        transport.get(self.server.url('/plain'), cache=cache)
+        response = transport.get(self.server.url('/badgeclass'), cache=cache)
+
+        self.assertEqual(self.server.request_headers[2].get('if-none-match'), '"v1"')
+        self.assertEqual(response.text, '{"name": "Badge"}')
+        self.assertEqual(cache.revalidations, 1)
+        self.assertIsNone(cache.get(self.server.url('/plain')))
+
+    def test_memory_cache_sits_in_front_of_transport_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.server.add('/context', body='{}', headers={'Cache-Control': 'max-age=60'})
+            shared = SqliteDocumentCache(os.path.join(directory, 'documents.sqlite'))
+            HttpTransport(cache=shared).get(self.server.url('/context'))
+
+            memory = MemoryDocumentCache()
+            transport = HttpTransport(cache=shared)
+            transport.get(self.server.url('/context'), cache=memory)
+            transport.get(self.server.url('/context'), cache=memory)
+
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertEqual(memory.stats(), {'hits': 1, 'misses': 1, 'revalidations': 0})
+            self.assertEqual(shared.hits, 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+class FailureCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        self.failures = FailureCache(ttl=60)
+        self.transport = HttpTransport(total_timeout=0.2, max_retries=0)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fetch(self, path):
+        task_meta = add_task(FETCH_HTTP_NODE, url=self.server.url(path))
+        return fetch_http_node({}, task_meta, transport=self.transport,
+                               failure_cache=self.failures)
+
+    def test_uninterpretable_responses_are_not_fetched_again(self):
+        self.server.add('/dead-issuer', body='<html>Not Found</html>', status=404,
+                        content_type='text/html')
+
+        first = self.fetch('/dead-issuer')
+        second = self.fetch('/dead-issuer')
+        self.assertFalse(first[0])
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.server.requests), 1)
+
+        failure = self.failures.get(self.server.url('/dead-issuer'))
+        self.assertEqual(failure.status, 404)
+        self.assertIsNone(failure.error_class)
+
+    def test_fetch_errors_are_raised_again(self):
+        self.server.add('/slow', body='{}', delay=0.5)
+
+        with self.assertRaises(FetchTimeout) as first:
+            self.fetch('/slow')
+        with self.assertRaises(FetchTimeout) as second:
+            self.fetch('/slow')
+        self.assertEqual(second.exception.message, first.exception.message)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIs(self.failures.get(self.server.url('/slow')).error, first.exception)
+
+    def test_failures_expire(self):
+        self.server.add('/flaky', body='oops', status=500, content_type='text/plain')
+        self.failures = FailureCache(ttl=0)
+
+        self.fetch('/flaky')
+        self.fetch('/flaky')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIsNone(self.failures.get(self.server.url('/flaky')))
+
+    def test_caching_loader_remembers_failures(self):
+        self.server.add('/context', body='<html>Gone</html>', status=410, content_type='text/html')
+        loader = CachableDocumentLoader(
+            cachable=True, transport=self.transport, failure_cache=self.failures)
+
+        with self.assertRaises(JsonLdError) as first:
+            loader(self.server.url('/context'))
+        with self.assertRaises(JsonLdError) as second:
+            loader(self.server.url('/context'))
+        self.assertIs(second.exception, first.exception)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.failures.get(self.server.url('/context'), kind=DOCUMENT_LOAD).status, 410)
+
+    def test_caching_loader_remembers_unparseable_documents(self):
+        self.server.add('/context', body='<html>Moved</html>', content_type='text/html')
+        loader = CachableDocumentLoader(
+            cachable=True, transport=self.transport, failure_cache=self.failures)
+
+        with self.assertRaises(JsonLdError) as first:
+            loader(self.server.url('/context'))
+        with self.assertRaises(JsonLdError) as second:
+            loader(self.server.url('/context'))
+        self.assertIs(second.exception, first.exception)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.failures.get(self.server.url('/context'), kind=DOCUMENT_LOAD).status, 200)
+
+    def test_non_caching_loader_returns_documents_unchecked(self):
+        self.server.add('/context', body='<html>Moved</html>', content_type='text/html')
+        loader = CachableDocumentLoader(
+            cachable=False, transport=self.transport, failure_cache=self.failures)
+
+        self.assertEqual(loader(self.server.url('/context'))['document'], '<html>Moved</html>')
+        self.assertIsNone(self.failures.get(self.server.url('/context'), kind=DOCUMENT_LOAD))
+
+    def test_node_fetches_and_document_loads_fail_separately(self):
+        self.server.add('/issuer', body='<html>Not Found</html>', status=404, content_type='text/html')
+        self.server.add('/issuer', body='{"@context": {}}', content_type='application/ld+json')
+        loader = CachableDocumentLoader(
+            cachable=True, transport=self.transport, failure_cache=self.failures)
+
+        self.assertFalse(self.fetch('/issuer')[0])
+        self.assertEqual(loader(self.server.url('/issuer'))['document'], '{"@context": {}}')
+        self.assertFalse(self.fetch('/issuer')[0])
+        self.assertIsNone(self.failures.get(self.server.url('/issuer'), kind=DOCUMENT_LOAD))
+
+    def test_failures_recorded_with_a_message_are_raised_by_loaders(self):
+        url = self.server.url('/context')
+        self.failures.record(url, status=500, message='Server error', kind=DOCUMENT_LOAD)
+        loader = CachableDocumentLoader(
+            cachable=True, transport=self.transport, failure_cache=self.failures)
+
+        with self.assertRaises(JsonLdError) as context:
+            loader(url)
+        self.assertEqual(context.exception.details['status'], 500)
+        self.assertEqual(self.server.requests, [])
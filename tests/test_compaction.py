@@ -0,0 +1,147 @@
+import copy
+import json
+import random
+import unittest
+
+from pyld import jsonld
+
+from badgecheck.compaction import V2FastCompactor
+from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_URI
+from badgecheck.utils import PinnedContextLoader
+
+from testfiles.test_components import test_components
+
+
+def v2_documents():
+    documents = []
+    for key in ('2_0_basic_assertion', '2_0_basic_badgeclass', '2_0_basic_issuer'):
+        documents.append(json.loads(test_components[key]))
+    return documents
+
+
+def variant_documents():
+    assertion, badgeclass, issuer = v2_documents()
+    variants = []
+
+    def variant(base, **changes):
+        document = copy.deepcopy(base)
+        for key, value in changes.items():
+            if value is None:
+                document.pop(key, None)
+            else:
+                document[key] = value
+        variants.append(document)
+
+    # Terms and values pyld keeps as they are
+    variant(assertion, verification={'type': 'HostedBadge'})
+    variant(assertion, type=['Assertion'], evidence=['http://example.org/evidence'])
+    variant(assertion, evidence=['http://example.org/e1', 'http://example.org/e2'])
+    variant(assertion, evidence={'id': '_:b0', 'narrative': 'Did the thing'})
+    variant(assertion, badge=badgeclass, revoked=False, expires='2030-01-01T00:00:00Z')
+    variant(badgeclass, issuer=issuer, tags=['one', 'two'], alignment=[
+        {'targetName': 'Skill', 'targetUrl': 'http://example.org/skill', 'targetCode': 7}])
+    variant(issuer, type=['Issuer', 'Profile'], revokedAssertions=['urn:uuid:1'], revoked=True)
+    variant(badgeclass, type=['BadgeClass', 'Extension', 'extensions:ExampleExtension'])
+    variant(badgeclass, criteria={'narrative': 'Do it', 'id': 'urn:uuid:criteria'})
+    variant(assertion, recipient={'type': 'email', 'hashed': False, 'identity': 'a@example.org'})
+    variant(assertion, image={'id': 'http://example.org/img.png', 'caption': 'An image'})
+
+    # Rewritten by pyld
+    variant(assertion, verification={'type': 'hosted'})
+    variant(assertion, verify={'type': 'hosted'}, verification=None)
+    variant(assertion, type=['Assertion', 'Assertion'])
+    variant(assertion, badge={'id': 'http://example.org/badgeclass'})
+    variant(assertion, evidence='http://schema.org/evidence')
+    variant(assertion, evidence='schema:evidence')
+    variant(assertion, evidence='relative/evidence')
+    variant(assertion, narrative=None, evidence=[])
+    variant(assertion, unknownProperty='dropped')
+    variant(assertion, narrative=None, expires=None)
+    variant(assertion, image=None, evidence={})
+    variant(assertion, type='https://w3id.org/openbadges#Assertion')
+    variant(assertion, **{'@id': 'urn:uuid:keyword'})
+    variant(issuer, **{'@context': [OPENBADGES_CONTEXT_V2_URI]})
+    variant(issuer, **{'@context': 'https://w3id.org/openbadges/v1'})
+    variant(issuer, image={'@context': {'caption': 'http://schema.org/caption'}, 'caption': 'x'})
+    variants.append({'@context': OPENBADGES_CONTEXT_V2_URI, 'id': 'urn:uuid:lonely'})
+
+    return variants
+
+
+def mutated_documents(count, seed):
+    rng = random.Random(seed)
+    values = [
+        'A string', 42, 1.5, True, 'http://example.org/thing', 'urn:uuid:x', '_:b1',
+        'http://schema.org/thing', 'obi:thing', '2016-12-31T23:59:59Z', {'name': 'Nested'},
+        {'id': 'http://example.org/ref'}, ['one'], ['one', 'two'], [], None,
+    ]
+    terms = ['name', 'description', 'image', 'url', 'evidence', 'narrative', 'tags',
+             'revoked', 'expires', 'email', 'related', 'endorsement', 'verify', 'id', 'type']
+    types = ['Assertion', 'BadgeClass', 'hosted', 'HostedBadge', 'Profile', 'Extension',
+             'extensions:ApplyLink', 'signed', 'schema:Thing']
+    bases = v2_documents()
+
+    documents = []
+    for _ in range(count):
+        document = copy.deepcopy(rng.choice(bases))
+        for _ in range(rng.randint(1, 4)):
+            term = rng.choice(terms)
+            if term == 'type':
+                document['type'] = rng.sample(types, rng.randint(1, 2))
+            else:
+                document[term] = copy.deepcopy(rng.choice(values))
+        documents.append(document)
+    return documents
+
+
+class V2FastCompactorTests(unittest.TestCase):
+    def setUp(self):
+        self.compactor = V2FastCompactor()
+        self.loader = PinnedContextLoader()
+
+    def pyld_compact(self, document):
+        return jsonld.compact(
+            copy.deepcopy(document), OPENBADGES_CONTEXT_V2_URI,
+            options={'documentLoader': self.loader})
+
+    def assert_equivalent(self, documents):
+        fast = 0
+        for document in documents:
+            original = copy.deepcopy(document)
+            result = self.compactor.compact(document)
+            self.assertEqual(document, original)
+            if result is None:
+                continue
+            fast += 1
+            self.assertEqual(result, self.pyld_compact(document), json.dumps(document))
+        return fast
+
+    def test_v2_documents_take_the_fast_path(self):
+        documents = v2_documents()
+        self.assertEqual(self.assert_equivalent(documents), len(documents))
+
+    def test_variants_match_pyld(self):
+        fast = self.assert_equivalent(variant_documents())
+        self.assertGreaterEqual(fast, 13)
+
+    def test_mutated_corpus_matches_pyld(self):
+        documents = mutated_documents(400, seed=2017)
+        fast = self.assert_equivalent(documents)
+        self.assertGreater(fast, 0)
+        self.assertLess(fast, len(documents))
+
+    def test_type_aliases_are_canonicalized(self):
+        assertion = v2_documents()[0]
+        assertion['verification'] = {'type': 'hosted'}
+        assertion['type'] = ['Assertion']
+
+        result = self.compactor.compact(assertion)
+        self.assertEqual(result['verification'], {'type': 'HostedBadge'})
+        self.assertEqual(result['type'], 'Assertion')
+
+    def test_documents_needing_json_ld_fall_back(self):
+        issuer = v2_documents()[2]
+        issuer['@context'] = [OPENBADGES_CONTEXT_V2_URI, {'extra': 'http://example.org/extra'}]
+        self.assertIsNone(self.compactor.compact(issuer))
+        self.assertEqual(self.compactor.fallback, 1)
+        self.assertIsNone(self.compactor.compact('not a document'))
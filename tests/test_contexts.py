@@ -0,0 +1,104 @@
+import copy
+import json
+import unittest
+
+from pyld import jsonld
+
+from badgecheck.contexts import ActiveContextCache, CachingJsonLdProcessor, TypeResolver
+from badgecheck.extensions import GeoLocation
+from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_DICT, OPENBADGES_CONTEXT_V2_URI
+from badgecheck.utils import PinnedContextLoader
+
+from testfiles.test_components import test_components
+
+
+class ActiveContextCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = ActiveContextCache()
+        self.loader = PinnedContextLoader()
+
+    def compact(self, input_, ctx, options=None):
+        return CachingJsonLdProcessor(self.cache).compact(input_, ctx, options)
+
+    def test_compaction_matches_pyld(self):
+        assertion_data = json.loads(test_components['2_0_basic_assertion'])
+        options = {'documentLoader': self.loader}
+        expected = jsonld.compact(assertion_data, OPENBADGES_CONTEXT_V2_URI, options=dict(options))
+
+        first = self.compact(assertion_data, OPENBADGES_CONTEXT_V2_URI, options=dict(options))
+        second = self.compact(assertion_data, OPENBADGES_CONTEXT_V2_URI, options=dict(options))
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertGreater(self.cache.hits, 0)
+
+    def test_equal_copies_of_pinned_context_share_an_entry(self):
+        processor = CachingJsonLdProcessor(self.cache)
+        options = {'base': '', 'documentLoader': self.loader}
+        initial = processor._get_initial_context(options)
+
+        by_url = processor.process_context(initial, OPENBADGES_CONTEXT_V2_URI, dict(options))
+        by_dict = processor.process_context(initial, OPENBADGES_CONTEXT_V2_DICT, dict(options))
+        by_copy = processor.process_context(
+            initial, copy.deepcopy(OPENBADGES_CONTEXT_V2_DICT), dict(options))
+        self.assertIs(by_url, by_dict)
+        self.assertIs(by_url, by_copy)
+
+    def test_extension_context_chain(self):
+        node = {
+            '@context': OPENBADGES_CONTEXT_V2_DICT,
+            'type': ['Extension', 'extensions:GeoCoordinates'],
+            'description': 'Where the badge was earned',
+            'geo': {'latitude': 44.5, 'longitude': -123.3}
+        }
+        chain = [OPENBADGES_CONTEXT_V2_DICT, GeoLocation.context_json]
+        expected = jsonld.compact(node, chain)
+
+        self.assertEqual(self.compact(node, chain), expected)
+        self.assertEqual(self.compact(node, chain), expected)
+        misses = self.cache.misses
+        self.assertEqual(self.compact(node, copy.deepcopy(chain)), expected)
+        self.assertEqual(self.cache.misses, misses)
+
+    def test_unregistered_contexts_are_not_cached(self):
+        context = {'@context': {'name': 'http://schema.org/name'}}
+        data = {'@context': context['@context'], 'name': 'Unregistered'}
+
+        self.assertEqual(self.compact(data, context), jsonld.compact(data, context))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_document_base_is_part_of_the_key(self):
+        data = {'@context': OPENBADGES_CONTEXT_V2_URI, 'id': 'http://example.org/a', 'type': 'Assertion'}
+        options = {'documentLoader': self.loader}
+        self.compact(data, OPENBADGES_CONTEXT_V2_URI, options=dict(options))
+
+        options['base'] = 'http://example.org/'
+        compacted = self.compact(data, OPENBADGES_CONTEXT_V2_URI, options=dict(options))
+        self.assertEqual(compacted['id'], 'a')
+        self.assertEqual(len(self.cache), 2)
+
+    def test_cache_size_is_bounded(self):
+        cache = ActiveContextCache(max_entries=1)
+        processor = CachingJsonLdProcessor(cache)
+        for base in ('http://example.org/', 'http://example.com/'):
+            options = {'base': base, 'documentLoader': self.loader}
+            processor.process_context(
+                processor._get_initial_context(options), OPENBADGES_CONTEXT_V2_URI, options)
+        self.assertEqual(len(cache), 1)
+
+
+class TypeResolverTests(unittest.TestCase):
+    def test_expansion_matches_pyld(self):
+        resolver = TypeResolver(OPENBADGES_CONTEXT_V2_DICT)
+        values = list(OPENBADGES_CONTEXT_V2_DICT['@context'].keys()) + [
+            'extensions:ApplyLink', 'schema:ImageObject', 'obi:Assertion', 'sec:', 'Assertion:Link',
+            'http://example.org/Type', 'urn:uuid:9d278beb-36cf-4bc8-888d-674ff9843d72', '_:b0',
+            'schema://example.org/', 'UnknownType', '', '@id']
+        for value in values:
+            expanded = jsonld.expand({'@context': OPENBADGES_CONTEXT_V2_DICT, 'type': value})
+            self.assertEqual(resolver.expand(value), expanded[0]['@type'][0], value)
+        self.assertEqual(resolver.fallbacks, 1)
+
+        self.assertEqual(resolver.expand('mailto:someone@example.org'), 'mailto:someone@example.org')
+        self.assertEqual(resolver.fallbacks, 2)
@@ -0,0 +1,84 @@
+import json
+import time
+import unittest
+
+from pyld.jsonld import JsonLdError
+
+from badgecheck import verify
+from badgecheck.cache import FailureCache
+from badgecheck.deadline import Deadline
+from badgecheck.exceptions import DeadlineExceeded
+from badgecheck.subgraphs import SubgraphCache
+from badgecheck.transport import HttpTransport
+from badgecheck.utils import DeadlineDocumentLoader
+
+from testfiles.test_components import test_components
+from utils import StubHttpServer
+
+
+class DeadlineDocumentLoaderTests(unittest.TestCase):
+    def test_loads_get_the_time_left(self):
+        calls = []
+
+        def loader(url, timeout=None):
+            calls.append((url, timeout))
+            return {'contextUrl': None, 'documentUrl': url, 'document': {}}
+
+        DeadlineDocumentLoader(loader, Deadline(10))('https://example.org/context')
+        self.assertEqual(calls[0][0], 'https://example.org/context')
+        self.assertTrue(9 < calls[0][1] <= 10)
+
+        with self.assertRaises(JsonLdError) as context:
+            DeadlineDocumentLoader(loader, Deadline(0))('https://example.org/context')
+        self.assertIsInstance(context.exception.cause, DeadlineExceeded)
+        self.assertEqual(len(calls), 1)
+
+
+class VerifyDeadlineTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        base = self.server.url('/')
+        self.issuer_url = self.server.url('/organization.json')
+        for path, key, delay in (('/beths-robotics-badge.json', '2_0_basic_assertion', 0),
+                                 ('/robotics-badge.json', '2_0_basic_badgeclass', 0),
+                                 ('/organization.json', '2_0_basic_issuer', 2)):
+            body = test_components[key].replace('https://example.org/', base)
+            self.server.add(path, body=body, content_type='application/ld+json', delay=delay)
+        self.assertion_url = self.server.url('/beths-robotics-badge.json')
+        self.failure_cache = FailureCache()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def verify(self, **kwargs):
+        start = time.time()
+        result = verify(self.assertion_url, transport=HttpTransport(),
+                        failure_cache=self.failure_cache, subgraph_cache=SubgraphCache(), **kwargs)
+        return time.time() - start, result
+
+    def assertTimedOut(self, elapsed, result):
+        self.assertLess(elapsed, 1.5)
+        self.assertFalse(result['valid'])
+        self.assertTrue(any('deadline' in message['result'] or 'FetchTimeout' in message['result']
+                            for message in result['messages']))
+        self.assertIsNone(self.failure_cache.get(self.issuer_url),
+                          "A fetch cut short by the deadline is not remembered as failed")
+
+    def test_slow_issuer_is_cut_short(self):
+        self.assertTimedOut(*self.verify(deadline=0.5))
+
+    def test_slow_issuer_is_cut_short_with_fetch_workers(self):
+        self.assertTimedOut(*self.verify(deadline=0.5, fetch_workers=2))
+
+    def test_unfinished_tasks_fail_with_timeout_message(self):
+        elapsed, result = self.verify(deadline=0)
+        self.assertFalse(result['valid'])
+        self.assertEqual([message['result'] for message in result['messages']],
+                         [Deadline(0).message()])
+        self.assertEqual(self.server.requests, [])
+
+    def test_generous_deadline_changes_nothing(self):
+        elapsed, result = self.verify(deadline=10)
+        self.assertTrue(result['valid'])
+        self.assertEqual(len(result['messages']), 0)
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+import unittest
+
+from pydux import create_store
+
+from badgecheck import verify, verify_async
+from badgecheck.actions.tasks import add_task
+from badgecheck.cache import FailureCache
+from badgecheck.engine import ConcurrentTaskRunner, run_tasks
+from badgecheck.reducers import main_reducer
+from badgecheck.state import INITIAL_STATE
+from badgecheck.subgraphs import SubgraphCache
+from badgecheck.tasks.task_types import FETCH_HTTP_NODE
+from badgecheck.transport import HttpTransport
+
+from testfiles.test_components import test_components
+from utils import StubHttpServer
+
+
+def comparable(result):
+    """
+    Results of two verifications differ only in the blank node ids they were given and
+    the order of their nodes and messages.
+    """
+    def without_blank_ids(node):
+        return json.dumps(dict((k, v) for k, v in node.items()
+                               if not (isinstance(v, basestring) and v.startswith('_:'))),
+                          sort_keys=True)
+    return {
+        'valid': result['valid'],
+        'messages': sorted(json.dumps(message, sort_keys=True) for message in result['messages']),
+        'input': result['input'],
+        'graph': sorted(without_blank_ids(node) for node in result['graph']),
+    }
+
+
+class ConcurrentEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        self.transport = HttpTransport()
+        base = self.server.url('/')
+        for path, key in (('/beths-robotics-badge.json', '2_0_basic_assertion'),
+                          ('/robotics-badge.json', '2_0_basic_badgeclass'),
+                          ('/organization.json', '2_0_basic_issuer')):
+            body = test_components[key].replace('https://example.org/', base)
+            for _ in range(2):
+                self.server.add(path, body=body, content_type='application/ld+json', delay=0.1)
+        self.assertion_url = self.server.url('/beths-robotics-badge.json')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def options(self):
+        return {'transport': self.transport, 'subgraph_cache': SubgraphCache(ttl=0)}
+
+    def test_results_match_verify(self):
+        expected = verify(self.assertion_url, **self.options())
+        result = verify_async(self.assertion_url, **self.options()).result(timeout=10)
+
+        self.assertTrue(result['valid'])
+        self.assertEqual(comparable(result), comparable(expected))
+
+    def test_failing_results_match_verify(self):
+        assertion = json.loads(test_components['2_0_basic_assertion'].replace(
+            'https://example.org/', self.server.url('/')))
+        assertion['id'] = self.server.url('/broken-assertion.json')
+        assertion['badge'] = self.server.url('/missing-badge.json')
+        del assertion['issuedOn']
+        for _ in range(2):
+            self.server.add('/broken-assertion.json', body=json.dumps(assertion),
+                            content_type='application/ld+json')
+            self.server.add('/missing-badge.json', body='<html>Not Found</html>', status=404,
+                            content_type='text/html')
+        options = dict(self.options(), failure_cache=FailureCache(ttl=0))
+
+        expected = verify(assertion['id'], **options)
+        result = verify_async(assertion['id'], **options).result(timeout=10)
+        self.assertFalse(result['valid'])
+        self.assertEqual(comparable(result), comparable(expected))
+
+    def test_verification_runs_in_the_background(self):
+        finished = threading.Event()
+        pending = verify_async(self.assertion_url, **self.options())
+        self.assertFalse(pending.done())
+
+        pending.add_done_callback(lambda p: finished.set())
+        self.assertTrue(finished.wait(10))
+        self.assertTrue(pending.done())
+        self.assertTrue(pending.result()['valid'])
+
+        called = []
+        pending.add_done_callback(called.append)
+        self.assertEqual(called, [pending])
+
+    def test_errors_are_raised_from_result(self):
+        class NotABakedImage(object):
+            def read(self, *args):
+                return ''
+
+            def seek(self, position):
+                pass
+        pending = verify_async(NotABakedImage())
+        with self.assertRaises(Exception):
+            pending.result(timeout=10)
+
+    def test_independent_fetches_overlap(self):
+        for path in ('/first', '/second', '/third'):
+            self.server.add(path, body='{"name": "%s"}' % path, delay=0.2)
+            self.server.add(path, body='{"name": "%s"}' % path, delay=0.2)
+
+        def run(runner):
+            store = create_store(main_reducer, INITIAL_STATE)
+            for path in ('/first', '/second', '/third'):
+                store.dispatch(add_task(FETCH_HTTP_NODE, url=self.server.url(path)))
+            start = time.time()
+            runner(store, self.options())
+            return time.time() - start, store.get_state()['tasks']
+
+        sequential_time, sequential_tasks = run(run_tasks)
+        concurrent_time, concurrent_tasks = run(ConcurrentTaskRunner(fetch_workers=3).run)
+
+        self.assertGreater(sequential_time, 0.6)
+        self.assertLess(concurrent_time, 0.4)
+        self.assertEqual(self.server.max_active, 3)
+        self.assertEqual(sorted((t['name'], t['success'], t['result']) for t in concurrent_tasks),
+                         sorted((t['name'], t['success'], t['result']) for t in sequential_tasks))
+
+    def test_runs_share_one_pool(self):
+        self.server.add('/first', body='{"name": "first"}')
+        self.server.add('/second', body='{"name": "second"}')
+        fetch_threads = []
+
+        class RecordingTransport(HttpTransport):
+            def get(self, url, **kwargs):
+                fetch_threads.append(threading.current_thread())
+                return super(RecordingTransport, self).get(url, **kwargs)
+
+        options = dict(self.options(), transport=RecordingTransport())
+        for path in ('/first', '/second'):
+            store = create_store(main_reducer, INITIAL_STATE)
+            store.dispatch(add_task(FETCH_HTTP_NODE, url=self.server.url(path)))
+            ConcurrentTaskRunner(fetch_workers=1).run(store, options)
+            self.assertTrue(store.get_state()['tasks'][0]['success'])
+
+        self.assertIs(fetch_threads[0], fetch_threads[1])
+        self.assertTrue(fetch_threads[0].is_alive())
+
+
+class VerifyFetchWorkersTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        base = self.server.url('/')
+        assertion = json.loads(test_components['2_0_basic_assertion'].replace(
+            'https://example.org/', base))
+        # The badge class and the signing key are fetched at the same dependency level.
+        assertion['verification'] = {'type': 'SignedBadge', 'creator': base + 'key.json'}
+        key = {'@context': 'https://w3id.org/openbadges/v2', 'type': 'CryptographicKey',
+               'id': base + 'key.json', 'owner': base + 'organization.json',
+               'publicKeyPem': '-----BEGIN PUBLIC KEY-----'}
+        documents = (
+            ('/beths-robotics-badge.json', json.dumps(assertion)),
+            ('/robotics-badge.json', test_components['2_0_basic_badgeclass'].replace(
+                'https://example.org/', base)),
+            ('/organization.json', test_components['2_0_basic_issuer'].replace(
+                'https://example.org/', base)),
+            ('/key.json', json.dumps(key)),
+        )
+        for path, body in documents:
+            for _ in range(2):
+                self.server.add(path, body=body, content_type='application/ld+json', delay=0.2)
+        self.assertion_url = self.server.url('/beths-robotics-badge.json')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def verify(self, **kwargs):
+        start = time.time()
+        result = verify(self.assertion_url, transport=HttpTransport(),
+                        subgraph_cache=SubgraphCache(ttl=0), **kwargs)
+        return time.time() - start, result
+
+    def test_fetches_at_one_level_overlap(self):
+        sequential_time, expected = self.verify()
+        concurrent_time, result = self.verify(fetch_workers=4)
+
+        self.assertEqual(comparable(result), comparable(expected))
+        # assertion, then badge class and key together, then issuer
+        self.assertGreater(sequential_time, 0.8)
+        self.assertLess(concurrent_time, sequential_time - 0.15)
+        self.assertEqual(self.server.max_active, 2)
@@ -5,7 +5,7 @@ import unittest
 from badgecheck.actions.graph import add_node, patch_node
 from badgecheck.actions.tasks import add_task
 from badgecheck.reducers.graph import graph_reducer
-from badgecheck.state import get_node_by_id
+from badgecheck.state import get_node_by_id, get_node_by_path, NodeGraph
 from badgecheck.tasks.graph import fetch_http_node, jsonld_compact_data
 from badgecheck.tasks.task_types import FETCH_HTTP_NODE, JSONLD_COMPACT_DATA
 from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_URI
@@ -98,6 +98,18 @@ class NodeStorageTests(unittest.TestCase):
         second_node = get_node_by_id({'graph': state}, nested_id)
         self.assertEqual(second_node['c'], 3)
 
+    def test_graph_state_indexes_nodes_by_id(self):
+        state = graph_reducer([], add_node('http://example.com/node1', {'nested1': {'key2': 2}}))
+        state = graph_reducer(state, add_node('http://example.com/node1', {'key1': 'duplicate'}))
+        self.assertTrue(isinstance(state, NodeGraph))
+        self.assertEqual(len(state), 3)
+
+        first_node = get_node_by_id({'graph': state}, 'http://example.com/node1')
+        self.assertIs(first_node, state[1], "First node with a matching id is returned")
+        self.assertEqual(get_node_by_path({'graph': state}, ['http://example.com/node1', 'nested1'])['key2'], 2)
+        with self.assertRaises(IndexError):
+            get_node_by_id({'graph': state}, 'http://example.com/unknown')
+
 
 class NodeUpdateTests(unittest.TestCase):
     def test_patch_node(self):
@@ -111,6 +123,12 @@ class NodeUpdateTests(unittest.TestCase):
         updated_node = get_node_by_id({'graph': state}, first_node['id'])
         self.assertEqual(updated_node['name'], 'New One')
 
+        next_state = graph_reducer(state, patch_node(second_node['id'], {'name': 'New Two'}))
+        self.assertEqual(get_node_by_id({'graph': next_state}, second_node['id'])['name'], 'New Two')
+        self.assertEqual(get_node_by_id({'graph': state}, second_node['id'])['name'], 'Two',
+                         "Earlier graph states are not modified")
+        self.assertEqual(first_node['name'], 'One', "Input nodes are not modified")
+
     def test_update_node_id(self):
         """
         TODO: allow ability to update a node id, replacing all references to that
@@ -1,9 +1,14 @@
 import json
 from pyld import jsonld
 import responses
+import threading
 import unittest
 
-from badgecheck.utils import CachableDocumentLoader
+from badgecheck.extensions import GeoLocation
+from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_DICT, OPENBADGES_CONTEXT_V2_URI
+from badgecheck.utils import (CachableDocumentLoader, get_document_loader, jsonld_use_cache,
+                              PinnedContextLoader, set_document_loader,)
+from badgecheck.verifier import verify
 
 from testfiles.test_components import test_components
 from utils import setUpContextMock
@@ -57,3 +62,98 @@ class DocumentLoaderTests(unittest.TestCase):
         # second compaction should have built from the cache
         self.assertEqual(first_compacted['verification']['type'],
                          second_compacted['verification']['type'])
+
+
+class SharedDocumentLoaderTests(unittest.TestCase):
+    def tearDown(self):
+        set_document_loader(None, cachable=True)
+
+    def test_shared_loader_is_created_once(self):
+        set_document_loader(None, cachable=True)
+        loaders = []
+
+        def get_loader():
+            loaders.append(get_document_loader(cachable=True))
+        threads = [threading.Thread(target=get_loader) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(id(loader) for loader in loaders)), 1)
+        self.assertIs(loaders[0], get_document_loader(cachable=True))
+        self.assertIsNot(loaders[0], get_document_loader(cachable=False))
+        self.assertIs(jsonld_use_cache['documentLoader'], loaders[0])
+
+    def test_configured_loader_replaces_shared_loader(self):
+        loader = CachableDocumentLoader(cachable=True)
+        set_document_loader(loader, cachable=True)
+        self.assertIs(get_document_loader(cachable=True), loader)
+        self.assertIs(jsonld_use_cache['documentLoader'], loader)
+
+    @responses.activate
+    def test_verify_uses_injected_loader(self):
+        requested_urls = []
+        shared_loader = CachableDocumentLoader(cachable=True)
+
+        def loader(url):
+            requested_urls.append(url)
+            return shared_loader(url)
+
+        setUpContextMock()
+        assertion = json.loads(test_components['2_0_basic_assertion'])
+        assertion['id'] = 'urn:uuid:2d9c6d14-4a3c-4d3b-91a4-87a4e23cfe1d'
+        # A context array keeps the document off the compaction fast path.
+        assertion['@context'] = [OPENBADGES_CONTEXT_V2_URI]
+        verify(json.dumps(assertion), document_loader=loader)
+
+        self.assertTrue(requested_urls)
+        self.assertEqual(set(requested_urls), {OPENBADGES_CONTEXT_V2_URI})
+
+
+class PinnedContextLoaderTests(unittest.TestCase):
+    @responses.activate
+    def test_pinned_contexts_are_served_without_network(self):
+        loader = PinnedContextLoader(fallback=CachableDocumentLoader(cachable=False))
+
+        document = loader(OPENBADGES_CONTEXT_V2_URI)
+        self.assertIs(document['document'], OPENBADGES_CONTEXT_V2_DICT)
+        self.assertEqual(document['documentUrl'], OPENBADGES_CONTEXT_V2_URI)
+
+        document = loader(GeoLocation.context_url)
+        self.assertIs(document['document'], GeoLocation.context_json)
+
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(loader.served_locally(),
+                         sorted([OPENBADGES_CONTEXT_V2_URI, GeoLocation.context_url]))
+        self.assertEqual(loader.served_count(OPENBADGES_CONTEXT_V2_URI), 1)
+
+    @responses.activate
+    def test_unknown_urls_fall_through(self):
+        url = 'http://example.com/context'
+        responses.add(responses.GET, url, body='{"@context": {}}', status=200,
+                      content_type='application/ld+json')
+        loader = PinnedContextLoader(fallback=CachableDocumentLoader(cachable=False))
+
+        document = loader(url)
+        self.assertEqual(document['document'], '{"@context": {}}')
+        self.assertEqual(len(responses.calls), 1)
+        self.assertFalse(loader.is_pinned(url))
+        self.assertEqual(loader.served_locally(), [])
+
+    @responses.activate
+    def test_compaction_against_pinned_context(self):
+        assertion_data = json.loads(test_components['2_0_basic_assertion'])
+        loader = PinnedContextLoader()
+
+        compacted = jsonld.compact(
+            assertion_data, OPENBADGES_CONTEXT_V2_URI, options={'documentLoader': loader})
+        self.assertEqual(compacted['verification']['type'], u'HostedBadge')
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(loader.served_locally(), [OPENBADGES_CONTEXT_V2_URI])
+
+    def test_default_loader_pins_contexts(self):
+        set_document_loader(None, cachable=True)
+        loader = get_document_loader(cachable=True)
+        self.assertTrue(loader.is_pinned(OPENBADGES_CONTEXT_V2_URI))
+        self.assertTrue(loader.is_pinned(GeoLocation.context_url))
@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from badgecheck.persistent import PersistentMap, PersistentVector
+
+
+class CollidingKey(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+
+class PersistentVectorTests(unittest.TestCase):
+    def test_append_and_get_across_trie_levels(self):
+        size = 33 * 32 * 32 + 5  # Forces the root to grow past two levels
+        vector = PersistentVector()
+        for i in range(size):
+            vector = vector.append(i)
+
+        self.assertEqual(len(vector), size)
+        self.assertEqual(list(vector), list(range(size)))
+        for i in (0, 31, 32, 1023, 1024, 1055, 1056, 32767, 33791, size - 1):
+            self.assertEqual(vector[i], i)
+        self.assertEqual(vector[-1], size - 1)
+        with self.assertRaises(IndexError):
+            vector[size]
+
+    def test_updates_leave_earlier_versions_unchanged(self):
+        values = list(range(2000))
+        first = PersistentVector(values)
+        second = first.set(5, 'five').set(1999, 'last').append('extra')
+
+        self.assertEqual(list(first), values)
+        self.assertEqual(second[5], 'five')
+        self.assertEqual(second[1999], 'last')
+        self.assertEqual(second[2000], 'extra')
+        self.assertEqual(len(first), 2000)
+        self.assertEqual(len(second), 2001)
+
+    def test_random_sets_match_list(self):
+        rng = random.Random(7)
+        expected = list(range(700))
+        vector = PersistentVector(expected)
+        for _ in range(500):
+            i = rng.randrange(len(expected))
+            expected[i] = rng.random()
+            vector = vector.set(i, expected[i])
+        self.assertEqual(list(vector), expected)
+        self.assertEqual(vector[100:110], expected[100:110])
+
+
+class PersistentMapTests(unittest.TestCase):
+    def test_set_and_get_match_dict(self):
+        rng = random.Random(11)
+        expected = {}
+        pmap = PersistentMap()
+        for _ in range(3000):
+            key = 'http://example.com/{}'.format(rng.randrange(1500))
+            expected[key] = rng.random()
+            pmap = pmap.set(key, expected[key])
+
+        self.assertEqual(len(pmap), len(expected))
+        self.assertEqual(dict(pmap.items()), expected)
+        for key in expected:
+            self.assertEqual(pmap.get(key), expected[key])
+        self.assertIsNone(pmap.get('http://example.com/unknown'))
+        self.assertFalse('http://example.com/unknown' in pmap)
+
+    def test_updates_leave_earlier_versions_unchanged(self):
+        first = PersistentMap().set('a', 1)
+        second = first.set('a', 2).set('b', 3)
+        self.assertEqual(first.get('a'), 1)
+        self.assertIsNone(first.get('b'))
+        self.assertEqual(second.get('a'), 2)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 2)
+        self.assertIs(second.set('b', second.get('b')), second)
+
+    def test_hash_collisions(self):
+        keys = [CollidingKey(name) for name in ('a', 'b', 'c')]
+        pmap = PersistentMap()
+        for i, key in enumerate(keys):
+            pmap = pmap.set(key, i)
+        pmap = pmap.set(CollidingKey('b'), 'B').set('other', 'x')
+
+        self.assertEqual(len(pmap), 4)
+        self.assertEqual(pmap.get(CollidingKey('a')), 0)
+        self.assertEqual(pmap.get(CollidingKey('b')), 'B')
+        self.assertEqual(pmap.get(CollidingKey('c')), 2)
+        self.assertEqual(pmap.get('other'), 'x')
+        self.assertIsNone(pmap.get(CollidingKey('d')))
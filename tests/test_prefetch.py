@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+import unittest
+
+from badgecheck import verify
+from badgecheck.cache import FailureCache
+from badgecheck.prefetch import Prefetcher
+from badgecheck.subgraphs import SubgraphCache
+from badgecheck.transport import HttpTransport
+
+from testfiles.test_components import test_components
+from utils import StubHttpServer
+
+
+class PrefetcherTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        self.base = self.server.url('/')
+        self.assertion = json.loads(test_components['2_0_basic_assertion'].replace(
+            'https://example.org/', self.base))
+        self.assertion['verification'] = {'type': 'SignedBadge', 'creator': self.base + 'key.json'}
+        self.prefetcher = Prefetcher(transport=HttpTransport(), failure_cache=FailureCache())
+
+    def tearDown(self):
+        self.prefetcher.close()
+        self.server.stop()
+
+    def test_fetched_properties_are_prefetched(self):
+        self.server.add('/robotics-badge.json', body='{"name": "badge"}')
+        self.server.add('/key.json', body='{"name": "key"}')
+
+        self.prefetcher.scan(self.assertion)
+        self.assertEqual(self.prefetcher.take(self.base + 'robotics-badge.json').json(),
+                         {'name': 'badge'})
+        self.assertEqual(self.prefetcher.take(self.base + 'key.json').json(), {'name': 'key'})
+        self.assertEqual(sorted(path for path, port in self.server.requests),
+                         ['/key.json', '/robotics-badge.json'])
+
+        self.assertIsNone(self.prefetcher.take(self.base + 'key.json'), "Responses are taken once")
+        self.prefetcher.scan(self.assertion)
+        self.assertEqual(len(self.server.requests), 2, "URLs are prefetched once")
+
+    def test_unfetched_and_failed_urls_are_skipped(self):
+        self.prefetcher.failure_cache.record(self.base + 'key.json', status=404, message='Not Found')
+        self.prefetcher.scan(self.assertion, 'Assertion')
+        self.assertIsNone(self.prefetcher.take(self.base + 'key.json'))
+        self.assertIsNone(self.prefetcher.take(self.assertion['recipient']['identity']))
+        self.assertIsNotNone(self.prefetcher.take(self.base + 'robotics-badge.json'))
+
+    def test_prefetchers_share_one_pool(self):
+        self.server.add('/robotics-badge.json', body='{"name": "badge"}')
+        self.server.add('/robotics-badge.json', body='{"name": "badge"}')
+        fetch_threads = []
+
+        class RecordingTransport(HttpTransport):
+            def get(self, url, **kwargs):
+                fetch_threads.append(threading.current_thread())
+                return super(RecordingTransport, self).get(url, **kwargs)
+
+        for _ in range(2):
+            prefetcher = Prefetcher(transport=RecordingTransport(), failure_cache=FailureCache(), workers=1)
+            prefetcher.prefetch(self.base + 'robotics-badge.json')
+            self.assertIsNotNone(prefetcher.take(self.base + 'robotics-badge.json'))
+            prefetcher.close()
+
+        self.assertIs(fetch_threads[0], fetch_threads[1])
+        self.assertTrue(fetch_threads[0].is_alive())
+
+
+class VerifyPrefetchTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+        base = self.server.url('/')
+        assertion = json.loads(test_components['2_0_basic_assertion'].replace(
+            'https://example.org/', base))
+        assertion['verification'] = {'type': 'SignedBadge', 'creator': base + 'key.json'}
+        key = {'@context': 'https://w3id.org/openbadges/v2', 'type': 'CryptographicKey',
+               'id': base + 'key.json', 'owner': base + 'organization.json',
+               'publicKeyPem': '-----BEGIN PUBLIC KEY-----'}
+        documents = (
+            ('/beths-robotics-badge.json', json.dumps(assertion)),
+            ('/robotics-badge.json', test_components['2_0_basic_badgeclass'].replace(
+                'https://example.org/', base)),
+            ('/organization.json', test_components['2_0_basic_issuer'].replace(
+                'https://example.org/', base)),
+            ('/key.json', json.dumps(key)),
+        )
+        for path, body in documents:
+            for _ in range(2):
+                self.server.add(path, body=body, content_type='application/ld+json', delay=0.2)
+        self.assertion_url = self.server.url('/beths-robotics-badge.json')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def verify(self, **kwargs):
+        start = time.time()
+        result = verify(self.assertion_url, transport=HttpTransport(),
+                        subgraph_cache=SubgraphCache(ttl=0), **kwargs)
+        return time.time() - start, result
+
+    def test_linked_documents_are_fetched_ahead(self):
+        plain_time, expected = self.verify()
+        prefetch_time, result = self.verify(prefetch=True)
+
+        self.assertEqual(result['messages'], expected['messages'])
+        self.assertEqual(len(result['graph']), len(expected['graph']))
+        # The badge class and key are fetched together as soon as the assertion is compacted.
+        self.assertEqual(self.server.max_active, 2)
+        self.assertLess(prefetch_time, plain_time - 0.15)
+        self.assertEqual(len(self.server.requests), 8, "Every document is fetched once per verification")
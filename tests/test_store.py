@@ -5,6 +5,7 @@ from pydux import create_store
 
 from badgecheck import verify
 from badgecheck.reducers import main_reducer
+from badgecheck.scheduler import TaskScheduler
 from badgecheck.state import (filter_active_tasks, INITIAL_STATE, get_node_by_id,
                               get_node_by_path,)
 
@@ -46,6 +47,74 @@ class TaskFilterTests(unittest.TestCase):
         self.assertEqual(len(active_tasks), 1, "Task with an incomplete prereq should not be active")
 
 
+class TaskSchedulerTests(unittest.TestCase):
+    def test_scheduler_matches_active_filter(self):
+        tasks = [
+            {'task_id': 1, 'name': 'Carl', 'complete': True},
+            {'task_id': 2, 'name': 'Tim', 'complete': False},
+            {'task_id': 3, 'name': 'Mary', 'complete': False, 'prerequisites': ['Tim', 'Carl']},
+            {'task_id': 4, 'name': 'Linda', 'complete': False, 'prerequisites': 'Nobody'},
+        ]
+        state = {'tasks': tasks}
+        scheduler = TaskScheduler()
+        scheduler.sync(state)
+
+        self.assertEqual(scheduler.next_task_id(), 2)
+        self.assertEqual(scheduler.next_task_id(), 2, "Ready task stays queued until complete")
+
+        tasks[1] = dict(tasks[1], complete=True)
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(), 3, "Completing Tim should release Mary")
+
+        tasks[2] = dict(tasks[2], complete=True)
+        scheduler.sync(state)
+        self.assertIsNone(scheduler.next_task_id(), "Task with a never-queued prereq should wait")
+
+        tasks.append({'task_id': 5, 'name': 'Nobody', 'complete': False})
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(), 5)
+        tasks[4] = dict(tasks[4], complete=True)
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(), 4)
+        self.assertEqual(
+            [t['task_id'] for t in filter_active_tasks(state)], [4])
+
+    def test_scheduler_reblocks_when_prerequisite_name_requeued(self):
+        tasks = [
+            {'task_id': 1, 'name': 'Tim', 'complete': True},
+            {'task_id': 2, 'name': 'Mary', 'complete': False, 'prerequisites': 'Tim'},
+            {'task_id': 3, 'name': 'Tim', 'complete': False},
+        ]
+        state = {'tasks': tasks[:2]}
+        scheduler = TaskScheduler()
+        scheduler.sync(state)
+
+        state['tasks'] = tasks
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(), 3, "A new incomplete Tim blocks Mary again")
+
+        tasks[2] = dict(tasks[2], complete=True)
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(), 2)
+
+    def test_scheduler_passes_over_excluded_tasks(self):
+        tasks = [
+            {'task_id': 1, 'name': 'Tim', 'complete': False},
+            {'task_id': 2, 'name': 'Mary', 'complete': False},
+        ]
+        state = {'tasks': tasks}
+        scheduler = TaskScheduler()
+        scheduler.sync(state)
+
+        self.assertEqual(scheduler.next_task_id(exclude={1}), 2)
+        self.assertIsNone(scheduler.next_task_id(exclude={1, 2}))
+        self.assertEqual(scheduler.next_task_id(), 1, "Excluded tasks stay queued")
+
+        tasks[0] = dict(tasks[0], complete=True)
+        scheduler.sync(state)
+        self.assertEqual(scheduler.next_task_id(exclude={1}), 2)
+
+
 class FindNodeByPathTests(unittest.TestCase):
     def test_find_node_with_single_length_path(self):
         state = {
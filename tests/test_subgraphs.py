@@ -0,0 +1,97 @@
+import json
+import responses
+import unittest
+
+from badgecheck import verify
+from badgecheck.subgraphs import SubgraphCache
+
+from testfiles.test_components import test_components
+
+
+ASSERTION_URL = 'https://example.org/beths-robotics-badge.json'
+BADGECLASS_URL = 'https://example.org/robotics-badge.json'
+ISSUER_URL = 'https://example.org/organization.json'
+
+
+def fetched_nodes(result):
+    return [node for node in result['graph'] if node['id'] in (BADGECLASS_URL, ISSUER_URL)]
+
+
+class SubgraphCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = SubgraphCache()
+
+    def add_responses(self, badgeclass=None, issuer=None):
+        responses.reset()
+        for url, body in ((ASSERTION_URL, test_components['2_0_basic_assertion']),
+                          (BADGECLASS_URL, badgeclass or test_components['2_0_basic_badgeclass']),
+                          (ISSUER_URL, issuer or test_components['2_0_basic_issuer'])):
+            responses.add(responses.GET, url, body=body, status=200,
+                          content_type='application/ld+json')
+
+    def verify(self):
+        return verify(ASSERTION_URL, subgraph_cache=self.cache)
+
+    @responses.activate
+    def test_badgeclass_and_issuer_are_reused(self):
+        self.add_responses()
+        first = self.verify()
+        self.assertEqual(len(self.cache.entries), 2)
+
+        second = self.verify()
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertTrue(second['valid'])
+        self.assertEqual(second['messages'], first['messages'])
+        self.assertEqual(fetched_nodes(second), fetched_nodes(first))
+        # Documents are still fetched so that changes are noticed.
+        self.assertEqual([call.request.url for call in responses.calls[3:]],
+                         [ASSERTION_URL, BADGECLASS_URL, ISSUER_URL])
+
+    @responses.activate
+    def test_validation_failures_are_reused(self):
+        badgeclass = json.loads(test_components['2_0_basic_badgeclass'])
+        del badgeclass['name']
+        self.add_responses(badgeclass=json.dumps(badgeclass))
+
+        first = self.verify()
+        second = self.verify()
+        self.assertFalse(second['valid'])
+        self.assertEqual(second['messages'], first['messages'])
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    @responses.activate
+    def test_changed_documents_are_validated_again(self):
+        self.add_responses()
+        self.verify()
+
+        badgeclass = json.loads(test_components['2_0_basic_badgeclass'])
+        badgeclass['name'] = 'Advanced Robotics'
+        self.add_responses(badgeclass=json.dumps(badgeclass))
+        result = self.verify()
+
+        badgeclass_node = [n for n in result['graph'] if n['id'] == BADGECLASS_URL][0]
+        self.assertEqual(badgeclass_node['name'], 'Advanced Robotics')
+        self.assertEqual(self.cache.stats()['hits'], 1)  # only the issuer
+        self.assertEqual(len(self.cache.entries), 3)
+
+    @responses.activate
+    def test_linked_documents_are_checked_when_a_subgraph_is_reused(self):
+        self.add_responses()
+        self.verify()
+
+        issuer = json.loads(test_components['2_0_basic_issuer'])
+        del issuer['email']
+        self.add_responses(issuer=json.dumps(issuer))
+        result = self.verify()
+
+        self.assertFalse(result['valid'])
+        self.assertEqual([m['prop_name'] for m in result['messages']], ['email'])
+
+    @responses.activate
+    def test_reuse_can_be_turned_off(self):
+        self.cache = SubgraphCache(ttl=0)
+        self.add_responses()
+        self.verify()
+        self.verify()
+        self.assertEqual(len(self.cache.entries), 0)
+        self.assertEqual(self.cache.stats()['hits'], 0)
@@ -6,7 +6,8 @@ from badgecheck.reducers import main_reducer
 from badgecheck.actions.tasks import add_task, resolve_task
 from badgecheck.reducers.tasks import _new_state_with_updated_item
 from badgecheck.tasks.utils import abbreviate_value
-from badgecheck.state import INITIAL_STATE, filter_active_tasks
+from badgecheck.state import (filter_active_tasks, filter_failed_tasks, get_task_by_id, INITIAL_STATE,
+                              TASK_STATUS_COMPLETE, TASK_STATUS_SUCCESS, TaskTable,)
 
 
 class TaskActionTests(unittest.TestCase):
@@ -40,6 +41,42 @@ class TaskActionTests(unittest.TestCase):
         self.assertTrue(tasks[0]['complete'])
         self.assertEqual(len(filter_active_tasks(self.store.get_state())), 0)
 
+    def test_task_table_resolves_by_task_id(self):
+        for i in range(40):
+            self.store.dispatch(add_task('DETECT_INPUT_TYPE', other=i))
+        before = self.store.get_state()
+        self.store.dispatch(resolve_task(35, success=False, result='Nope'))
+        self.store.dispatch(resolve_task(36))
+        after = self.store.get_state()
+
+        self.assertTrue(isinstance(after['tasks'], TaskTable))
+        self.assertEqual(get_task_by_id(after, 35)['other'], 34)
+        self.assertEqual(after['tasks'].status(35), TASK_STATUS_COMPLETE)
+        self.assertEqual(after['tasks'].status(36), TASK_STATUS_COMPLETE | TASK_STATUS_SUCCESS)
+        self.assertFalse(get_task_by_id(before, 35)['complete'], "Earlier states are not modified")
+        self.assertEqual(len(filter_failed_tasks(after)), 39)
+        self.assertEqual([t['task_id'] for t in after['tasks']], list(range(1, 41)))
+        with self.assertRaises(IndexError):
+            get_task_by_id(after, 41)
+
+    def test_duplicate_tasks_not_added(self):
+        url = 'http://example.com/badgeclass'
+        self.store.dispatch(add_task('FETCH_HTTP_NODE', url=url, expected_class='BadgeClass'))
+        self.store.dispatch(add_task('FETCH_HTTP_NODE', url=url, expected_class='BadgeClass'))
+        self.store.dispatch(add_task('FETCH_HTTP_NODE', url='http://example.com/issuer'))
+        self.store.dispatch(add_task('VALIDATE_RDF_TYPE_PROPERTY', node_id=url, prop_name='type'))
+        self.store.dispatch(add_task('VALIDATE_PROPERTY', node_id=url, prop_name='type'))
+        self.store.dispatch(add_task('VALIDATE_PROPERTY', node_id=url, prop_name='name'))
+        self.store.dispatch(add_task('VALIDATE_EXPECTED_NODE_CLASS', node_id=url))
+        self.store.dispatch(add_task('VALIDATE_EXPECTED_NODE_CLASS', node_id=url))
+
+        tasks = self.store.get_state().get('tasks')
+        self.assertEqual(
+            [(t['name'], t.get('url') or t.get('prop_name')) for t in tasks], [
+                ('FETCH_HTTP_NODE', url), ('FETCH_HTTP_NODE', 'http://example.com/issuer'),
+                ('VALIDATE_RDF_TYPE_PROPERTY', 'type'), ('VALIDATE_PROPERTY', 'name'),
+                ('VALIDATE_EXPECTED_NODE_CLASS', None)
+            ])
 
     def test_task_updater_internals(self):
         initial = [{'task_id': 1}, {'task_id': 2}, {'task_id': 3}]
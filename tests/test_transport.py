@@ -0,0 +1,253 @@
+import json
+import threading
+import time
+import unittest
+
+import requests
+
+from badgecheck.actions.tasks import add_task
+from badgecheck.cache import FailureCache
+from badgecheck.exceptions import FetchTimeout
+from badgecheck.tasks.graph import FETCH_HEADERS, fetch_http_node
+from badgecheck.tasks.task_types import FETCH_HTTP_NODE, JSONLD_COMPACT_DATA
+from badgecheck.transport import get_transport, HttpTransport, set_transport
+from badgecheck.utils import CachableDocumentLoader
+
+from utils import StubHttpServer
+
+
+class HttpTransportTests(unittest.TestCase):
+    def setUp(self):
+        self.server = StubHttpServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_connections_are_reused(self):
+        self.server.add('/doc', body='{"id": "_:b0"}')
+        transport = HttpTransport()
+
+        for _ in range(3):
+            response = transport.get(self.server.url('/doc'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text, '{"id": "_:b0"}')
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connection_count(), 1)
+
+    def test_connections_per_host_are_capped(self):
+        for i in range(3):
+            self.server.add('/slow/{}'.format(i), body='{}', delay=0.1)
+        transport = HttpTransport(max_connections_per_host=1)
+
+        threads = [threading.Thread(target=transport.get, args=(self.server.url('/slow/{}'.format(i)),))
+                   for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.max_active, 1)
+
+    def test_waiting_for_a_free_connection_counts_against_the_timeout(self):
+        self.server.add('/slow', body='{}', delay=1)
+        self.server.add('/other', body='{}')
+        transport = HttpTransport(max_connections_per_host=1, max_retries=0)
+        slow = threading.Thread(target=transport.get, args=(self.server.url('/slow'),))
+        slow.start()
+        time.sleep(0.1)
+
+        start = time.time()
+        with self.assertRaises(FetchTimeout):
+            transport.get(self.server.url('/other'), timeout=0.3)
+        self.assertLess(time.time() - start, 0.6)
+        slow.join()
+
+    def test_concurrent_identical_requests_share_one_fetch(self):
+        self.server.add('/popular', body='{"name": "Popular Issuer"}', delay=0.2)
+        transport = HttpTransport()
+        responses = []
+
+        def fetch():
+            responses.append(transport.get(self.server.url('/popular'),
+                                           headers={'Accept': 'application/ld+json'}))
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual([r.text for r in responses], ['{"name": "Popular Issuer"}'] * 5)
+        self.assertEqual(transport.flights.coalesced, 4)
+        self.assertEqual(transport.flights.in_flight(), 0)
+
+    def test_requests_with_different_headers_are_not_shared(self):
+        self.server.add('/negotiated', body='{}', delay=0.2)
+        transport = HttpTransport()
+
+        threads = [threading.Thread(target=transport.get, args=(self.server.url('/negotiated'),),
+                                    kwargs={'headers': {'Accept': accept}})
+                   for accept in ('application/ld+json', 'image/png')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_shared_fetch_errors_reach_every_caller(self):
+        self.server.add('/stalled', body='{}', delay=0.5)
+        transport = HttpTransport(read_timeout=0.2, max_retries=0)
+        errors = []
+
+        def fetch():
+            try:
+                transport.get(self.server.url('/stalled'))
+            except requests.RequestException as e:
+                errors.append(e)
+        threads = [threading.Thread(target=fetch) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_waiting_for_a_shared_fetch_fits_the_callers_timeout(self):
+        self.server.add('/slow', body='{}', delay=1)
+        transport = HttpTransport(max_retries=0)
+        leader = threading.Thread(target=transport.get, args=(self.server.url('/slow'),))
+        leader.start()
+        time.sleep(0.1)
+
+        start = time.time()
+        with self.assertRaises(FetchTimeout):
+            transport.get(self.server.url('/slow'), timeout=0.3)
+        self.assertLess(time.time() - start, 0.6)
+        leader.join()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_timeouts_of_callers_with_less_time_are_not_shared(self):
+        self.server.add('/slow', body='{}', delay=0.5)
+        self.server.add('/slow', body='{}', delay=0.5)
+        transport = HttpTransport(max_retries=0)
+        errors = []
+
+        def fetch_with_deadline():
+            try:
+                transport.get(self.server.url('/slow'), headers=FETCH_HEADERS, timeout=0.2)
+            except FetchTimeout as e:
+                errors.append(e)
+        leader = threading.Thread(target=fetch_with_deadline)
+        leader.start()
+        time.sleep(0.05)
+
+        failure_cache = FailureCache()
+        task_meta = add_task(FETCH_HTTP_NODE, url=self.server.url('/slow'))
+        success, message, actions = fetch_http_node(
+            {}, task_meta, transport=transport, failure_cache=failure_cache)
+        leader.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(success)
+        self.assertIsNone(failure_cache.get(self.server.url('/slow')))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_unavailable_responses_are_retried(self):
+        self.server.add('/flaky', status=503)
+        self.server.add('/flaky', status=503)
+        self.server.add('/flaky', body='{}')
+        transport = HttpTransport(max_retries=2, backoff_factor=0)
+
+        response = transport.get(self.server.url('/flaky'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retries_are_bounded(self):
+        self.server.add('/down', status=503)
+        transport = HttpTransport(max_retries=1, backoff_factor=0)
+
+        response = transport.get(self.server.url('/down'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_read_timeout(self):
+        self.server.add('/hang', body='{}', delay=1)
+        transport = HttpTransport(read_timeout=0.1, max_retries=0)
+
+        with self.assertRaises(requests.exceptions.RequestException):
+            transport.get(self.server.url('/hang'))
+
+    def test_total_timeout_covers_slow_body(self):
+        self.server.add('/trickle', body='{"data": "' + 'x' * 100 + '"}', chunks=10, chunk_delay=0.1)
+        transport = HttpTransport(read_timeout=1, total_timeout=0.25)
+
+        start = time.time()
+        with self.assertRaises(FetchTimeout):
+            transport.get(self.server.url('/trickle'))
+        self.assertLess(time.time() - start, 0.8)
+
+    def test_fetches_share_one_watchdog_thread(self):
+        self.server.add('/trickle', body='{"data": "' + 'x' * 100 + '"}', chunks=5, chunk_delay=0.1)
+        transport = HttpTransport()
+        threads = [threading.Thread(target=transport.get, args=(self.server.url('/trickle'),),
+                                    kwargs={'headers': {'X-Caller': str(i)}}) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+
+        running = threading.enumerate()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len([t for t in running if t.name == 'badgecheck-fetch-watchdog']), 1)
+        self.assertFalse([t for t in running if isinstance(t, threading._Timer)])
+
+    def test_retries_stop_when_the_fetch_runs_out_of_time(self):
+        self.server.add('/hang', body='{}', delay=1)
+        transport = HttpTransport(max_retries=2, backoff_factor=0)
+
+        start = time.time()
+        with self.assertRaises(FetchTimeout):
+            transport.get(self.server.url('/hang'), timeout=0.3)
+        self.assertLess(time.time() - start, 0.8)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_fetch_http_node_uses_transport(self):
+        self.server.add('/assertion', body='{"id": "http://example.org/assertion"}',
+                        content_type='application/ld+json')
+        transport = HttpTransport()
+        url = self.server.url('/assertion')
+        task_meta = add_task(FETCH_HTTP_NODE, url=url)
+
+        success, message, actions = fetch_http_node({}, task_meta, transport=transport)
+        self.assertTrue(success)
+        self.assertEqual(actions[0]['name'], JSONLD_COMPACT_DATA)
+        self.assertEqual(json.loads(actions[0]['data']), {'id': 'http://example.org/assertion'})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_document_loaders_share_the_transport(self):
+        self.server.add('/context', body='{"@context": {}}', content_type='application/ld+json')
+        transport = HttpTransport()
+        caching_loader = CachableDocumentLoader(cachable=True, transport=transport)
+        plain_loader = CachableDocumentLoader(cachable=False, transport=transport)
+
+        caching_loader(self.server.url('/context'))
+        plain_loader(self.server.url('/context'))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.connection_count(), 1)
+
+    def test_default_transport_can_be_replaced(self):
+        default_transport = get_transport()
+        self.assertIs(get_transport(), default_transport)
+
+        replacement = HttpTransport(total_timeout=1)
+        set_transport(replacement)
+        try:
+            self.assertIs(get_transport(), replacement)
+        finally:
+            set_transport(None)
+        self.assertIsInstance(get_transport(), HttpTransport)
+        self.assertIsNot(get_transport(), replacement)
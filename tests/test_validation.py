@@ -1,4 +1,5 @@
 # coding=utf-8
+import aniso8601
 from datetime import datetime, timedelta
 import json
 from pyld import jsonld
@@ -7,20 +8,26 @@ from pydux import create_store
 import responses
 import unittest
 
-from badgecheck.actions.action_types import ADD_TASK, PATCH_NODE
+from badgecheck.actions.action_types import ADD_TASK, ADD_TASKS, PATCH_NODE
 from badgecheck.actions.graph import add_node, patch_node
 from badgecheck.actions.tasks import add_task
+from badgecheck.engine import run_tasks
 from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_DICT
 from badgecheck.reducers import main_reducer
 from badgecheck.state import filter_active_tasks, INITIAL_STATE
 from badgecheck.tasks import task_named
 from badgecheck.tasks.validation import (_get_validation_actions, assertion_timestamp_checks,
                                          criteria_property_dependencies, detect_and_validate_node_class,
-                                         OBClasses, PrimitiveValueValidator, validate_property, ValueTypes,)
+                                         OBClasses, PrimitiveValueValidator, validate_property,
+                                         ValidationPlan, ValueTypes,)
 from badgecheck.tasks.verification import (_default_verification_policy, hosted_id_in_verification_scope,)
-from badgecheck.tasks.task_types import (ASSERTION_TIMESTAMP_CHECKS, CRITERIA_PROPERTY_DEPENDENCIES,
+from badgecheck.tasks.primitives import (get_uri_cache, get_validator, parse_datetime, parse_uri,
+                                         ParsedDatetimes,)
+from badgecheck.tasks.task_types import (ASSERTION_TIMESTAMP_CHECKS, ASSERTION_VERIFICATION_DEPENDENCIES,
+                                         CRITERIA_PROPERTY_DEPENDENCIES,
                                          DETECT_AND_VALIDATE_NODE_CLASS, HOSTED_ID_IN_VERIFICATION_SCOPE,
-                                         IDENTITY_OBJECT_PROPERTY_DEPENDENCIES, VALIDATE_RDF_TYPE_PROPERTY,
+                                         IDENTITY_OBJECT_PROPERTY_DEPENDENCIES, VALIDATE_EXPECTED_NODE_CLASS,
+                                         VALIDATE_NODE_PROPERTIES, VALIDATE_RDF_TYPE_PROPERTY,
                                          VALIDATE_PROPERTY,)
 
 from badgecheck.verifier import call_task
@@ -107,6 +114,38 @@ class PropertyValidationTests(unittest.TestCase):
         for url in bad_iris:
             self.assertFalse(validator(url), u"`{}` should fail IRI validation but passed.".format(url))
 
+    def test_validators_are_shared(self):
+        validator = get_validator(ValueTypes.URL)
+        self.assertIs(get_validator(ValueTypes.URL), validator)
+        self.assertEqual(validator.value_type, ValueTypes.URL)
+        self.assertTrue(validator('http://example.org/'))
+        self.assertFalse(get_validator(ValueTypes.DATETIME)('2016-12-31T23:59:59'))
+
+    def test_datetime_parsing_matches_aniso8601(self):
+        values = ('2016-12-31T23:59:59Z', '2016-12-31T23:59:59+05:30', '2016-12-31T23:59:59.5-0500',
+                  '2016-12-31T23:59:59.1234567+05', '2016-12-31T24:00:00Z', '2016-W52-6T23:59:59Z',
+                  '20161231T235959Z', '2016-12-31T23:59:59')
+        bad_values = ('2016-12-31T23:59:59-00:00', '2016-12-31T23:59:59+05:75', '2016-02-30T23:59:59Z',
+                      '2016-12-31T23:59:60Z', '2016-12-31 23:59:59Z', '')
+        for value in values:
+            self.assertEqual(parse_datetime(value), aniso8601.parse_datetime(value), value)
+            self.assertEqual(parse_datetime(value).utcoffset(), aniso8601.parse_datetime(value).utcoffset())
+        for value in bad_values:
+            with self.assertRaises(ValueError):
+                parse_datetime(value)
+
+    def test_uris_are_parsed_once(self):
+        url = 'https://example.org/uris-are-parsed-once'
+        cache = get_uri_cache()
+        stats = cache.stats()
+        for value_type in (ValueTypes.URL, ValueTypes.IRI, ValueTypes.DATA_URI_OR_URL):
+            self.assertTrue(get_validator(value_type)(url))
+        self.assertFalse(get_validator(ValueTypes.DATA_URI)(url))
+        self.assertEqual(parse_uri(url).authority, 'example.org')
+
+        self.assertEqual(cache.stats()['misses'], stats['misses'] + 1)
+        self.assertEqual(cache.stats()['hits'], stats['hits'] + 4)
+
 
 class PropertyValidationTaskTests(unittest.TestCase):
 
@@ -649,6 +688,35 @@ class NodeTypeDetectionTasksTests(unittest.TestCase):
         self.assertEqual(issuedOn_task['prop_type'], ValueTypes.DATETIME)
 
 
+class ValidationPlanTests(unittest.TestCase):
+    def test_properties_are_validated_in_one_task(self):
+        store = create_store(main_reducer, INITIAL_STATE)
+        store.dispatch(add_node('http://example.com/criteria', data={
+            'id': 'http://example.com/criteria', 'narrative': ['Do this', 'Do that']}))
+        store.dispatch(add_task(VALIDATE_EXPECTED_NODE_CLASS, node_id='http://example.com/criteria',
+                                expected_class=OBClasses.Criteria))
+        run_tasks(store)
+
+        tasks = store.get_state()['tasks']
+        self.assertEqual([t['name'] for t in tasks], [
+            VALIDATE_EXPECTED_NODE_CLASS, VALIDATE_NODE_PROPERTIES, VALIDATE_RDF_TYPE_PROPERTY,
+            VALIDATE_PROPERTY, VALIDATE_PROPERTY, CRITERIA_PROPERTY_DEPENDENCIES])
+        self.assertTrue(all(t['complete'] for t in tasks))
+        self.assertEqual([t['prop_name'] for t in tasks[2:5]], ['type', 'id', 'narrative'])
+        self.assertEqual([t['success'] for t in tasks[2:5]], [True, True, False])
+        self.assertIn('more than the single allowed value', tasks[4]['result'])
+        self.assertEqual(store.get_state()['graph'][0]['type'], OBClasses.Criteria,
+                         "The default type is still applied")
+
+    def test_plans_are_compiled_once_per_class(self):
+        plan = ValidationPlan.for_class(OBClasses.Assertion)
+        self.assertIs(ValidationPlan.for_class(OBClasses.Assertion), plan)
+        self.assertEqual(len(plan.property_steps), 10)
+        self.assertEqual([name for name, fields in plan.class_steps],
+                         [ASSERTION_VERIFICATION_DEPENDENCIES, ASSERTION_TIMESTAMP_CHECKS])
+        self.assertEqual([t['prop_name'] for t in plan.property_tasks('_:b0')][:2], ['id', 'type'])
+
+
 class ClassValidationTaskTests(unittest.TestCase):
     def test_validate_identity_object_property_dependencies(self):
         first_node = {
@@ -767,8 +835,12 @@ class ClassValidationTaskTests(unittest.TestCase):
                 actions.extend(new_actions)
             self.assertTrue(result)
 
-        self.assertEqual(len(actions), 7)
+        self.assertEqual(len(actions), 6)
         self.assertTrue(CRITERIA_PROPERTY_DEPENDENCIES in [a.get('name') for a in actions])
+        property_tasks = [t for a in actions if a['type'] == ADD_TASKS for t in a['tasks']]
+        self.assertEqual([(t['name'], t['prop_name']) for t in property_tasks], [
+            (VALIDATE_RDF_TYPE_PROPERTY, 'type'), (VALIDATE_PROPERTY, 'id'), (VALIDATE_PROPERTY, 'narrative')])
+        self.assertTrue(all(t['node_id'] == 'http://example.com/a' and t['success'] for t in property_tasks))
 
     def test_many_criteria_disallowed(self):
         badgeclass_node = {'id': 'http://example.com/badgeclass', 'type': 'BadgeClass'}
@@ -1159,3 +1231,22 @@ class AssertionTimeStampValidationTests(unittest.TestCase):
         result, message, actions = assertion_timestamp_checks(state, task_meta)
         self.assertFalse(result, "Assertion issued in the future should not be accepted.")
         self.assertTrue('future in ')
+
+    def test_timestamps_are_parsed_once_per_verification(self):
+        assertion = {
+            'id': 'http://example.com/assertion',
+            'issuedOn': '2016-12-31T23:59:59Z',
+            'expires': '2116-12-31T23:59:59+05:00'
+        }
+        state = {'graph': [assertion]}
+        datetimes = ParsedDatetimes()
+        for prop_name in ('issuedOn', 'expires',):
+            task_meta = add_task(VALIDATE_PROPERTY, node_id=assertion['id'], prop_name=prop_name,
+                                 prop_type=ValueTypes.DATETIME, required=True)
+            result, message, actions = validate_property(state, task_meta, parsed_datetimes=datetimes)
+            self.assertTrue(result)
+
+        task_meta = add_task(ASSERTION_TIMESTAMP_CHECKS, node_id=assertion['id'])
+        result, message, actions = assertion_timestamp_checks(state, task_meta, parsed_datetimes=datetimes)
+        self.assertTrue(result)
+        self.assertEqual((datetimes.misses, datetimes.hits,), (2, 2,))
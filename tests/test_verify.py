@@ -1,12 +1,16 @@
+import json
 import os
 import responses
 import unittest
 
 from pydux import create_store
 
-from badgecheck import verify
+from badgecheck import verify, verify_many
+from badgecheck.cache import get_failure_cache
+from badgecheck.contexts import get_context_cache
 from badgecheck.reducers import main_reducer
 from badgecheck.state import INITIAL_STATE
+from badgecheck.subgraphs import SubgraphCache
 
 from openbadges_bakery import bake
 
@@ -97,4 +101,66 @@ class InitializationTests(unittest.TestCase):
     #     results = verify(
     #         'http://NOTAVALIDURL.COM')
     #
-    #     self.assertTrue(results['valid'])
\ No newline at end of file
+    #     self.assertTrue(results['valid'])
+
+class BatchVerificationTests(unittest.TestCase):
+    def setUp(self):
+        self.assertion_urls = []
+        for i in range(6):
+            url = 'https://example.org/assertions/{}'.format(i)
+            assertion = json.loads(test_components['2_0_basic_assertion'])
+            assertion['id'] = url
+            if i == 3:
+                del assertion['issuedOn']
+            responses.add(responses.GET, url, body=json.dumps(assertion), status=200,
+                          content_type='application/ld+json')
+            self.assertion_urls.append(url)
+        responses.add(
+            responses.GET, 'https://example.org/robotics-badge.json',
+            body=test_components['2_0_basic_badgeclass'], status=200,
+            content_type='application/ld+json'
+        )
+        responses.add(
+            responses.GET, 'https://example.org/organization.json',
+            body=test_components['2_0_basic_issuer'], status=200,
+            content_type='application/ld+json'
+        )
+
+    def assert_expected_results(self, results):
+        self.assertEqual([r['input']['value'] for r in results], self.assertion_urls)
+        self.assertEqual([r['valid'] for r in results], [True, True, True, False, True, True])
+
+    @responses.activate
+    def test_results_are_returned_in_input_order(self):
+        subgraph_cache = SubgraphCache()
+        results = verify_many(self.assertion_urls, workers=3, subgraph_cache=subgraph_cache)
+
+        self.assert_expected_results(results)
+        self.assertEqual(results[3]['messages'][0]['prop_name'], 'issuedOn')
+        # The badge class and issuer were validated for some inputs and reused for others.
+        self.assertEqual(len(subgraph_cache.entries), 2)
+        self.assertGreater(subgraph_cache.stats()['hits'], 0)
+
+    @responses.activate
+    def test_results_can_be_yielded_as_completed(self):
+        indexed_results = list(verify_many(self.assertion_urls, workers=3, as_completed=True))
+
+        self.assertEqual(sorted(index for index, result in indexed_results), range(6))
+        self.assert_expected_results([result for index, result in sorted(indexed_results)])
+
+    @responses.activate
+    def test_process_workers(self):
+        results = verify_many(self.assertion_urls, workers=2, mode='process')
+        self.assert_expected_results(results)
+
+    @responses.activate
+    def test_process_workers_do_not_inherit_held_locks(self):
+        # As if another thread were using the shared caches when the workers are forked.
+        with get_failure_cache().entries._lock, get_context_cache()._lock:
+            results = verify_many(self.assertion_urls, workers=2, mode='process')
+        self.assert_expected_results(results)
+
+    @responses.activate
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            verify_many(self.assertion_urls, mode='fibers')
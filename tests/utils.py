@@ -1,3 +1,9 @@
+import BaseHTTPServer
+import socket
+import SocketServer
+import threading
+import time
+
 import responses
 
 from badgecheck.openbadges_context import OPENBADGES_CONTEXT_V2_URI
@@ -14,3 +20,108 @@ def setUpContextMock():
         body=context_data,
         status=200,
         content_type='application/ld+json')
+
+
+class StubHttpServer(object):
+    """
+    A threaded HTTP/1.1 server on localhost that replays canned responses, for tests
+    that need real sockets rather than a mocked adapter. Each path serves its queued
+    responses in order and keeps repeating the last one.
+
+    Example usage:
+    server = StubHttpServer()
+    server.add('/assertion', body='{}', content_type='application/ld+json')
+    server.start()
+    url = server.url('/assertion')
+    """
+    def __init__(self):
+        self.routes = {}
+        self.requests = []  # (path, client port) for every request received
+        self.request_headers = []  # headers of every request received
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    def add(self, path, body='', status=200, content_type='application/json', delay=0,
+            chunks=1, chunk_delay=0, headers=None):
+        """
+        :param delay: seconds to wait before sending the status line
+        :param chunks: number of writes the body is split into
+        :param chunk_delay: seconds to wait after each body write
+        :param headers: dict of extra response headers; if it includes an ETag, a request
+        with a matching If-None-Match gets 304 Not Modified
+        """
+        self.routes.setdefault(path, []).append({
+            'body': body, 'status': status, 'content_type': content_type, 'delay': delay,
+            'chunks': chunks, 'chunk_delay': chunk_delay, 'headers': headers or {}})
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.httpd.server_address[1], path)
+
+    def start(self):
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _StubRequestHandler)
+        self.httpd.stub = self
+        thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def connection_count(self):
+        return len(set(port for path, port in self.requests))
+
+    def handle(self, handler):
+        with self.lock:
+            self.requests.append((handler.path, handler.client_address[1]))
+            self.request_headers.append(dict(handler.headers))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            queue = self.routes.get(handler.path)
+            if not queue:
+                response = {'body': 'Not Found', 'status': 404, 'content_type': 'text/plain',
+                            'delay': 0, 'chunks': 1, 'chunk_delay': 0, 'headers': {}}
+            elif len(queue) > 1:
+                response = queue.pop(0)
+            else:
+                response = queue[0]
+
+        try:
+            time.sleep(response['delay'])
+            body = response['body']
+            status = response['status']
+            etag = response['headers'].get('ETag')
+            if etag is not None and handler.headers.get('If-None-Match') == etag:
+                body, status = '', 304
+            handler.send_response(status)
+            handler.send_header('Content-Type', response['content_type'])
+            for name, value in response['headers'].items():
+                handler.send_header(name, value)
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            size = -(-len(body) // response['chunks'])
+            for start in range(0, max(len(body), 1), max(size, 1)):
+                handler.wfile.write(body[start:start + size])
+                handler.wfile.flush()
+                time.sleep(response['chunk_delay'])
+        except socket.error:
+            pass
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.stub.handle(self)
+
+    def log_message(self, format, *args):
+        pass